@@ -1,6 +1,7 @@
-import socket
 import json
-import struct
+from concurrent.futures import ThreadPoolExecutor
+from scooter_protocol import ProtocolServer, FleetSubscriber
+from scooter_protocol.fleet import DEFAULT_GROUP, DEFAULT_PORT
 
 class listener():
     _instance = None
@@ -18,79 +19,78 @@ class listener():
             self.sense_handler = sense_handler
             self.scooter_handler = scooter_handler
             self.scooter_status = scooter_handler.get_status()
+            self.fleet = self.__start_fleet_subscriber()
             self.__start_listening()
             self.initialised = True
 
     def __start_listening(self):
         """
         Starts listening for incoming connections on the specified address and port.
-        
-        When a connection is received, it will receive a JSON message, decode it, and call the __command_handler
-        method with the command and payload. The response from the handler will then be sent back to the client.
-        
+
+        Messages are decoded in whichever encoding the master negotiated and passed to the __command_handler
+        method with the command and payload. The response from the handler is then sent back to the master.
+        The master keeps its connection open and sends every command over it, pinging it (PING) while it is
+        idle. Commands run one at a time so status updates are applied in the order they arrive.
+
         This method is called by the constructor, and it will run indefinitely until the program is terminated.
         """
-        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-            s.bind(self.ADDRESS)
-            s.listen()
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            server = ProtocolServer(self.ADDRESS, self.__handle_message, executor)
+            server.bind()
             print("Listening on {}...".format(self.ADDRESS))
-            
-            while True:
-                conn, addr = s.accept()
-                with conn:
-                    # print(f"Connected by {addr}")
-
-                    try:
-                        # First, receive the length of the incoming message (4 bytes, big-endian)
-                        raw_msglen = self.__recv_all(conn, 4)
-                        if not raw_msglen:
-                            return
-                        msglen = struct.unpack('>I', raw_msglen)[0]
-                        
-                        # Now, receive the actual message based on the length
-                        received_data = self.__recv_all(conn, msglen)
-                        if not received_data:
-                            return
-
-                        # Decode the received bytes into a string
-                        message_str = received_data.decode()
-                        # print(f"Received message: {message_str}")
-
-                        # Deserialize the JSON string to a Python dictionary
-                        message = json.loads(message_str)
-
-                        # Handle the command and payload
-                        command = message.get("command")
-                        payload = message.get("payload")
-                        
-                        response_str = self.__command_handler(command, payload)
-                        response_bytes = response_str.encode()
-                        # Send the response length and the response itself
-                        conn.sendall(struct.pack('>I', len(response_bytes)))
-                        conn.sendall(response_bytes)
-
-                    except json.JSONDecodeError:
-                        print("Failed to decode JSON message")
-                    
-                    # print("Disconnecting from client.")
+            server.serve_forever()
         print("Done.")
-        
-    def __recv_all(self, conn, length):
+
+    def __start_fleet_subscriber(self):
         """
-        Receive all of the data from a socket, given a length.
+        Start receiving the status datagrams the master multicasts to the whole fleet, if "fleet-multicast" is
+        enabled in resources.json.
 
-        :param conn: The socket connection to receive from.
-        :param length: The number of bytes to receive.
-        :return: The received data as a bytes object, or None if a zero-length packet is received.
+        Records for other scooters are ignored. If the datagrams' sequence numbers show some were missed, this
+        scooter's status is read from the master over TCP instead, so a lost datagram is never lost for good.
+
+        :return: The running FleetSubscriber, or None if the fleet channel is off.
         """
-        data = b''
-        while len(data) < length:
-            packet = conn.recv(length - len(data))
-            if not packet:
-                return None
-            data += packet
-        return data
-    
+        with open("resources.json", "r") as file:
+            settings = json.load(file).get("fleet-multicast", {})
+        if not settings.get("enabled"):
+            return None
+        subscriber = FleetSubscriber(self.__apply_fleet_records, self.__recover_fleet_gap,
+                                     settings.get("group", DEFAULT_GROUP), settings.get("port", DEFAULT_PORT))
+        subscriber.start()
+        print("Receiving fleet status on {}...".format(subscriber.address))
+        return subscriber
+
+    def __apply_fleet_records(self, records):
+        """
+        Apply this scooter's record, if there is one, from a fleet status datagram.
+
+        :param records: [[scooter_id, status], ...]
+        """
+        scooter_num = str(self.scooter_handler.get_scooter_num())
+        for scooter_id, status in records:
+            if str(scooter_id) == scooter_num:
+                self.scooter_handler.set_status(status, origin="master")
+
+    def __recover_fleet_gap(self, missed):
+        """
+        Catch up after missing fleet status datagrams by reading this scooter's status from the master.
+
+        :param missed: The number of datagrams missed, or None if it isn't known.
+        """
+        print(f"Missed {missed if missed is not None else 'some'} fleet status datagrams, reloading scooter info.")
+        self.scooter_handler.reload_info()
+
+    def __handle_message(self, message, addr):
+        """
+        Run a single message received from the master.
+
+        :param message: The decoded message, containing the command and payload.
+        :param addr: The address of the master.
+        :return: The response to send back.
+        """
+        return self.__command_handler(message.get("command"), message.get("payload"))
+
     def __command_handler(self, command, payload):
         """
         Handle commands and payloads from clients.
@@ -100,16 +100,23 @@ class listener():
             payload (dict): Payload sent by the client.
 
         Returns:
-            str: JSON response containing the result of the command.
+            dict: Response containing the result of the command.
         """
                 
         if command == "FMS": # Find my scooter
             prev_status = self.scooter_handler.get_status()
             self.sense_handler.display_status("Find Me")
             self.sense_handler.display_status(prev_status)
-            return json.dumps({"message": "success"})
+            return {"message": "success"}
         
         elif command == "USS": # Update scooter status
-            # print(f"Updating scooter status: ", payload.get("status"))
-            self.scooter_handler.set_status(payload.get("status"))
-            return json.dumps({"message": "success"})
\ No newline at end of file
+            # Applied without writing it back, since the master already has it
+            if not self.scooter_handler.set_status(payload.get("status"), origin="master",
+                                                   version=payload.get("version")):
+                return {"message": "ignored, out of date"}
+            return {"message": "success"}
+
+        elif command == "PING": # Keepalive on the master's connection
+            return {"message": "pong"}
+
+        return {"error": "Unknown command"}
@@ -1,10 +1,15 @@
 import time
 import json
+import threading
 import pytz
 from datetime import datetime, timedelta
 
 AEST = pytz.timezone('Australia/Sydney')
 
+# Seconds a local status change waits before it is written to the server, so a burst of changes (e.g. the main
+# loop marking the scooter as needing repair on every pass while the server is unreachable) costs one USS
+STATUS_WRITE_DELAY = 0.2
+
 class ScooterState:
     def handle(self, scooter):
         raise NotImplementedError("Subclasses should implement this method.")
@@ -85,14 +90,18 @@ class scooter_handler:
             self.__sock = socket
             self.__booking_id = None
             self.__ip = None
+            self.__status_lock = threading.Lock()
+            self.__written_status = None    # The status the server is known to have
+            self.__pending_status = None    # A local change waiting to be written
+            self.__master_version = None    # Version of the last status pushed by the master
             self.initialised = True
             
             # Initial state is Available
             self.state = AvailableState()
             self.__sense = sense_handler
             
-            socket.set_scooter_ip(self.__scooterNum)
             self.reload_info()
+            socket.start_heartbeat(self.__scooterNum, self.get_status)
         
         
     def reload_info(self):
@@ -146,21 +155,58 @@ class scooter_handler:
         :param battery: The battery percentage of the scooter.
         :param colour: The colour of the scooter.
         """
-        self.__status = status
+        with self.__status_lock:
+            self.__status = status
+            self.__written_status = status
         self.__make = make
         self.__cost = costMin
         self.__battery = battery
         self.__colour = colour
 
-    def set_status(self, status):
+    def set_status(self, status, origin="agent", version=None):
         """
-        Sets the status of the scooter to the given value, and updates the server.
-        
+        Sets the status of the scooter to the given value, and updates the server if the change was made here.
+
+        A status pushed by the master (origin "master") is only applied locally, since the server already has it;
+        one whose version is older than the last the master pushed is ignored, so a late push can't undo a newer
+        one, and any local change not yet written is dropped, so it can't overwrite the master's. A local change
+        (origin "agent") is written to the server after STATUS_WRITE_DELAY seconds, along with any further
+        changes made in the meantime, so only the latest status is written, and not at all if it is what the
+        server already has.
+
         :param status: The new status of the scooter. Should be one of "free", "in-use", or "maintenance"
+        :param origin: "agent" for a change made on this scooter, "master" for one pushed by the master
+        :param version: The version the master gave the status, if it was pushed by the master
+        :return: False if the status was ignored as out of date, otherwise True
         """
-        self.__status = status
+        with self.__status_lock:
+            if origin == "master":
+                if version is not None and self.__master_version is not None and version <= self.__master_version:
+                    return False
+                if version is not None:
+                    self.__master_version = version
+                self.__written_status = status
+                self.__pending_status = None    # The master's status is newer than any unwritten local change
+            else:
+                write_scheduled = self.__pending_status is not None
+                self.__pending_status = status
+                if not write_scheduled:
+                    threading.Timer(STATUS_WRITE_DELAY, self.__write_status).start()
+            self.__status = status
         self.__sense.display_status(status)
-        self.__sock.set_scooter_status(status, self.__scooterNum)
+        return True
+
+    def __write_status(self):
+        """
+        Write the latest local status change to the server, unless the server already has it.
+        """
+        with self.__status_lock:
+            status, self.__pending_status = self.__pending_status, None
+            if status is None or status == self.__written_status:
+                return
+        if self.__sock.set_scooter_status(status, self.__scooterNum) is not None:
+            with self.__status_lock:
+                self.__written_status = status
         
     def get_scooter_num(self):
         
@@ -1,7 +1,19 @@
 import socket
 import json
-import struct
+import threading
+import time
 from datetime import datetime
+from scooter_protocol import PipelinedConnection
+
+# Defaults for "master-pi-timeout" (seconds to wait for each attempt) and "master-pi-retries" in resources.json.
+# Commands that aren't safe to run twice (e.g. EB, RSF, ANT) are sent with an idempotency key, so every command
+# can be retried.
+REQUEST_TIMEOUT = 5
+REQUEST_RETRIES = 2
+
+# Default for "heartbeat-interval" in resources.json: seconds between heartbeats (HB) to the Master Pi, which
+# treats an Agent Pi it hasn't heard from for "agent-dead-after" seconds (30 by default) as gone
+HEARTBEAT_INTERVAL = 10
 
 class socket_handler:
     _instance = None
@@ -17,7 +29,11 @@ class socket_handler:
                 data = json.load(file)
                 self.HOST = data["master-pi-IP"]
                 self.PORT = data["master-pi-PORT"]
+                timeout = data.get("master-pi-timeout", REQUEST_TIMEOUT)
+                retries = data.get("master-pi-retries", REQUEST_RETRIES)
+                self.heartbeat_interval = data.get("heartbeat-interval", HEARTBEAT_INTERVAL)
             self.ADDRESS = (self.HOST, self.PORT)
+            self.connection = PipelinedConnection(self.ADDRESS, timeout=timeout, retries=retries)
             self.connected = False
             self.initialised = True
         
@@ -25,61 +41,25 @@ class socket_handler:
         """
         Send a request to the server with a given command and payload.
 
-        The message is sent as a JSON string, with the length of the message
-        sent first as a 4-byte big-endian integer.
+        Requests share one persistent connection to the server, each tagged with a request ID so several
+        threads (e.g. the console and the listener) can have requests in flight at once. A request that gets no
+        response within the timeout is retried.
 
         Args:
             command: The command to send to the server.
             payload: The payload to send with the command.
 
         Returns:
-            The response from the server, or None if there was an error.
+            The response from the server as a JSON string, or None if there was an error.
         """
-        message = {
-            "command": command,
-            "payload": payload
-        }
-        
         try:
-            with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-                s.connect(self.ADDRESS)
-                self.connected = True
-                json_message = json.dumps(message).encode('utf-8')
-                message_length = len(json_message)
-                
-                # Send the length of the message first (4 bytes, big-endian)
-                s.sendall(struct.pack('>I', message_length))
-                # Then send the actual message
-                s.sendall(json_message)
-                
-                # Receive response from server
-                response_length_data = self._recv_exactly(s, 4)
-                if response_length_data is None:
-                    # print("Failed to receive response length.")
-                    return None
-                
-                response_length = struct.unpack('>I', response_length_data)[0]
-                response = self._recv_exactly(s, response_length)
-                
-                if response is None:
-                    print("Failed to receive full response.")
-                    return None
-
-                return response.decode()
+            response = self.connection.request(command, payload)
+            self.connected = True
+            return json.dumps(response)
         except socket.error as e:
             print(f"{e}")
             self.connected = False
             return None
-    
-    def _recv_exactly(self, sock, length: int):
-        """Helper function to ensure that exactly `length` bytes are read from the socket."""
-        data = b''
-        while len(data) < length:
-            packet = sock.recv(length - len(data))
-            if not packet:
-                return None  # Connection closed or error
-            data += packet
-        return data
         
     def get_user_hash(self, email: str) -> str:
         """
@@ -140,7 +120,7 @@ class socket_handler:
         :param scooterNum: The number of the scooter to update
         :return: The response from the server if the request is successful, otherwise None
         """
-        payload = { "scooter_id": scooterNum, "status": status }
+        payload = { "scooter_id": scooterNum, "status": status, "origin": "agent" }
         return self.send_request("USS", payload)
 
     def report_scooter_fault(self, scooterNum: str, fault: str):
@@ -156,6 +136,34 @@ class socket_handler:
         payload = {"scooter_id": scooterNum, "scooter_ip": ip}
         return self.send_request("USI", payload)
     
+    def send_heartbeat(self, scooterNum: str, status: str):
+        """
+        Tell the Master Pi this scooter is still running, from which IP address, and its current status.
+
+        :param scooterNum: The number of this scooter
+        :param status: The scooter's current status
+        :return: The response from the server if the request is successful, otherwise None
+        """
+        payload = {"scooter_id": scooterNum, "ip_address": self.get_ip(), "status": status}
+        return self.send_request("HB", payload)
+
+    def start_heartbeat(self, scooterNum: str, get_status):
+        """
+        Send a heartbeat now and then every heartbeat_interval seconds on a background thread, so the Master Pi
+        knows this scooter is reachable (and at which IP address) and self.connected stays up to date.
+
+        :param scooterNum: The number of this scooter
+        :param get_status: Returns the scooter's current status
+        """
+        def run():
+            while True:
+                self.send_heartbeat(scooterNum, get_status())
+                time.sleep(self.heartbeat_interval)
+
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        return thread
+
     def update_scooter_location(self, scooterNum: str, lat: float, long: float):
         payload = {"scooter_id": scooterNum, "latitude": lat, "longitude": long}
         return self.send_request("USL", payload)
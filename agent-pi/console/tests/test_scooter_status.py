@@ -0,0 +1,63 @@
+import json
+import time
+import unittest
+from unittest.mock import MagicMock, mock_open, patch
+
+from handlers import scooter_handler as scooter_module
+from handlers.scooter_handler import scooter_handler
+
+
+class TestScooterStatus(unittest.TestCase):
+
+    def setUp(self):
+        scooter_handler._instance = None
+        self.sock = MagicMock()
+        self.sock.get_scooter_info.return_value = json.dumps({"status": "Available", "batteryPercentage": 80})
+        with patch("builtins.open", mock_open(read_data=json.dumps({"scooterNum": 3}))):
+            self.scooter = scooter_handler(self.sock, MagicMock())
+        patcher = patch.object(scooter_module, "STATUS_WRITE_DELAY", 0.05)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        scooter_handler._instance = None
+
+    def test_status_from_master_is_not_written_back(self):
+        self.assertTrue(self.scooter.set_status("Booked", origin="master", version=1))
+        time.sleep(0.15)
+
+        self.assertEqual(self.scooter.get_status(), "Booked")
+        self.sock.set_scooter_status.assert_not_called()
+
+    def test_out_of_date_status_from_master_is_ignored(self):
+        self.scooter.set_status("Booked", origin="master", version=2)
+
+        self.assertFalse(self.scooter.set_status("Available", origin="master", version=1))
+        self.assertEqual(self.scooter.get_status(), "Booked")
+
+    def test_rapid_local_changes_are_written_once(self):
+        self.scooter.set_status("Needs Repair")
+        self.scooter.set_status("Needs Repair")
+        self.scooter.set_status("In Use")
+        time.sleep(0.15)
+
+        self.sock.set_scooter_status.assert_called_once_with("In Use", "3")
+
+    def test_local_change_back_to_known_status_is_not_written(self):
+        self.scooter.set_status("In Use")
+        self.scooter.set_status("Available")
+        time.sleep(0.15)
+
+        self.sock.set_scooter_status.assert_not_called()
+
+    def test_status_from_master_replaces_unwritten_local_change(self):
+        self.scooter.set_status("In Use")
+        self.scooter.set_status("Booked", origin="master", version=1)
+        time.sleep(0.15)
+
+        self.assertEqual(self.scooter.get_status(), "Booked")
+        self.sock.set_scooter_status.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
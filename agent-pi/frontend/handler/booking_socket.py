@@ -45,6 +45,15 @@ class BookingSocket:
         response = self.socket_manager.send_and_receive(message)
         return response
 
+    def iter_booked_scooter_times(self):
+        """Yield every booked scooter time as it is streamed from the Master Pi"""
+
+        message = {
+            "command": "GABS",
+            "payload": {},
+        }
+        return self.socket_manager.stream(message)
+
     def get_booking_details(self, booking_id):
         """Get details on specific bookings"""
 
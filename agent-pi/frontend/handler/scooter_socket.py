@@ -15,6 +15,15 @@ class ScooterSocket:
         response = self.socket_manager.send_and_receive(message)
         return response
 
+    def get_scooter_details_batch(self, scooter_ids):
+        """Get Scooter Details for many scooters in one round trip, in the same order as scooter_ids"""
+
+        messages = [
+            {"command": "GSD", "payload": {"scooter_id": scooter_id}}
+            for scooter_id in scooter_ids
+        ]
+        return self.socket_manager.send_batch(messages)
+
     def get_all_scooters(self):
         """Get all Scooters"""
 
@@ -1,6 +1,14 @@
-import socket
-import struct
 import json
+from scooter_protocol import PipelinedConnection, KEYED_COMMANDS, new_idempotency_key
+
+
+# Largest number of messages the Master Pi accepts in one BATCH
+BATCH_SIZE = 100
+
+# Defaults for "master-pi-timeout" (seconds to wait for each attempt) and "master-pi-retries" in resources.json.
+# Commands that aren't safe to run twice are sent with an idempotency key, so every command can be retried.
+REQUEST_TIMEOUT = 5
+REQUEST_RETRIES = 2
 
 
 class SocketManager:
@@ -13,31 +21,38 @@ class SocketManager:
                 data = json.load(file)
                 cls._instance.host = data["master-pi-IP"]
                 cls._instance.port = data["master-pi-PORT"]
+                timeout = data.get("master-pi-timeout", REQUEST_TIMEOUT)
+                retries = data.get("master-pi-retries", REQUEST_RETRIES)
             cls._instance.address = (cls._instance.host, cls._instance.port)
+            cls._instance.connection = PipelinedConnection(cls._instance.address, timeout=timeout, retries=retries)
         return cls._instance
 
     def send_and_receive(self, message):
-        """Send data to the Master Pi and receive a response"""
-        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-            s.connect(self.address)
-            message_bytes = json.dumps(message).encode()
-            s.sendall(struct.pack(">I", len(message_bytes)))
-            s.sendall(message_bytes)
-
-            raw_msglen = self.recv_all(s, 4)
-            if not raw_msglen:
-                raise ConnectionError("No response from server.")
-
-            msglen = struct.unpack(">I", raw_msglen)[0]
-            response_data = self.recv_all(s, msglen)
-            return json.loads(response_data.decode())
-
-    def recv_all(self, sock, length):
-        """Helper function to receive all bytes"""
-        data = b""
-        while len(data) < length:
-            packet = sock.recv(length - len(data))
-            if not packet:
-                return None
-            data += packet
-        return data
+        """Send data to the Master Pi and receive a response, over the connection shared by the whole app. Timed out requests are retried"""
+        return self.connection.request(message["command"], message.get("payload"))
+
+    def stream(self, message):
+        """Send a list command (GAC, GABS, GABFS) to the Master Pi and yield its records as they arrive, instead of waiting for the whole list"""
+        return self.connection.stream(message["command"], message.get("payload"))
+
+    def send_batch(self, messages, stop_on_error=False):
+        """Send many messages to the Master Pi in one round trip (per BATCH_SIZE messages) and return the responses in order"""
+        responses = []
+        for i in range(0, len(messages), BATCH_SIZE):
+            # Key the entries that aren't safe to run twice, so retrying the batch can't run them again
+            entries = [dict(entry, idempotency_key=new_idempotency_key()) if entry.get("command") in KEYED_COMMANDS
+                       else entry for entry in messages[i:i + BATCH_SIZE]]
+            message = {
+                "command": "BATCH",
+                "payload": {"commands": entries, "stop_on_error": stop_on_error},
+            }
+            response = self.send_and_receive(message)
+            if "results" not in response:
+                raise RuntimeError(response.get("error", "Batch failed"))
+            responses += response["results"]
+
+            if stop_on_error and any(isinstance(r, dict) and "error" in r for r in response["results"]):
+                skipped = {"error": "Skipped after an earlier command failed"}
+                responses += [skipped] * (len(messages) - len(responses))
+                break
+        return responses
@@ -62,7 +62,7 @@ def register_routes(app):
                     response = user_socket.register_user(
                         email, hashed_password, first_name, last_name, phone_no, 0.00, role
                     )
-            except ConnectionRefusedError:
+            except (ConnectionError, TimeoutError):
                 flash("Server connection issue. Please try again later.", "error")
                 return redirect(url_for("register"))
 
@@ -101,7 +101,7 @@ def login_routes(app):
             try:
                 # Use hashed_email for engineers and plain email for customers
                 response = user_socket.login_user(hashed_email)
-            except ConnectionRefusedError:
+            except (ConnectionError, TimeoutError):
                 flash("Server connection issue. Please try again later.", "error")
                 return redirect(url_for("login"))
 
@@ -35,17 +35,37 @@ def booking_routes(app):
         # Define scooters and their costs per minute
         booking_socket = BookingSocket()
         scooter_socket = ScooterSocket()
-        all_scooter_bookings = booking_socket.get_all_booked_scooter_times()
-
-        available_scooter_ids = [
-            scooter["scooterID"]
-            for scooter in all_scooter_bookings["all_booked_scooters"]
-        ]
+        # Bookings are streamed from the Master Pi, so their dates are converted as each chunk arrives
+        booked_scooters = []
+        try:
+            for booking in booking_socket.iter_booked_scooter_times():
+                booking["startDateTime"] = datetime.strptime(
+                    booking["startDateTime"], "%a, %d %b %Y %H:%M:%S GMT"
+                ).isoformat()
+                booking["endDateTime"] = datetime.strptime(
+                    booking["endDateTime"], "%a, %d %b %Y %H:%M:%S GMT"
+                ).isoformat()
+                booked_scooters.append(booking)
+
+            # One entry per scooter, in order of first appearance
+            available_scooter_ids = list(dict.fromkeys(
+                scooter["scooterID"]
+                for scooter in booked_scooters
+            ))
+
+            # Fetch every scooter's details in a single round trip
+            all_details = scooter_socket.get_scooter_details_batch(available_scooter_ids)
+        except (ConnectionError, TimeoutError):
+            flash("Server connection error - Server may be down", "error")
+            return render_template("book_scooter.html", scooters={}, booked_scooters=[])
+        except RuntimeError as e:
+            # The Master Pi answered with an error instead, e.g. because it is busy
+            flash(f"Could not load scooters - {e}", "error")
+            return render_template("book_scooter.html", scooters={}, booked_scooters=[])
 
         available_scooter_details = {}
-        for scooter_id in available_scooter_ids:
-            details = scooter_socket.get_scooter_details(scooter_id)
-            if details["status"] == "Available" or details["status"] == "In Use" or details["status"] == "Booked":
+        for scooter_id, details in zip(available_scooter_ids, all_details):
+            if details.get("status") == "Available" or details.get("status") == "In Use" or details.get("status") == "Booked":
                 available_scooter_details[scooter_id] = details
 
         scooters = {}
@@ -53,15 +73,7 @@ def booking_routes(app):
             name = f"Scooter {id}"
             cost = details["costMin"]
             scooters[name] = cost
-            
 
-        for booking in all_scooter_bookings["all_booked_scooters"]:
-            booking["startDateTime"] = datetime.strptime(
-                booking["startDateTime"], "%a, %d %b %Y %H:%M:%S GMT"
-            ).isoformat()
-            booking["endDateTime"] = datetime.strptime(
-                booking["endDateTime"], "%a, %d %b %Y %H:%M:%S GMT"
-            ).isoformat()
 
         if request.method == "POST":
             # Retrieve form data
@@ -103,7 +115,7 @@ def booking_routes(app):
                 return redirect(url_for("book_scooter"))
 
             # Validate that the booking does not already exist for that scooter
-            for booking in all_scooter_bookings["all_booked_scooters"]:
+            for booking in booked_scooters:
                 if booking["scooterID"] == scooter_id:
                     booked_start = datetime.strptime(
                         booking["startDateTime"], "%Y-%m-%dT%H:%M:%S"
@@ -168,7 +180,7 @@ def booking_routes(app):
         return render_template(
             "book_scooter.html",
             scooters=scooters,
-            booked_scooters=all_scooter_bookings["all_booked_scooters"],
+            booked_scooters=booked_scooters,
         )
 
     @app.route("/view-bookings", methods=["GET", "POST"])
@@ -27,7 +27,7 @@ def dashboard_routes(app):
 
         try:
             all_scooter_details = scooter_socket.get_all_scooters()
-        except ConnectionRefusedError:
+        except (ConnectionError, TimeoutError):
             flash("Server connection error - Server may be down", "error")
             return render_template("dashboard.html", scooters=[], funds=0.0)
 
@@ -24,7 +24,7 @@ def eng_dashboard_routes(app):
 
         try:
             all_scooter_details = scooter_socket.get_all_scooters()
-        except ConnectionRefusedError:
+        except (ConnectionError, TimeoutError):
             flash("Server connection error - Server may be down", "error")
             return render_template("dashboard.html", scooters=[], funds=0.0)
 
@@ -57,11 +57,12 @@ def eng_dashboard_routes(app):
         combined_requests = []
         try:
             fault_log_requests = fault_log_socket.get_open_scooter_faults()
-            for request in fault_log_requests:
-                scooter_details = scooter_socket.get_scooter_details(
-                    request["scooterID"]
-                )
-                if scooter_details:
+            # Fetch the scooter for every fault in a single round trip
+            all_scooter_details = scooter_socket.get_scooter_details_batch(
+                [request["scooterID"] for request in fault_log_requests]
+            )
+            for request, scooter_details in zip(fault_log_requests, all_scooter_details):
+                if scooter_details and "error" not in scooter_details:
                     combined_request = {
                         "faultID": request["faultID"],
                         "scooterID": request["scooterID"],
@@ -77,7 +78,7 @@ def eng_dashboard_routes(app):
                         ),  # Handle resolution if it might not exist
                     }
                     combined_requests.append(combined_request)
-        except ConnectionRefusedError:
+        except (ConnectionError, TimeoutError):
             flash("Server connection error - Server may be down", "error")
             combined_requests = []
 
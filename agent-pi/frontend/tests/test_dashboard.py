@@ -1,6 +1,12 @@
+import socket
 import unittest
+from unittest.mock import patch
 from bs4 import BeautifulSoup
 from app import ScooterWebApp
+from handler.booking_socket import BookingSocket
+from handler.socket_manager import SocketManager
+from handler.user_socket import UserSocket
+from scooter_protocol import PipelinedConnection
 
 
 class DashboardTests(unittest.TestCase):
@@ -37,6 +43,59 @@ class DashboardTests(unittest.TestCase):
             "Flash message does not contain the expected text",
         )
 
+    def test_master_pi_unreachable(self):
+        """Test that the page says the server may be down, rather than failing, when the Master Pi refuses connections"""
+        # A port nothing listens on, so connecting to it is refused
+        with socket.socket() as unused:
+            unused.bind(("127.0.0.1", 0))
+            address = unused.getsockname()
+        manager = object.__new__(SocketManager)
+        manager.connection = PipelinedConnection(address, timeout=1)
+
+        with self.client.session_transaction() as sess:
+            sess["role"] = "Customer"
+        with patch.object(SocketManager, "_instance", manager):
+            response = self.client.get("/home")
+
+        self.assertEqual(response.status_code, 200)
+        message_text = BeautifulSoup(response.data, "html.parser").select_one(".message").get_text(strip=True)
+        self.assertIn("Server may be down", message_text)
+
+    def test_master_pi_busy(self):
+        """Test that the booking page shows the Master Pi's busy reply, rather than failing, when it turns the request away"""
+        def busy_stream():
+            raise RuntimeError("Rate limit exceeded for low priority requests")
+            yield
+
+        with self.client.session_transaction() as sess:
+            sess["role"] = "Customer"
+        with patch.object(SocketManager, "_instance", object.__new__(SocketManager)), \
+                patch.object(UserSocket, "retrieve_user", return_value={"funds": 10.0}), \
+                patch.object(BookingSocket, "iter_booked_scooter_times", side_effect=busy_stream):
+            response = self.client.get("/book-scooter")
+
+        self.assertEqual(response.status_code, 200)
+        message_text = BeautifulSoup(response.data, "html.parser").select_one(".message").get_text(strip=True)
+        self.assertIn("Rate limit exceeded", message_text)
+
+    def test_master_pi_busy_for_scooter_details(self):
+        """Test that the booking page shows the error, rather than failing, when the Master Pi turns the BATCH away"""
+        booking = {"scooterID": 1, "startDateTime": "Tue, 01 Oct 2024 09:30:00 GMT",
+                   "endDateTime": "Tue, 01 Oct 2024 10:30:00 GMT"}
+
+        with self.client.session_transaction() as sess:
+            sess["role"] = "Customer"
+        with patch.object(SocketManager, "_instance", object.__new__(SocketManager)), \
+                patch.object(UserSocket, "retrieve_user", return_value={"funds": 10.0}), \
+                patch.object(BookingSocket, "iter_booked_scooter_times", return_value=iter([booking])), \
+                patch.object(SocketManager, "send_and_receive",
+                             return_value={"error": "Rate limit exceeded for low priority requests", "busy": True}):
+            response = self.client.get("/book-scooter")
+
+        self.assertEqual(response.status_code, 200)
+        message_text = BeautifulSoup(response.data, "html.parser").select_one(".message").get_text(strip=True)
+        self.assertIn("Rate limit exceeded", message_text)
+
 
 if __name__ == "__main__":
     unittest.main()
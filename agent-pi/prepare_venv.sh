@@ -1,3 +1,6 @@
+# The console runs outside the venv, so it needs its own copy of scooter_protocol
+pip install -e ..
+
 cd console
 pip install pipreqs
 pipreqs --force
@@ -7,6 +10,9 @@ cd ..
 python3 -m venv venv
 source venv/bin/activate
 
+# The shared scooter_protocol package, used by every component below
+pip install -e ..
+
 cd frontend
 pip install pipreqs
 pipreqs --force
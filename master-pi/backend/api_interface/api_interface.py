@@ -1,25 +1,151 @@
+import json
+import threading
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import ConnectTimeoutError, NewConnectionError, ReadTimeoutError
+from urllib3.util.retry import Retry
+from scooter_protocol.deadline import DEADLINE_HEADER, time_budget
+
+# Seconds to wait for the database API when the request being handled has no deadline of its own
+DEFAULT_TIMEOUT = 10
+
+# Most keep-alive connections kept open to the database API, and times a request that hits a connection error is
+# retried, unless configured otherwise
+DEFAULT_POOL_SIZE = 16
+DEFAULT_RETRIES = 2
+
+# Seconds to wait before retrying a request, doubled before each further retry
+RETRY_BACKOFF = 0.1
+
+# Requests that may be sent again after the database API might already have received them. A request that failed
+# to connect at all never reached it, so is retried whatever its method. PUT and DELETE are left out even though
+# they are idempotent: one the database API received may still be running, and a retry would be run as well.
+READ_METHODS = frozenset({"GET", "HEAD", "OPTIONS"})
+
+_shared_session = None
+_shared_session_lock = threading.Lock()
+
+
+def _timed_out_connecting(error):
+    """
+    Whether a connection attempt ran out of time. urllib3 raises NewConnectionError, a subclass of
+    ConnectTimeoutError, when the connection is refused, so that case is told apart here.
+    """
+    return isinstance(error, ConnectTimeoutError) and not isinstance(error, NewConnectionError)
+
+
+class DroppedConnectionRetry(Retry):
+    """
+    A Retry that never retries a connect or read that timed out. The timeout is already cut to the deadline of
+    the socket request being handled, so a retry could only overrun it; connections that are refused or drop
+    are still retried, as they fail straight away.
+    """
+
+    def increment(self, method=None, url=None, response=None, error=None, _pool=None, _stacktrace=None):
+        if isinstance(error, ReadTimeoutError):
+            retry = self.new(read=False)
+        elif _timed_out_connecting(error):
+            retry = self.new(connect=False)
+        else:
+            retry = self
+        return super(DroppedConnectionRetry, retry).increment(method, url, response, error, _pool, _stacktrace)
+
+
+def create_session(pool_size=DEFAULT_POOL_SIZE, retries=DEFAULT_RETRIES):
+    """
+    Create a session that keeps connections to the database API open and reuses them, instead of opening a new
+    connection for every request.
+
+    The session may be shared by every thread: the connection pool is thread-safe, and the database API sets no
+    cookies for the threads to race over. A thread needing a connection while all `pool_size` are in use opens an
+    extra one rather than waiting, and it is closed afterwards.
+
+    :param pool_size: Most idle connections kept open to each host.
+    :param retries: Times a request is retried after a connection error, or, for READ_METHODS, after the
+        connection dropped before the response arrived. Timeouts and error responses are never retried.
+    """
+    retry = DroppedConnectionRetry(total=retries, connect=retries, read=retries, status=0, redirect=0,
+                                   allowed_methods=READ_METHODS, backoff_factor=RETRY_BACKOFF,
+                                   raise_on_status=False)
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def shared_session():
+    """Get the session used by APIInterfaces not given one of their own, creating it on first use."""
+    global _shared_session
+    with _shared_session_lock:
+        if _shared_session is None:
+            _shared_session = create_session()
+        return _shared_session
+
 
 class APIInterface:
-    def __init__(self, base_url):
+    def __init__(self, base_url, timeout=DEFAULT_TIMEOUT, session=None):
+        """
+        :param base_url: The database API's URL.
+        :param timeout: Seconds to wait for the database API when the request being handled has no deadline.
+        :param session: The session (see create_session) to send requests with, or None to use shared_session().
+        """
         self.base_url = base_url
+        self.timeout = timeout
+        self.session = session if session is not None else shared_session()
+
+    def _request_options(self, stream=False):
+        """
+        The timeout and headers for the next request to the database API.
+
+        The timeout is cut short by the deadline of the socket request being handled, if it has one, and the time
+        left is sent on in the X-Deadline-Ms header so the database API can stop its query in time too.
+
+        :param stream: Whether the response is streamed. The timeout then applies to each read rather than the
+            whole response, so only the socket request's own deadline is sent on.
+        :raises DeadlineExceeded: If the deadline has already passed, so there is no point sending the request.
+        """
+        deadline = time_budget(None)
+        timeout = self.timeout if deadline is None else min(self.timeout, deadline)
+        if not stream:
+            deadline = timeout
+        headers = {DEADLINE_HEADER: str(int(deadline * 1000))} if deadline is not None else {}
+        return {"timeout": timeout, "headers": headers}
 
     def _send_get_request(self, endpoint, params=None):
         url = f"{self.base_url}/{endpoint}"
-        response = requests.get(url, params=params)
+        response = self.session.get(url, params=params, **self._request_options())
         return response.json()
 
+    def _stream_get_request(self, endpoint, params=None):
+        """
+        Stream a newline-delimited JSON endpoint, yielding each record as soon as its line arrives.
+
+        :raises RuntimeError: If the endpoint reports an error, either as an error status or as an error line.
+        """
+        url = f"{self.base_url}/{endpoint}"
+        with self.session.get(url, params=params, stream=True, **self._request_options(stream=True)) as response:
+            if response.status_code >= 400:
+                raise RuntimeError(f"Streaming {endpoint} failed with status {response.status_code}")
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                record = json.loads(line)
+                if isinstance(record, dict) and set(record) == {"error"}:
+                    raise RuntimeError(record["error"])
+                yield record
+
     def _send_post_request(self, endpoint, data):
         url = f"{self.base_url}/{endpoint}"
-        response = requests.post(url, json=data)
+        response = self.session.post(url, json=data, **self._request_options())
         return response.json()
 
     def _send_put_request(self, endpoint, data=""):
         url = f"{self.base_url}/{endpoint}"
-        response = requests.put(url, json=data)
+        response = self.session.put(url, json=data, **self._request_options())
         return response.json()
 
     def _send_delete_request(self, endpoint):
         url = f"{self.base_url}/{endpoint}"
-        response = requests.delete(url)
+        response = self.session.delete(url, **self._request_options())
         return response.json()
@@ -29,10 +29,23 @@ class BookingAPI(APIInterface):
         endpoint = "booking/get_booked_scooters_times"
         return self._send_get_request(endpoint)
     
+    def stream_booked_scooters_times(self):
+        endpoint = "booking/get_booked_scooters_times/stream"
+        return self._stream_get_request(endpoint)
+
     def update_booking_status_complete(self, booking_id):
         endpoint = f"booking/complete/{booking_id}"
         return self._send_put_request(endpoint)
     
+    def complete_elapsed_bookings(self):
+        endpoint = "booking/complete_elapsed"
+        return self._send_put_request(endpoint)
+
+    def get_booking_changes(self, since, limit=None):
+        endpoint = "booking/changes"
+        params = {"since": since} if limit is None else {"since": since, "limit": limit}
+        return self._send_get_request(endpoint, params)
+
     def update_booking_cost(self, booking_id, booking_data):
         endpoint = f"booking/update_cost/{booking_id}"
         return self._send_put_request(endpoint, booking_data)
@@ -47,4 +60,8 @@ class BookingAPI(APIInterface):
     
     def get_all_bookings_for_scooter(self, scooter_id):
         endpoint = f"booking/scooter/{scooter_id}"
-        return self._send_get_request(endpoint)
\ No newline at end of file
+        return self._send_get_request(endpoint)
+
+    def stream_all_bookings_for_scooter(self, scooter_id):
+        endpoint = f"booking/scooter/{scooter_id}/stream"
+        return self._stream_get_request(endpoint)
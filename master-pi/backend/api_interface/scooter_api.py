@@ -13,6 +13,11 @@ class ScooterAPI(APIInterface):
     def get_all_scooters(self):
         endpoint = "scooter/scooters"
         return self._send_get_request(endpoint)
+
+    def get_scooter_changes(self, since, limit=None):
+        endpoint = "scooter/changes"
+        params = {"since": since} if limit is None else {"since": since, "limit": limit}
+        return self._send_get_request(endpoint, params)
     
     def update_scooter_location(self, scooter_id, scooter_data):
         endpoint = f"scooter/update_location/{scooter_id}"
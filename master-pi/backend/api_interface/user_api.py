@@ -25,6 +25,10 @@ class UserAPI(APIInterface):
         endpoint = "user/customers"
         return self._send_get_request(endpoint)
     
+    def stream_all_customers(self):
+        endpoint = "user/customers/stream"
+        return self._stream_get_request(endpoint)
+
     def update_customer_details(self, email, update_data):
         endpoint = f"user/update_details/{email}"
         return self._send_put_request(endpoint, update_data)
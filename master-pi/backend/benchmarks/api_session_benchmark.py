@@ -0,0 +1,115 @@
+"""
+Benchmark comparing the backend's requests to the database API over a pooled keep-alive session (what APIInterface
+does) with opening a new connection for every request (what it did before, calling requests.get/post/put directly).
+
+Each command makes the same mix of requests as End Booking (EB). By default they go to a local stand-in for the
+database API; pass --url to measure against a running database API instead (only GET requests are sent to it).
+
+Run from the master-pi/backend directory:
+
+    python -m benchmarks.api_session_benchmark
+"""
+import argparse
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+from api_interface.api_interface import APIInterface, create_session
+
+# The requests EB makes: read the booking and scooter, end the booking, charge the customer and update the
+# scooter, then read back what changed
+EB_REQUESTS = ["GET", "GET", "GET", "PUT", "GET", "PUT", "POST", "PUT", "GET"]
+
+
+class LegacyAPIInterface(APIInterface):
+    """APIInterface as it was before the pooled session: a new connection for every request."""
+
+    def _send_get_request(self, endpoint, params=None):
+        return requests.get(f"{self.base_url}/{endpoint}", params=params, **self._request_options()).json()
+
+    def _send_post_request(self, endpoint, data):
+        return requests.post(f"{self.base_url}/{endpoint}", json=data, **self._request_options()).json()
+
+    def _send_put_request(self, endpoint, data=""):
+        return requests.put(f"{self.base_url}/{endpoint}", json=data, **self._request_options()).json()
+
+
+class DatabaseAPIStub(BaseHTTPRequestHandler):
+    """Answers every request with a small JSON object, keeping the connection open like the database API does."""
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def handle_request(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        body = json.dumps({"scooterID": 1, "status": "Available"}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_GET = do_POST = do_PUT = handle_request
+
+    def log_message(self, format, *args):
+        pass
+
+
+def run_command(api, read_only):
+    """Send one EB's worth of requests."""
+    for method in EB_REQUESTS:
+        if method == "GET" or read_only:
+            api._send_get_request("scooter/1")
+        elif method == "PUT":
+            api._send_put_request("scooter/1", {"status": "Available"})
+        else:
+            api._send_post_request("transaction/add_transaction", {"amount": 0})
+
+
+def measure(api, commands, clients, read_only):
+    """Run `commands` commands, `clients` at a time, returning the average seconds each took."""
+    run_command(api, read_only)  # Warm up
+    def timed(_):
+        start = time.perf_counter()
+        run_command(api, read_only)
+        return time.perf_counter() - start
+
+    with ThreadPoolExecutor(clients) as pool:
+        return sum(pool.map(timed, range(commands))) / commands
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--commands", type=int, default=200, help="Commands run for each measurement")
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 8], help="Commands run at once")
+    parser.add_argument("--url", help="A running database API to measure against, instead of a local stand-in")
+    args = parser.parse_args()
+
+    server = None
+    url = args.url
+    if url is None:
+        server = ThreadingHTTPServer(("127.0.0.1", 0), DatabaseAPIStub)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = f"http://127.0.0.1:{server.server_address[1]}"
+
+    session = create_session(pool_size=max(args.clients))
+    implementations = {"per-request": LegacyAPIInterface(url), "pooled": APIInterface(url, session=session)}
+    try:
+        print(f"{'session':<12} {'clients':>8} {'EB latency':>12} {'per request':>12}")
+        for clients in args.clients:
+            for name, api in implementations.items():
+                latency = measure(api, args.commands, clients, read_only=args.url is not None)
+                print(f"{name:<12} {clients:>8} {latency * 1000:>9.2f} ms "
+                      f"{latency * 1000 / len(EB_REQUESTS):>9.3f} ms")
+    finally:
+        session.close()
+        if server is not None:
+            server.shutdown()
+            server.server_close()
+
+
+if __name__ == "__main__":
+    main()
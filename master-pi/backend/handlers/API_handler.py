@@ -3,17 +3,25 @@ from api_interface.booking_api import BookingAPI
 from api_interface.transaction_api import TransactionAPI
 from api_interface.scooter_api import ScooterAPI
 from api_interface.faultlog_api import FaultLogAPI
+from api_interface.api_interface import DEFAULT_TIMEOUT
 
 class api_handler:
-    def __init__(self):
-        self.__base_url = "http://localhost:8080"
+    def __init__(self, base_url="http://localhost:8080", timeout=DEFAULT_TIMEOUT, session=None):
+        """
+        Args:
+            base_url (str): The database API's URL.
+            timeout (float): Seconds to wait for the database API when the request being handled has no deadline.
+            session (requests.Session): The pooled session every client sends its requests with, or None for the
+                shared one (see api_interface.create_session).
+        """
+        self.__base_url = base_url
         
         # Initialize API clients
-        self.__user_api = UserAPI(self.__base_url)
-        self.__booking_api = BookingAPI(self.__base_url)
-        self.__transaction_api = TransactionAPI(self.__base_url)
-        self.__scooter_api = ScooterAPI(self.__base_url)
-        self.__faultlog_api = FaultLogAPI(self.__base_url)
+        self.__user_api = UserAPI(self.__base_url, timeout, session)
+        self.__booking_api = BookingAPI(self.__base_url, timeout, session)
+        self.__transaction_api = TransactionAPI(self.__base_url, timeout, session)
+        self.__scooter_api = ScooterAPI(self.__base_url, timeout, session)
+        self.__faultlog_api = FaultLogAPI(self.__base_url, timeout, session)
     
     ###
     # USER API
@@ -35,6 +43,9 @@ class api_handler:
     
     def get_all_customers(self):
         return self.__user_api.get_all_customers()
+
+    def stream_all_customers(self):
+        return self.__user_api.stream_all_customers()
     
     def update_customer_details(self, email, customer_data):
         return self.__user_api.update_customer_details(email, customer_data)
@@ -54,6 +65,9 @@ class api_handler:
     
     def get_all_scooters(self):
         return self.__scooter_api.get_all_scooters()
+
+    def get_scooter_changes(self, since, limit=None):
+        return self.__scooter_api.get_scooter_changes(since, limit)
     
     def update_scooter_location(self, scooter_id, scooter_data):
         return self.__scooter_api.update_scooter_location(scooter_id, scooter_data)
@@ -81,6 +95,9 @@ class api_handler:
     
     def get_all_bookings_for_scooters(self):
         return self.__booking_api.get_booked_scooters_times()
+
+    def stream_all_bookings_for_scooters(self):
+        return self.__booking_api.stream_booked_scooters_times()
     
     def start_booking(self, payload):
         return self.__booking_api.start_booking(payload)
@@ -91,17 +108,26 @@ class api_handler:
     def set_booking_status_complete(self, booking_id):
         return self.__booking_api.update_booking_status_complete(booking_id)
     
+    def complete_elapsed_bookings(self):
+        return self.__booking_api.complete_elapsed_bookings()
+
     def update_booking_cost(self, booking_id, booking_data):
         return self.__booking_api.update_booking_cost(booking_id, booking_data)
     
     def get_active_bookings(self):
         return self.__booking_api.get_all_active_bookings()
+
+    def get_booking_changes(self, since, limit=None):
+        return self.__booking_api.get_booking_changes(since, limit)
     
     def set_booking_googleID(self, booking_id, google_id):
         return self.__booking_api.set_booking_googleID(booking_id, google_id)
     
     def get_all_bookings_for_scooter(self, scooter_id):
         return self.__booking_api.get_all_bookings_for_scooter(scooter_id)
+
+    def stream_all_bookings_for_scooter(self, scooter_id):
+        return self.__booking_api.stream_all_bookings_for_scooter(scooter_id)
     
     ###
     # TRANSACTION API
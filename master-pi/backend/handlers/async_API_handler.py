@@ -0,0 +1,58 @@
+import asyncio
+import contextvars
+import functools
+
+
+class async_api_handler:
+    """
+    The awaitable counterpart of api_handler, so a command can make independent database API calls at the same
+    time and wait for them together, taking as long as the slowest rather than the sum of them all:
+
+        scooter, customer = run_concurrently(aapi.get_scooter_details(scooter_id), aapi.get_customer_details(email))
+
+    or, inside a coroutine run with asyncio.run, `await asyncio.gather(...)`.
+
+    Every api_handler method is available under the same name and arguments, returning a coroutine. The calls
+    themselves stay blocking, so each runs on a thread of the given executor, with the caller's context (e.g. the
+    deadline of the socket request being handled) copied over. stream_* methods return their generator straight
+    away, so should be called on the api_handler itself instead.
+    """
+
+    def __init__(self, api, executor):
+        """
+        Args:
+            api (api_handler): The api_handler whose methods are run.
+            executor (concurrent.futures.Executor): Runs the calls. It must not be one whose threads wait on
+                these calls, or they could end up waiting on themselves.
+        """
+        self.api = api
+        self.executor = executor
+
+    def __getattr__(self, name):
+        method = getattr(self.api, name)
+        if not callable(method):
+            return method
+
+        @functools.wraps(method)
+        async def call(*args, **kwargs):
+            context = contextvars.copy_context()
+            return await asyncio.get_running_loop().run_in_executor(
+                self.executor, functools.partial(context.run, method, *args, **kwargs))
+
+        return call
+
+
+def run_concurrently(*calls):
+    """
+    Run coroutines (e.g. async_api_handler calls) at the same time on a new event loop, waiting for them all.
+
+    Args:
+        *calls: The coroutines to run.
+
+    Returns:
+        list: Their results, in the order they were given.
+    """
+    async def gather():
+        return await asyncio.gather(*calls)
+
+    return asyncio.run(gather())
@@ -1,95 +1,405 @@
 from email import parser
-import socket
-import json
-import struct
+import asyncio
+import os
 import threading
 import time
 from datetime import datetime, timedelta
 from dateutil import parser
 import pytz
-from threading import Timer
+from concurrent.futures import ThreadPoolExecutor
+from scooter_protocol import ProtocolServer, ServerBusy, StreamingResponse, FleetPublisher
 from .API_handler import api_handler
+from .async_API_handler import async_api_handler, run_concurrently
+from api_interface.api_interface import create_session
 from datetime import datetime
 from utils.email_sender import EmailSender
-from model.booking import Booking
+from utils.config import load_config
+from utils.keyed_lock import KeyedLock
+from utils.command_registry import CommandRegistry, CommandStats, HIGH, NORMAL, LOW, LANES
+from utils.priority_lanes import LaneExecutor, PriorityLanes
+from utils.rate_limiter import RateLimiter, ConnectionLimiter
+from utils.idempotency import IdempotencyStore, request_fingerprint
+from utils.booking_index import BookingIndex
+from utils.change_feed import ChangeFeed
+from utils.timer_queue import TimerQueue
+from utils.agent_dispatcher import AgentDispatcher
+from utils.agent_channels import AgentChannels
+from utils.agent_registry import AgentRegistry
+from utils.agent_outbox import AgentOutbox
 
 AEST = pytz.timezone('Australia/Sydney')
 
+# Every socket command, registered on the socket_handler method that handles it. Commands registered with
+# locked=True modify a ride, and so must not run at the same time as another command on the same booking/scooter.
+commands = CommandRegistry()
+
+# Largest number of commands accepted in a single BATCH message
+MAX_BATCH_SIZE = 100
+
+# How long before a booking starts its scooter is reserved (marked Booked)
+RESERVE_BEFORE = timedelta(minutes=10)
+
+# How long after a booking ends it is completed, so the database's clock has passed its end too
+EXPIRE_AFTER = timedelta(seconds=1)
+
+# Seconds to wait for an Agent Pi to answer, unless the request being handled has less time left than that
+AGENT_TIMEOUT = 5
+
+# Seconds status changes are collected for before they are multicast together, so a change to many scooters at
+# once (e.g. taking the fleet out of service) goes out in one datagram
+FLEET_BATCH_WINDOW = 0.05
+
 class socket_handler:
     def __init__(self):
-        self.AGENT_PI_IP = None
         self.AGENT_PI_PORT = 65001
         self.host = ""
         self.port = 65000
         self.ADDRESS = (self.host, self.port)
         self.previous_statuses = {}
         self.local_tz = pytz.timezone('Australia/Sydney')
+        self.config = load_config()
+        self.workers = int(self.config["backend-workers"])
+        self.compress_threshold = int(self.config["compress-threshold"])
+        self.high_workers = int(self.config["backend-high-workers"])
+        self.low_workers = int(self.config["backend-low-workers"])
+        self.low_queue = int(self.config["backend-low-queue"])
+        self.command_locks = KeyedLock()
+        self.stats = CommandStats()
+        self.lanes = None
+        self.rate_limiter = RateLimiter(self.config["rate-limits"])
+        self.rate_limit_exempt = self.config["rate-limit-exempt"]
+        self.connection_limiter = ConnectionLimiter(int(self.config["max-connections"]),
+                                                    int(self.config["max-connections-per-client"]))
+        self.idempotency = IdempotencyStore(float(self.config["idempotency-ttl"]),
+                                            int(self.config["idempotency-max-keys"]))
+        self.booking_index = BookingIndex(self.parse_iso8601, on_insert=self.schedule_transitions,
+                                          on_remove=self.cancel_transitions)
+        self.scooter_ips = {}
+        self.scooter_cursor = 0
+        self.booking_cursor = 0
+        self.status_lock = threading.Lock()
+        self.status_version = 0
+        self.outbox = AgentOutbox(self.config["agent-outbox-file"])
+        self.agents = AgentRegistry(float(self.config["agent-dead-after"]))
+        self.agent_channels = AgentChannels(self.AGENT_PI_PORT, AGENT_TIMEOUT, float(self.config["agent-keepalive"]))
+        self.agent_channels.start()
+        self.agent_pushes = AgentDispatcher(self.send_request_to_agent, int(self.config["agent-push-workers"]),
+                                            int(self.config["agent-push-retries"]),
+                                            float(self.config["agent-push-backoff"]))
         
-        # Start checking for bookings when the class is initialized
-        self.check_active_bookings()
-        
-        # Start a thread to update scooter statuses
+        # Every request to the database API goes over one pool of keep-alive connections
+        database_api = self.config["database-api"]
+        self.api_session = create_session(int(database_api["pool-size"]), int(database_api["retries"]))
+        self.status_api = self.create_api()
+        # Runs the database API calls a command makes at the same time (see async_api_handler)
+        self.api_calls = ThreadPoolExecutor(max_workers=int(self.config["database-api"]["concurrent-calls"]),
+                                            thread_name_prefix="api-call")
+
+        # Reserve and complete bookings exactly when they are due, as the bookings are indexed. The timer thread
+        # only hands the work to transition_workers, so one slow API call can't hold up every timer behind it
+        self.transition_workers = ThreadPoolExecutor(max_workers=int(self.config["transition-workers"]),
+                                                     thread_name_prefix="transition")
+        self.expiry_lock = threading.Lock()
+        self.expiry_queued = False
+        self.transitions = TimerQueue()
+        self.transitions.start()
+        self.fleet_pending = {}
+        self.fleet = self.start_fleet_channel()
         
-        t_update_scooter_status = threading.Thread(target=self.update_scooter_status_thread, args=(api_handler(),))
+        # Start a thread to update scooter statuses, fed by the database's change notifications when available
+        self.change_feed = self.start_change_feed(self.status_api)
+        t_update_scooter_status = threading.Thread(target=self.update_scooter_status_thread, args=(self.status_api,))
         t_update_scooter_status.daemon = True
         t_update_scooter_status.start()
         
-        # Set a timer to run the check every hour
-        self.schedule_booking_check()
-        api = api_handler()
+        api = self.create_api()
 
         self.start_listening(api)
 
+    def create_api(self):
+        """
+        Create an api_handler for the database API configured by "database-api" in resources.json, sending its
+        requests over the shared pool of keep-alive connections.
+
+        Returns:
+            api_handler: The new api_handler.
+        """
+        database_api = self.config["database-api"]
+        return api_handler(database_api["url"], float(database_api["timeout"]), self.api_session)
+
     def start_listening(self, api):
-        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-            s.bind(self.ADDRESS)
-            s.listen()
-            print("Listening on {}...".format(self.ADDRESS))
-
-            while True:
-                conn, addr = s.accept()
-                with conn:
-                    print(f"Connected by {addr}")
-
-                    try:
-                        # First, receive the length of the incoming message (4 bytes, big-endian)
-                        raw_msglen = self.recv_all(conn, 4)
-                        if not raw_msglen:
-                            return
-                        msglen = struct.unpack(">I", raw_msglen)[0]
-
-                        # Now, receive the actual message based on the length
-                        received_data = self.recv_all(conn, msglen)
-                        if not received_data:
-                            return
-
-                        # Decode the received bytes into a string
-                        message_str = received_data.decode()
-                        print(f"Received message: {message_str}")
-
-                        # Deserialize the JSON string to a Python dictionary
-                        message = json.loads(message_str)
-
-                        # Handle the command and payload
-                        command = message.get("command")
-                        payload = message.get("payload")
-
-                        response_str = self.command_handler(command, payload, api)
-                        response_bytes = response_str.encode()
-                        # Send the response length and the response itself
-                        conn.sendall(struct.pack(">I", len(response_bytes)))
-                        conn.sendall(response_bytes)
-
-                    except json.JSONDecodeError:
-                        print("Failed to decode JSON message from client.")
-
-                    print("Disconnecting from client.")
+        """
+        Accept client connections and run their commands on bounded pools of worker threads.
+
+        Each priority lane has its own pool, sized by "backend-high-workers", "backend-workers" and
+        "backend-low-workers" in resources.json, so ride-critical commands never queue behind admin reporting and
+        one slow command only ties up a single worker. The low lane holds at most "backend-low-queue" commands;
+        past that, low priority commands are turned away with an error instead of piling up. Connections stay open
+        for as many requests as the client sends; requests tagged with a request ID are answered as soon as they
+        finish. Each client is held to the "rate-limits" of each lane and the "max-connections-per-client" cap, so
+        one misbehaving client can't starve the rest.
+
+        Args:
+            api (api_handler): The api_handler instance shared by the workers.
+        """
+        lanes = {
+            HIGH: LaneExecutor(HIGH, self.high_workers),
+            NORMAL: LaneExecutor(NORMAL, self.workers),
+            LOW: LaneExecutor(LOW, self.low_workers, capacity=self.low_queue),
+        }
+        with PriorityLanes(lanes) as self.lanes:
+            server = ProtocolServer(self.ADDRESS, lambda message, addr: self.handle_message(message, addr, api),
+                                    lanes[NORMAL], compress_threshold=self.compress_threshold,
+                                    choose_executor=lambda message: self.lanes.executor(self.message_lane(message)),
+                                    admit_message=self.admit_message,
+                                    connection_limiter=self.connection_limiter)
+            server.bind()
+            print("Listening on {} with {}/{}/{} high/normal/low priority workers...".format(
+                self.ADDRESS, self.high_workers, self.workers, self.low_workers))
+            server.serve_forever()
         print("Done.")
+
+    def message_lane(self, message):
+        """
+        Get the priority lane a message runs in.
+
+        A BATCH runs in the least important lane of the commands in it, so batching can't be used to jump the queue.
+
+        Args:
+            message (dict): The decoded message, containing the command and payload.
+
+        Returns:
+            str: HIGH, NORMAL or LOW.
+        """
+        command = message.get("command")
+        payload = message.get("payload")
+        if command == "BATCH" and isinstance(payload, dict) and isinstance(payload.get("commands"), list):
+            lanes = [commands.lane(entry.get("command")) for entry in payload["commands"] if isinstance(entry, dict)]
+            return max(lanes, key=LANES.index, default=NORMAL)
+        return commands.lane(command)
+
+    def admit_message(self, message, addr):
+        """
+        Check a message against its client's rate limit for the lane it runs in, before it is queued.
+
+        Clients are keyed by IP address, so opening more connections doesn't raise a client's limit. A BATCH uses
+        up one request of the allowance for each command in it. The frontends send every user's requests from
+        one address, so the clients listed in "rate-limit-exempt" aren't limited at all (see is_rate_limited).
+
+        Args:
+            message (dict): The decoded message, containing the command and payload.
+            addr (tuple): The address of the client.
+
+        Raises:
+            ServerBusy: If the client is over its rate limit, so the message is answered with an error straight away.
+        """
+        if not isinstance(message, dict) or not self.is_rate_limited(addr[0]):
+            return
+        lane = self.message_lane(message)
+        cost = 1
+        payload = message.get("payload")
+        if message.get("command") == "BATCH" and isinstance(payload, dict) and isinstance(payload.get("commands"), list):
+            cost = max(len(payload["commands"]), 1)
+
+        if not self.rate_limiter.allow(addr[0], lane, cost):
+            raise ServerBusy(f"Rate limit exceeded for {lane} priority requests. Try again shortly.")
+
+    def is_rate_limited(self, ip):
+        """
+        Whether the rate limits apply to a client, i.e. it isn't one of the "rate-limit-exempt" IP addresses or,
+        if "agents" is on there, an Agent Pi that has sent heartbeats.
+
+        Args:
+            ip (str): The client's IP address.
+
+        Returns:
+            bool: True if the client's requests are rate limited.
+        """
+        exempt = self.rate_limit_exempt
+        if ip in exempt.get("ips", []):
+            return False
+        return not (exempt.get("agents") and self.agents.knows(ip))
+
+    def handle_message(self, message, addr, api):
+        """
+        Run a single message received from a client.
+
+        Args:
+            message (dict): The decoded message, containing the command and payload.
+            addr (tuple): The address of the client.
+            api (api_handler): The api_handler instance to run the command with.
+
+        Returns:
+            The response to send back to the client.
+        """
+        print(f"Received message from {addr}: {message}")
+        return self.run_command(message.get("command"), message.get("payload"), api, message.get("idempotency_key"))
+
+    def run_command(self, command, payload, api, idempotency_key=None):
+        """
+        Run a command while holding the locks for the booking and scooter it changes, recording its latency and
+        whether it failed in self.stats.
+
+        If the message carried an idempotency key, a command already run with that key isn't run again; the
+        response it gave is returned instead (see IdempotencyStore).
+
+        Args:
+            command (str): Command sent by the client.
+            payload (dict): Payload sent by the client.
+            api (api_handler): The api_handler instance to run the command with.
+            idempotency_key (str): Optional key the client sends with every attempt of one request.
+
+        Returns:
+            The response containing the result of the command.
+        """
+        if idempotency_key is not None:
+            return self.idempotency.run(idempotency_key, request_fingerprint(command, payload),
+                                        lambda: self.run_command(command, payload, api),
+                                        keep=self.is_replayable)
+        code = command if commands.get(command) is not None else "UNKNOWN"
+        start = time.perf_counter()
+        try:
+            with self.command_locks.hold(*self.lock_keys(command, payload)):
+                response = self.command_handler(command, payload, api)
+        except Exception:
+            self.stats.record(code, time.perf_counter() - start, error=True)
+            raise
+
+        if isinstance(response, StreamingResponse):
+            # A streamed response is only finished once its records have been sent
+            response.records = self.stats.time_records(code, response.records, start)
+        else:
+            self.stats.record(code, time.perf_counter() - start, isinstance(response, dict) and "error" in response)
+        return response
+
+    def is_replayable(self, response):
+        """
+        Whether a response may be replayed to a retry. Errors aren't, so the retry runs the command again, and
+        streamed responses aren't, as their records can only be sent once.
+        """
+        return not isinstance(response, StreamingResponse) and not (isinstance(response, dict) and "error" in response)
+
+    def run_batch(self, payload, api):
+        """
+        Run an ordered list of commands sent in a single BATCH message.
+
+        Each command runs (and locks) exactly as if it had been sent on its own, including its own optional
+        "idempotency_key". A failing command only fails its own entry, unless "stop_on_error" is set, in which
+        case every entry after it is skipped.
+
+        Args:
+            payload (dict): {"commands": [{"command": str, "payload": dict, "idempotency_key": str}, ...],
+                "stop_on_error": bool}
+            api (api_handler): The api_handler instance to run the commands with.
+
+        Returns:
+            dict: {"results": [...]} with one result per command, in the same order.
+        """
+        entries = payload.get("commands", [])
+        stop_on_error = payload.get("stop_on_error", False)
+        if len(entries) > MAX_BATCH_SIZE:
+            return {"error": f"Batch is limited to {MAX_BATCH_SIZE} commands"}
+
+        results = []
+        failed = False
+        for entry in entries:
+            if failed and stop_on_error:
+                results.append({"error": "Skipped after an earlier command failed"})
+                continue
+
+            if not isinstance(entry, dict):
+                result = {"error": "Invalid batch entry"}
+            elif entry.get("command") == "BATCH":
+                result = {"error": "Batches can't be nested"}
+            else:
+                try:
+                    result = self.run_command(entry.get("command"), entry.get("payload"), api,
+                                              entry.get("idempotency_key"))
+                    if isinstance(result, StreamingResponse):
+                        result = result.collect()
+                except Exception as e:
+                    print(f"Error running batched {entry.get('command')}: {e}")
+                    result = {"error": str(e)}
+
+            if isinstance(result, dict) and "error" in result:
+                failed = True
+            results.append(result)
+        return {"results": results}
+
+    def lock_keys(self, command, payload):
+        """
+        Get the lock keys for the booking and scooter a command changes.
+
+        Bookings are always locked before scooters (keys are sorted), EB locks its scooter once it has looked it up.
+
+        Args:
+            command (str): Command sent by the client.
+            payload (dict): Payload sent by the client.
+
+        Returns:
+            list: Keys in the form ("booking", id) and ("scooter", id), empty for read-only commands.
+        """
+        registered = commands.get(command)
+        if registered is None or not registered.locked or not isinstance(payload, dict):
+            return []
+
+        keys = []
+        if payload.get("booking_id") is not None:
+            keys.append(("booking", str(payload["booking_id"])))
+        if payload.get("scooter_id") is not None:
+            keys.append(("scooter", str(payload["scooter_id"])))
+        return keys
         
+    def start_change_feed(self, api):
+        """
+        Start listening for scooter, booking and fault changes from the database, if "change-feed" is on, psycopg2
+        is installed and the database info file named by "database-info" exists.
+
+        Args:
+            api (api_handler): The api_handler instance to handle changes with.
+
+        Returns:
+            ChangeFeed: The running feed, or None if the status thread has to poll instead.
+        """
+        db_info = self.config["database-info"]
+        if not self.config["change-feed"] or not ChangeFeed.available() or not os.path.exists(db_info):
+            print("Database change feed unavailable, polling for scooter status changes instead.")
+            return None
+        feed = ChangeFeed(db_info, self.apply_change, lambda: self.resync_scooters(api))
+        feed.start()
+        return feed
+
+    def start_fleet_channel(self):
+        """
+        Start multicasting scooter status changes to the Agent Pis, if "fleet-multicast" is enabled, announcing
+        the latest sequence number every "announce-interval" seconds so agents notice datagrams they missed.
+
+        Returns:
+            FleetPublisher: The publisher, or None if each agent is sent its own USS instead.
+        """
+        settings = self.config["fleet-multicast"]
+        if not settings.get("enabled"):
+            return None
+        fleet = FleetPublisher(settings["group"], int(settings["port"]), int(settings["ttl"]))
+        interval = float(settings["announce-interval"])
+
+        def announce():
+            fleet.announce()
+            self.transitions.schedule(("fleet", "announce"), time.time() + interval, announce)
+
+        self.transitions.schedule(("fleet", "announce"), time.time() + interval, announce)
+        print(f"Multicasting scooter status changes to {fleet.address}.")
+        return fleet
+
     def update_scooter_status_thread(self, api):
         
         """
-        Periodically polls the API for scooter status updates and sends the updated status to the agent.
+        Keeps the Agent Pis' scooter statuses and the booking index up to date while the change feed isn't.
+
+        While the database change feed is connected, changes arrive through apply_change as they happen and
+        this thread has nothing to do. Otherwise each tick reads the scooters and bookings changed since the last
+        tick, applying the changes to self.booking_index, which schedules the bookings' transitions (see
+        schedule_transitions).
 
         Args:
             api (APIInterface): The APIInterface instance to use for getting scooter status updates.
@@ -99,574 +409,967 @@ class socket_handler:
         """
        
         while True:
-            scooter_response = api.get_all_scooters()
-            booking_response = api.get_all_bookings_for_scooters().get('all_booked_scooters', [])
-            current_time = datetime.now(AEST)
-
-            # Updating scooter status on AP if status has changed
-            for scooter in scooter_response:
-                scooter_id = scooter["scooterID"]
-                status = scooter["status"]
-                
-                if scooter_id not in self.previous_statuses:
-                    self.previous_statuses[scooter_id] = status
-                elif self.previous_statuses[scooter_id] != status:
-                    print(f"Scooter {scooter_id} changed status from {self.previous_statuses[scooter_id]} to {status}.")
-                    self.previous_statuses[scooter_id] = status
-                    self.send_request_to_agent(scooter["ipAddress"], "USS", {"status": status})
-                
-                for booking in booking_response:
-                    if isinstance(booking, dict) and "scooterID" in booking:
-                        if booking.get("status") == "Active" and booking.get("scooterID") == scooter_id and status == "Available":
-                            # print(f"Booking Status: {booking.get("status")}")
-                            start_time = self.parse_iso8601(booking.get("startDateTime"))
-                            end_time = self.parse_iso8601(booking.get("endDateTime"))
-                            if start_time - timedelta(minutes=10) <= current_time< start_time:
-                                print(current_time + timedelta(minutes=10))
-                                print(f"Booking: {booking}")
-                                print("10 minutes before start time")
-                                scooter_data = {"scooter_id": scooter_id, "status": "Booked"}
-                                api.set_scooter_status(scooter_data)
-                                self.send_request_to_agent(scooter["ipAddress"], "USS", {"status": "Booked"})
-
-                            # Check if current time is between start_time and end_time
-                            elif start_time < current_time < end_time:
-                                print(f"Booking: {booking}")
-                                print("In between start and end time")
-                                scooter_data = {"scooter_id": scooter_id, "status": "Booked"}
-                                self.previous_statuses[scooter_id] = "Booked"
-                                api.set_scooter_status(scooter_data)
-                                self.send_request_to_agent(scooter["ipAddress"], "USS", {"status": "Booked"})
-                            # Otherwise check if the time is after or before the start or end
-                            else:
-                                if current_time < start_time:
-                                    print("Before start time")
-                                elif current_time > end_time:
-                                    print("After end time")
-                                else:
-                                    print("Error in time comparison")
+            if self.change_feed is None or not self.change_feed.connected.is_set():
+                self.resync_scooters(api)
             time.sleep(5)
 
+    def resync_scooters(self, api):
+        """
+        Catch up on the scooters and bookings changed since the last resync, pushing any status that changed to
+        its Agent Pi. Bookings that elapsed while the backend wasn't watching (e.g. during an outage) are
+        completed first, all at once.
+
+        Only the rows changed since the cursors the last resync was given are read, so a resync costs time in
+        proportion to what changed rather than to the size of the tables. The first resync reads everything, as
+        does one whose cursor is older than the deletions the database keeps; rows it knows that such a read
+        doesn't return have been deleted. If the changes can't be read, every scooter and Active booking is read
+        instead.
+
+        Args:
+            api (api_handler): The api_handler instance to read with.
+        """
+        changes = self.read_changes(api.get_scooter_changes, "scooters", self.scooter_cursor)
+        if changes is None:
+            scooters, deleted = api.get_all_scooters(), []
+        else:
+            scooters, deleted, self.scooter_cursor, full = changes
+            if full:
+                current = {scooter.get("scooterID") for scooter in scooters}
+                with self.status_lock:
+                    deleted = [scooter_id for scooter_id in self.previous_statuses if scooter_id not in current]
+        for scooter in scooters:
+            self.apply_scooter_status(scooter)
+        for scooter_id in deleted:
+            self.forget_scooter(scooter_id)
+        for scooter_id in self.outbox.scooters():
+            self.deliver(scooter_id)
+
+        self.expire_bookings(api)
+        changes = self.read_changes(api.get_booking_changes, "bookings", self.booking_cursor)
+        if changes is None:
+            active_bookings = api.get_active_bookings()
+            if isinstance(active_bookings, dict) and "active_bookings" in active_bookings:
+                self.booking_index.refresh(active_bookings["active_bookings"] or [])
+            return
+        bookings, deleted, self.booking_cursor, full = changes
+        if full:
+            self.booking_index.refresh([booking for booking in bookings if booking.get("status") == "Active"])
+            return
+        for booking in bookings:
+            self.booking_index.apply(booking)
+        for booking_id in deleted:
+            self.booking_index.discard(booking_id)
+
+    def read_changes(self, read, key, cursor):
+        """
+        Read every row changed since a cursor, a page at a time. If the database answers that the cursor is older
+        than the deletions it keeps, every row is read again from cursor 0.
+
+        Args:
+            read (callable): Reads a page of changes from a cursor, e.g. api.get_scooter_changes.
+            key (str): The key the changed rows are under, "scooters" or "bookings".
+            cursor (int): The cursor to read from, 0 for every row.
+
+        Returns:
+            tuple: (changed rows, deleted IDs, new cursor, whether every row was read), or None if the changes
+            couldn't be read.
+        """
+        changed, deleted, full = [], [], cursor == 0
+        while True:
+            page = read(cursor)
+            if not isinstance(page, dict) or not isinstance(page.get("cursor"), int):
+                return None
+            if page.get("resync") and not full:
+                changed, deleted, cursor, full = [], [], 0, True
+                continue
+            changed += page.get(key) or []
+            deleted += page.get("deleted") or []
+            cursor = page["cursor"]
+            if not page.get("more"):
+                return changed, deleted, cursor, full
+
+    def forget_scooter(self, scooter_id):
+        """
+        Forget a scooter that has been deleted.
+
+        Args:
+            scooter_id (int): The scooter.
+        """
+        with self.status_lock:
+            self.previous_statuses.pop(scooter_id, None)
+            self.scooter_ips.pop(scooter_id, None)
+
+    def apply_change(self, change):
+        """
+        Apply one change from the database change feed.
+
+        Args:
+            change (dict): The notification payload, with "table", "op" and the changed row's fields.
+        """
+        table = change.get("table")
+        if table == "scooter":
+            if change.get("op") == "DELETE":
+                self.forget_scooter(change.get("scooterID"))
+            else:
+                self.apply_scooter_status(change)
+        elif table == "booking":
+            if change.get("op") == "DELETE":
+                self.booking_index.discard(change.get("bookingID"))
+            else:
+                self.booking_index.apply(change)
+        elif table == "fault":
+            print(f"Fault {change.get('faultID')} on scooter {change.get('scooterID')} is now {change.get('status')}.")
+
+    def apply_scooter_status(self, scooter):
+        """
+        Record a scooter's status and IP address, pushing the status to its Agent Pi if it changed.
+
+        Args:
+            scooter (dict): The scooter's scooterID, status and ipAddress.
+        """
+        scooter_id = scooter["scooterID"]
+        status = scooter["status"]
+        if scooter.get("ipAddress"):
+            self.agent_channels.assign(scooter_id, scooter["ipAddress"])
+        with self.status_lock:
+            self.scooter_ips[scooter_id] = scooter.get("ipAddress")
+            previous = self.previous_statuses.get(scooter_id)
+            self.previous_statuses[scooter_id] = status
+            changed = previous is not None and previous != status
+            if changed:
+                self.queue_status(scooter_id, status)
+        if changed:
+            print(f"Scooter {scooter_id} changed status from {previous} to {status}.")
+            self.deliver(scooter_id)
+            if status == "Available":
+                # Its booking's reservation may have come due while it was unavailable
+                self.reserve_scooter(scooter_id, datetime.now(AEST), self.status_api)
+
+    def schedule_transitions(self, booking):
+        """
+        Schedule a booking's transitions: reserving its scooter RESERVE_BEFORE it starts, and completing it (along
+        with any other elapsed bookings) when it ends. Transitions that are already due fire straight away. The
+        timers run the transitions on transition_workers rather than on the timer thread. Called by the booking
+        index as it is inserted.
+
+        Args:
+            booking (IndexedBooking): The booking.
+        """
+        self.transitions.schedule(("reserve", booking.booking_id), (booking.start - RESERVE_BEFORE).timestamp(),
+                                  lambda: self.transition_workers.submit(self.run_transition, self.reserve_scooter,
+                                                                         booking.scooter_id, datetime.now(AEST),
+                                                                         self.status_api))
+        self.transitions.schedule(("complete", booking.booking_id), (booking.end + EXPIRE_AFTER).timestamp(),
+                                  self.queue_expiry)
+
+    def queue_expiry(self):
+        """
+        Complete the elapsed bookings on a transition worker. Nothing more is queued while a run is still waiting
+        to start, since that run completes every booking elapsed by then.
+        """
+        with self.expiry_lock:
+            if self.expiry_queued:
+                return
+            self.expiry_queued = True
+        self.transition_workers.submit(self.run_transition, self.run_expiry)
+
+    def run_expiry(self):
+        """Complete the elapsed bookings, queued by queue_expiry."""
+        with self.expiry_lock:
+            self.expiry_queued = False
+        self.expire_bookings(self.status_api)
+
+    def run_transition(self, transition, *args):
+        """
+        Run a booking transition on a transition worker, logging it if it fails, as the timer thread would.
+
+        Args:
+            transition (callable): The transition, e.g. reserve_scooter.
+            *args: Its arguments.
+        """
+        try:
+            transition(*args)
+        except Exception as e:
+            print(f"Error running transition {transition.__name__}: {e}")
+
+    def cancel_transitions(self, booking):
+        """
+        Cancel a booking's transitions. Called by the booking index as it is removed.
+
+        Args:
+            booking (IndexedBooking): The booking.
+        """
+        self.transitions.cancel(("reserve", booking.booking_id))
+        self.transitions.cancel(("complete", booking.booking_id))
+
+    def index_booking(self, booking_id, api):
+        """
+        Read a booking and apply it to the booking index, scheduling (or cancelling) its transitions.
+
+        Args:
+            booking_id (int): The booking to read.
+            api (api_handler): The api_handler instance to read it with.
+        """
+        booking = api.get_booking(booking_id=booking_id)
+        if isinstance(booking, dict) and booking.get("bookingID") is not None:
+            self.booking_index.apply(booking)
+
+    def expire_bookings(self, api):
+        """
+        Mark every Active booking whose end has passed as Complete, in one request however many there are, and
+        release the scooters that were reserved for them.
+
+        Args:
+            api (api_handler): The api_handler instance to update them with.
+
+        Returns:
+            int: The number of bookings completed.
+        """
+        response = api.complete_elapsed_bookings()
+        completed = response.get("completed_bookings") if isinstance(response, dict) else None
+        if not completed:
+            return 0
+
+        print(f"{len(completed)} bookings have elapsed and were marked as complete.")
+        for booking in completed:
+            self.booking_index.discard(booking["bookingID"])
+        for scooter_id in {booking["scooterID"] for booking in completed if booking["scooterID"] is not None}:
+            self.release_scooter(scooter_id, api)
+        return len(completed)
+
+    def release_scooter(self, scooter_id, api):
+        """
+        Make a scooter that was reserved for a booking that has elapsed Available again, unless its next booking
+        is already due to be reserved.
+
+        Args:
+            scooter_id (int): The scooter.
+            api (api_handler): The api_handler instance to update it with.
+        """
+        now = datetime.now(AEST)
+        booking = self.booking_index.next_booking(scooter_id, now)
+        with self.status_lock:
+            if self.previous_statuses.get(scooter_id) != "Booked":
+                return  # Still being ridden, or taken out of service
+            if booking is not None and booking.start - RESERVE_BEFORE <= now:
+                return
+            self.previous_statuses[scooter_id] = "Available"
+            self.queue_status(scooter_id, "Available")
+
+        api.set_scooter_status({"scooter_id": scooter_id, "status": "Available"})
+        self.deliver(scooter_id)
+
+    def reserve_scooter(self, scooter_id, now, api):
+        """
+        Mark a scooter as Booked if it is Available and its next booking starts within 10 minutes or is under way.
+
+        Args:
+            scooter_id (int): The scooter to check.
+            now (datetime): The current time.
+            api (api_handler): The api_handler instance to update the scooter with.
+        """
+        booking = self.booking_index.next_booking(scooter_id, now)
+        if booking is None:
+            return
+        with self.status_lock:
+            if self.previous_statuses.get(scooter_id) != "Available":
+                return
+            if booking.start - RESERVE_BEFORE <= now < booking.start:
+                print(f"Booking {booking.booking_id} starts in under 10 minutes, reserving scooter {scooter_id}.")
+            # Check if current time is between start_time and end_time
+            elif booking.start < now < booking.end:
+                print(f"Booking {booking.booking_id} is in progress, reserving scooter {scooter_id}.")
+            else:
+                return
+            # Recorded first, so the change feed's notification of this update isn't pushed a second time
+            self.previous_statuses[scooter_id] = "Booked"
+            self.queue_status(scooter_id, "Booked")
+
+        api.set_scooter_status({"scooter_id": scooter_id, "status": "Booked"})
+        self.deliver(scooter_id)
+
   
+    def queue_status(self, scooter_id, status):
+        """
+        Queue a scooter's new status to be sent to its Agent Pi: multicast along with the rest of the fleet's
+        changes within FLEET_BATCH_WINDOW if the fleet channel is on, otherwise put in its outbox for deliver().
+        Must be called holding status_lock, so statuses are queued in the order they were recorded.
+
+        A USS is marked as coming from the master, so the agent applies it without writing it back, and carries a
+        version (milliseconds since the epoch, made unique) so the agent can ignore one older than it has applied.
+
+        Args:
+            scooter_id (int): The scooter.
+            status (str): Its new status.
+        """
+        if self.fleet is None:
+            self.status_version = max(self.status_version + 1, int(time.time() * 1000))
+            self.outbox.put(scooter_id, "USS", {"status": status, "origin": "master", "version": self.status_version})
+            return
+        self.fleet_pending[scooter_id] = status
+        if self.transitions.due(("fleet", "flush")) is None:
+            self.transitions.schedule(("fleet", "flush"), time.time() + FLEET_BATCH_WINDOW, self.flush_fleet)
+
+    def flush_fleet(self):
+        """
+        Multicast the status changes collected since the last flush.
+
+        Returns:
+            int: The number of datagrams sent.
+        """
+        with self.status_lock:
+            statuses, self.fleet_pending = self.fleet_pending, {}
+        return self.fleet.publish(statuses) if statuses else 0
+
+    def deliver(self, scooter_id):
+        """
+        Send the commands waiting in a scooter's outbox to its Agent Pi in the background, removing each once the
+        agent has answered it. Commands that fail stay in the outbox until the next delivery, e.g. the agent's
+        next heartbeat.
+
+        :param scooter_id: The scooter to deliver to.
+        :return: The number of commands sent, 0 if the agent has no IP address or has stopped sending heartbeats.
+        """
+        with self.status_lock:
+            ip = self.scooter_ips.get(scooter_id)
+        if not ip or self.agents.is_dead(ip):
+            return 0
+
+        entries = self.outbox.take(scooter_id)
+        for entry in entries:
+            future = self.agent_pushes.push(ip, entry["command"], entry["payload"])
+            future.add_done_callback(
+                lambda future, entry_id=entry["id"]: self.outbox.done(scooter_id, entry_id, future.result() is not None))
+        return len(entries)
+
     def send_request_to_agent(self, ip: str, command: str, payload: dict):
         """
-        Send a request to the Agent Pi at the given IP address.
+        Send a request to the Agent Pi at the given IP address, over its persistent channel.
+
+        The request is given AGENT_TIMEOUT seconds, or what is left of the current request's deadline if that is
+        less, so an unreachable agent can't hold up the worker calling it. An agent that failed recently is
+        failed straight away until it is due a reconnect (see AgentChannels).
         
         :param ip: The IP address of the Agent Pi to send the request to.
         :param command: The command to send to the Agent Pi.
         :param payload: The payload to send to the Agent Pi.
-        :return: The response from the Agent Pi as a string, or None if the request failed.
+        :return: The response from the Agent Pi, or None if the request failed.
         """
-        
-        self.AGENT_PI_IP = ip
-        message = {
-            "command": command,
-            "payload": payload
-        }
-
-        agent_address = (self.AGENT_PI_IP, self.AGENT_PI_PORT)
-        print(f"Sending request to Agent Pi at {agent_address}: {message}")
+        print(f"Sending request to Agent Pi at {ip}: {command} {payload}")
         try:
-            with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-                s.connect(agent_address)
-                json_message = json.dumps(message).encode('utf-8')
-                message_length = len(json_message)
-                
-                # Send the length of the message first (4 bytes, big-endian)
-                s.sendall(struct.pack('>I', message_length))
-                # Then send the actual message
-                s.sendall(json_message)
-                
-                # Receive response from Agent Pi
-                response_length_data = self._recv_exactly(s, 4)
-                if response_length_data is None:
-                    print("Failed to receive response length.")
-                    self.AGENT_PI_IP = None
-                    return None
-                
-                response_length = struct.unpack('>I', response_length_data)[0]
-                response = self._recv_exactly(s, response_length)
-                
-                if response is None:
-                    print("Failed to receive full response.")
-                    self.AGENT_PI_IP = None
-                    return None
-
-                self.AGENT_PI_IP = None
-                return response.decode()
-        except socket.error as e:
+            return self.agent_channels.request(ip, command, payload)
+        except (ConnectionError, TimeoutError) as e:
             print(f"Can't connect to Agent Pi: {e}")
-            self.AGENT_PI_IP = None
             return None
         
     def command_handler(self, command, payload, api):
         """
-        Handle commands and payloads from clients.
+        Handle commands and payloads from clients by calling the handler registered for the command.
 
         Args:
             command (str): Command sent by the client.
             payload (dict): Payload sent by the client.
 
         Returns:
-            str: JSON response containing the result of the command.
+            The response containing the result of the command, encoded for the client by the transport.
         """
-        
-        ###
-        # Booking API
-        ###            
-        if command == "CB": #Cancel booking
-            print(f"Cancel booking requested for user: {payload['booking_id']}")
-            response = api.cancel_booking(booking_id=payload['booking_id'])
-            
-            return json.dumps(response)
-                
-        elif command == "AB": #Add booking
-            print("Add booking")
-            response = api.add_booking(payload)
-            
-            return json.dumps(response)
-            
-        elif command == "GBD": #Get booking details
-            print(f"Get booking details requested for user: {payload['booking_id']}")
-            response = api.get_booking(booking_id=payload['booking_id'])
-            
-            return json.dumps(response)
-        
-        
-        elif command == "SB":  # Start booking
-            print(f"Start booking requested for booking id: {payload['booking_id']}")
-            response = api.get_booking(booking_id=payload['booking_id'])
-            print(f"get booking response {response}")
-            # Parse the date strings into datetime objects
-            try:
-                booking_start = self.parse_iso8601(response.get("startDateTime"))
-                booking_end = self.parse_iso8601(response.get("endDateTime"))
-                # booking_start = AEST.localize(booking_start)
-                # booking_end = AEST.localize(booking_end)
-                actual_start = datetime.now(AEST)
-                print("done with times")
-            except ValueError:
-                print("Invalid datetime format")
-                return json.dumps({"error": "Invalid datetime format"})
-            
-            print(f"Actual start: {actual_start}")
-            print(f"Booking start: {booking_start}")
-            print(f"Booking end: {booking_end}")
-            
-            # Check if the email or scooterID don't match or if the start time is outside the booking window
-            if (response.get("email") != payload.get("email") or 
-                str(response.get("scooterID")) != str(payload.get("scooter_id")) or 
-                not (booking_start <= actual_start <= booking_end)):
-                    print("Booking does not match user")
-                    return json.dumps({"error": "Booking does not match user"})
-            
-            # Start the booking process
-            start_booking_payload = {"booking_id": payload['booking_id'], "actual_start_datetime": actual_start.isoformat()}
-            print(start_booking_payload)
-            response = api.start_booking(start_booking_payload)
+        registered = commands.get(command)
+        if registered is None:
+            print(f"Unknown command: {command}")
+            return {"error": "Unknown command"}
+        return registered.handler(self, payload, api)
+
+    ###
+    # Booking API
+    ###
+    @commands.register("CB", lane=HIGH, locked=True)
+    def cancel_booking(self, payload, api):
+        """Cancel booking (CB)."""
+        print(f"Cancel booking requested for user: {payload['booking_id']}")
+        response = api.cancel_booking(booking_id=payload['booking_id'])
+        if "error" not in response:
+            self.booking_index.discard(payload['booking_id'])
+
+        return response
+
+    @commands.register("AB", locked=True)
+    def add_booking(self, payload, api):
+        """Add booking (AB)."""
+        print("Add booking")
+        response = api.add_booking(payload)
+        if response.get("booking_id") is not None:
+            self.index_booking(response["booking_id"], api)
+
+        return response
+
+    @commands.register("GBD", lane=HIGH)
+    def get_booking_details(self, payload, api):
+        """Get booking details (GBD)."""
+        print(f"Get booking details requested for user: {payload['booking_id']}")
+        response = api.get_booking(booking_id=payload['booking_id'])
+
+        return response
+
+    @commands.register("SB", lane=HIGH, locked=True)
+    def start_booking(self, payload, api):
+        """Start booking (SB)."""
+        print(f"Start booking requested for booking id: {payload['booking_id']}")
+        response = api.get_booking(booking_id=payload['booking_id'])
+        print(f"get booking response {response}")
+        # Parse the date strings into datetime objects
+        try:
+            booking_start = self.parse_iso8601(response.get("startDateTime"))
+            booking_end = self.parse_iso8601(response.get("endDateTime"))
+            # booking_start = AEST.localize(booking_start)
+            # booking_end = AEST.localize(booking_end)
+            actual_start = datetime.now(AEST)
+            print("done with times")
+        except ValueError:
+            print("Invalid datetime format")
+            return {"error": "Invalid datetime format"}
+
+        print(f"Actual start: {actual_start}")
+        print(f"Booking start: {booking_start}")
+        print(f"Booking end: {booking_end}")
+
+        # Check if the email or scooterID don't match or if the start time is outside the booking window
+        if (response.get("email") != payload.get("email") or 
+            str(response.get("scooterID")) != str(payload.get("scooter_id")) or 
+            not (booking_start <= actual_start <= booking_end)):
+                print("Booking does not match user")
+                return {"error": "Booking does not match user"}
+
+        # Start the booking process
+        start_booking_payload = {"booking_id": payload['booking_id'], "actual_start_datetime": actual_start.isoformat()}
+        print(start_booking_payload)
+        response = api.start_booking(start_booking_payload)
+        print(response)
+        api.set_scooter_status({"scooter_id": payload['scooter_id'], "scooter_status": "In Use"})
+        # The ride has started, so there is nothing left to reserve the scooter for
+        self.transitions.cancel(("reserve", int(payload['booking_id'])))
+
+        return response
+
+    @commands.register("EB", lane=HIGH, locked=True)
+    def end_booking(self, payload, api):
+        """End booking (EB)."""
+        print(f"End booking requested for booking id: {payload['booking_id']}")
+        response = api.get_booking(booking_id=payload['booking_id'])
+
+        try:
             print(response)
-            api.set_scooter_status({"scooter_id": payload['scooter_id'], "scooter_status": "In Use"})
-            
-            return json.dumps(response)
-        
-        
-        elif command == "EB": #End booking
-            print(f"End booking requested for booking id: {payload['booking_id']}")
-            response = api.get_booking(booking_id=payload['booking_id'])
-            
-            try:
-                print(response)
-                actual_start = self.parse_iso8601(response.get("actualStartDateTime"))
-                actual_end = datetime.now(AEST)
-            except ValueError:
-                print("Invalid datetime format")
-                return json.dumps({"error": "Invalid datetime format"})
-            
-            # if (response.get("email") != payload.get("email") or 
-            #     str(response.get("scooterID")) != str(payload.get("scooter_id"))):
-            #         print("Booking does not match user")
-            #         return json.dumps({"error": "Booking does not match user"})
-            
-            print(f"Payload: {payload}")
-            scooter_data = api.get_scooter_details(response.get("scooterID"))
-            costMinute = scooter_data.get("costMin")
-            time_difference = (actual_end - actual_start).total_seconds() / 60
-            total_cost = round(time_difference * costMinute, 2)
-            
-            transaction_payload = {"email": response.get("email"), "transaction_amount": total_cost, "transaction_datetime": datetime.now(AEST).isoformat()}
-            transaction = api.add_transaction(transaction_payload)
-            
-            customer = api.get_customer_details(response.get("email"))
-            customer_funds = customer.get("funds")
-            
-            new_customer_funds = customer_funds - total_cost
-            new_funds_payload = {"email": response.get("email"), "funds": new_customer_funds}
-            new_funds_response = api.update_customer_funds(new_funds_payload)
-            
-            if new_funds_response.get("message") != "Customer funds updated successfully.":
-                print(new_funds_response)
-                return json.dumps(new_funds_response)
-            
-            if transaction.get("message") == "Transaction added successfully.":
-                end_booking_payload = {"booking_id": payload['booking_id'], "actual_end_datetime": actual_end.isoformat()}
-                response = api.end_booking(end_booking_payload)
-                print(f"HERE {response}")
-                response = api.set_booking_status_complete(payload['booking_id'])
-                print(f"HERE1 {response}")
-                api.set_scooter_status({"scooter_id": response.get("scooterID"), "scooter_status": "Available"})
-                self.previous_statuses[response.get("scooterID")] = "Available"
-                
-            
-            return json.dumps(response)
-        
-        
-        elif command =="GAB": #Get all bookings
-            print(f"Get all bookings requested for user: {payload['email']}")
-            response = api.get_all_bookings(email=payload['email'])
-            
-            return json.dumps(response)
-        
-        elif command == "GABS": #Get all booked scooter times
-            print("Get all booked scooter times")
-            response = api.get_all_bookings_for_scooters()
-            
-            return json.dumps(response)
-        
-        elif command == "GBI": #Get booking ID
-            print(f"Get booking ID requested for user: {payload['email']}")
-            data = api.get_all_bookings(email=payload['email'])
-            data_list = data.get("bookings", [])
-            response = []
-            print(data)
-            for booking in data_list:
-                start_time = self.parse_iso8601(booking.get("startDateTime"))
-                end_time = self.parse_iso8601(booking.get("endDateTime"))
-                current_time = AEST.localize(datetime.now())
-                print(f"curr: {current_time}")
-                print(f"start: {start_time}")
-                print(f"end: {end_time}")
-                print(start_time <= current_time <= end_time)
-                print(booking.get("scooterID"))
-                print(payload.get("scooter_id"))
-                print(booking.get("status"))
-                print(booking)
-                print(payload)
-                booking_scooter = booking.get("scooterID")
-                payload_scooter = payload.get("scooter_id")
-                print(f"booking_scooter: {booking_scooter}")
-                print(f"payload_scooter: {payload_scooter}")
-                print("############")
-                
-                if (str(booking_scooter) == str(payload_scooter)):
-                    print("Step 1")
-                    if (booking.get("status") == "Active"):
-                        print("Step 2")
-                        if (start_time <= current_time <= end_time):
-                            print("Step 3")
-                            print("Adding booking")
-                            response.append(booking.get("bookingID"))
-                            print("Added booking")
-            
-            if len(response) == 0:
-                return json.dumps({"error": "No booking found"})
-            elif len(response) == 1:
-                print(response)
-                return json.dumps({"bookingID": response[0]})
-            else:
-                return json.dumps({"error": "Multiple bookings found"})
+            actual_start = self.parse_iso8601(response.get("actualStartDateTime"))
+            actual_end = datetime.now(AEST)
+        except ValueError:
+            print("Invalid datetime format")
+            return {"error": "Invalid datetime format"}
 
-        elif command == "SBG": # Set booking google ID
-            print(f"Updating booking Google ID for booking: {payload['booking_id']}")
-            response = api.set_booking_googleID(payload.get("booking_id"), payload.get("google_id"))
-            return json.dumps(response)
-        
-        elif command == "GABFS": #Get all bookings for a scooter
-            print(f"Get all bookings for a scooter: {payload['scooter_id']}")
-            response = api.get_all_bookings_for_scooter(payload.get("scooter_id"))
-            
-            return json.dumps(response)
-            
-        ###
-        # Customer API
-        ###          
-        elif command == "GCD": #Get customer details
-            print(f"Get customer details requested for user: {payload['email']}")
-            response = api.get_customer_details(email=payload['email'])
-            
-            return json.dumps(response)
-            
-        elif command == "GLD": # Get login details
-            print(f"Getting login details requested for user: {payload['email']}")
-            customer_details = api.get_customer_details(email=payload['email'])
-            customer_password = api.get_login_details(email=payload['email'])
-            # Wrap the response into a dict or object
-            details = {
-                "email": customer_details.get("email"),
-                "password": customer_password.get("password"),
-                "role": customer_details.get("role"),
-            }
-            
-            return json.dumps(details)
-        
-        elif command == "RNC": #register new customer
-            print(f"Add customer requested for user: {payload['email']}")
-            response = api.register_new_customer(payload)
-            
-            return json.dumps(response)
-        
-        elif command == "DC": #Delete customer
-            print(f"Delete customer requested for user: {payload['email']}")
-            response = api.delete_customer(email=payload['email'])
-            
-            return json.dumps(response)
-        
-        elif command == "UCF": #Update customer funds
-            print(f"Update customer funds requested for user: {payload['email']}")
-            response = api.update_customer_funds(payload)
-            
-            return json.dumps(response)
-        
-        elif command == "GAC": #Get all customers
-            print("Get all customers")
-            response = api.get_all_customers()
-            
-            return json.dumps(response)
-        
-        elif command == "UCD": #Update customer details
-            print(f"Update customer details requested for user: {payload['email']}")
-            response = api.update_customer_details(payload['email'], payload)
-            
-            return json.dumps(response)
-        
-        elif command == "FP": #Forgot password
-            print(f"Forgot password requested for user: {payload['email']}")
-            body = f"Click the link below to reset your password:\n{payload['url']}"
-            rec = ["group12.cosc2674@gmail.com", payload['email']]
-            EmailSender.send_email("backend/resources/smtp_details.json", rec, "Reset Password", body)
-            
-            return json.dumps({"message": "success"})
-        
-        ###
-        # Scooter API
-        ###            
-        elif command == "GSD": #Get scooter details
-                print(f"Get scooter details requested for scooter: {payload['scooter_id']}")
-                response = api.get_scooter_details(scooter_id=payload['scooter_id'])
-                
-                return json.dumps(response)
-            
-        elif command == "USS": #Set scooter state
-            print(f"Set scooter state requested for user: {payload['scooter_id']}")
-            response = api.set_scooter_status(payload)
-            
-            return json.dumps(response)
-        
-        elif command == "RSF": #Report scooter fault
-            print(f"Report scooter fault requested for scooter: {payload['scooter_id']}")
-            status_payload = {"scooter_id":payload['scooter_id'], "status": "Needs Repair"}
-            api.set_scooter_status(status_payload)
-            response = api.update_scooter_fault(payload)
-            fault_response = api.get_fault_by_scooter(payload['scooter_id']) 
-            
-            if fault_response and isinstance(fault_response, list) and isinstance(fault_response[0], list):
-                fault_data = fault_response[0]  # Access the inner list
-
-                # Extract details using indices
-                fault_id = fault_data[0]
-                fault_notes = fault_data[6] 
-                start_date_time = fault_data[2]   
-                status = fault_data[4]            
-
-                # Construct the body
-                body = (
-                    f"""Your scooter {payload['scooter_id']} has been reported as a fault. 
-                    Fault details: 
-                    \nFault ID: {fault_id} 
-                    \nFault Notes: {fault_notes} 
-                    \nReported at: {start_date_time} 
-                    \nStatus: {status}"""
-                )
-            else:
-                body = f"Scooter {payload['scooter_id']} has been reported as a fault. No fault details found."
-                
-            # Send email to engineers
-            recipients = api.get_all_engineer_emails()
-            
-            # checking if email has valid format
-            rec = ['group12.cosc2674@gmail.com']
-            for recipient in recipients:
-                if '@' in recipient:
-                    rec.append(recipient)
-            EmailSender.send_email("backend/resources/smtp_details.json", rec, f"Scooter {payload['scooter_id']} Fault Reported {start_date_time}", body)
-            
-            return json.dumps(response)
-        
-        elif command == "GAS": #Get all scooters
-            print("Get all scooters")
-            response = api.get_all_scooters()
-            
-            return json.dumps(response)
-        
-        elif command == "USL": #Update scooter location
-            print(f"Update scooter location requested for scooter: {payload['scooter_id']}")
-            new_payload = {"latitude": payload['latitude'], "longitude": payload['longitude']}
-            response = api.update_scooter_location(payload['scooter_id'], new_payload)
-            
-            return json.dumps(response)
-        
-        elif command == "USI": #Update scooter ip
-            print(f"Update scooter ip requested for scooter: {payload['scooter_id']}")
-            new_payload = {"ip_address": payload['scooter_ip']}
-            response = api.update_scooter_ip_address(payload['scooter_id'], new_payload)
-            
-            return json.dumps(response)
-        
-        elif command == "FMS": #Find my scooter
-            print(f"Find my scooter requested for scooter: {payload['scooter_id']}")
-            response = api.get_scooter_details(scooter_id=payload['scooter_id'])
-            scooter_ip = response.get("ipAddress")
-            print(self.send_request_to_agent(scooter_ip, "FMS", {"ip_address": scooter_ip}))
-            
-            return json.dumps({"success": True})
-            
-        elif command == "USD": #Update scooter details
-            print(f"Update scooter details requested for scooter: {payload['scooter_id']}")
-            response = api.update_scooter_details(payload['scooter_id'], payload)
-            
-            return json.dumps(response)
-        
-        ###
-        # Transaction API
-        ###
-        elif command == "GTD": #Get transaction details
-            print(f"Get transaction details requested for transaction: {payload['transaction_id']}")
-            response = api.get_transaction(transaction_id=payload['transaction_id'])
-            
-            return json.dumps(response)
-        
-        elif command == "ANT": #Add new transaction
-            print("Add new transaction")
-            response = api.add_transaction(payload)
-            
-            return json.dumps(response)
-        
-        elif command == "GACT": #Get all customer transactions
-            print (f"Get all customer transactions requested for user: {payload['email']}")
-            response = api.get_customer_transactions(customer_id=payload['email'])
-            
-            return json.dumps(response)
-        
+        # if (response.get("email") != payload.get("email") or 
+        #     str(response.get("scooterID")) != str(payload.get("scooter_id"))):
+        #         print("Booking does not match user")
+        #         return {"error": "Booking does not match user"}
 
-        ###
-        # Fault Log API
-        ###
-        elif command == "GFBI": # Get fault by id
-            print(f"Get fault by id: {payload['fault_id']}")
-            response = api.get_fault_by_id(payload['fault_id'])
-            
-            return json.dumps(response)
-        
-        elif command == "GOF": #Get open faults
-            print("Get open faults")
-            response = api.get_open_faults()
-            
-            return json.dumps(response)
-        
-        elif command == "GFBS": #Get fault by scooter id
-            print(f"Get fault by scooter id: {payload['scooter_id']}")
-            response = api.get_fault_by_scooter(payload['scooter_id'])
-            
-            return json.dumps(response)
-        
-        elif command == "USF": #Update scooter fault
-            print(f"Update scooter fault requested for scooter: {payload['scooter_id']}")
-            response = api.update_scooter_fault(payload)
-            
-            return json.dumps(response)
-        
-        elif command == "RESF": #Resolve scooter fault
-            print(f"Resolve scooter fault requested for scooter: {payload['fault_id']}")
-            response = api.resolve_scooter_fault(payload['fault_id'], payload)
-
-            fault_response = api.get_fault_by_id(payload['fault_id'])
-            
-            scooter_id = fault_response.get('scooterID')
-            status_payload = {"scooter_id": scooter_id, "status": "Available"}
-            print(f"Updating scooter status: {status_payload}")
-            api.set_scooter_status(status_payload)
-        
-            return json.dumps(response)
-        
-        ###
-        # Default
-        ###
+        print(f"Payload: {payload}")
+        # The scooter is only known once the booking has been looked up, so lock it here (booking -> scooter order)
+        scooter_id = response.get("scooterID")
+        with self.command_locks.hold(("scooter", str(scooter_id))):
+            return asyncio.run(self.finish_booking(payload['booking_id'], response, scooter_id, actual_start,
+                                                   actual_end, async_api_handler(api, self.api_calls)))
+
+    async def finish_booking(self, booking_id, booking, scooter_id, actual_start, actual_end, aapi):
+        """
+        Charge the customer for a ride and end its booking, making the calls that don't depend on each other at
+        the same time.
+
+        Args:
+            booking_id: The booking's ID.
+            booking (dict): The booking, as read from the database API.
+            scooter_id: The booking's scooter.
+            actual_start (datetime): When the ride started.
+            actual_end (datetime): When the ride ended.
+            aapi (async_api_handler): The async_api_handler to make the calls with.
+
+        Returns:
+            dict: The response to the booking being set complete, or the error updating the customer's funds.
+        """
+        scooter_data, customer = await asyncio.gather(aapi.get_scooter_details(scooter_id),
+                                                      aapi.get_customer_details(booking.get("email")))
+        costMinute = scooter_data.get("costMin")
+        time_difference = (actual_end - actual_start).total_seconds() / 60
+        total_cost = round(time_difference * costMinute, 2)
+
+        transaction_payload = {"email": booking.get("email"), "transaction_amount": total_cost, "transaction_datetime": datetime.now(AEST).isoformat()}
+        customer_funds = customer.get("funds")
+
+        new_customer_funds = customer_funds - total_cost
+        new_funds_payload = {"email": booking.get("email"), "funds": new_customer_funds}
+        transaction, new_funds_response = await asyncio.gather(aapi.add_transaction(transaction_payload),
+                                                               aapi.update_customer_funds(new_funds_payload))
+
+        if new_funds_response.get("message") != "Customer funds updated successfully.":
+            print(new_funds_response)
+            return new_funds_response
+
+        response = booking
+        if transaction.get("message") == "Transaction added successfully.":
+            end_booking_payload = {"booking_id": booking_id, "actual_end_datetime": actual_end.isoformat()}
+            response = await aapi.end_booking(end_booking_payload)
+            response = await aapi.set_booking_status_complete(booking_id)
+            await aapi.set_scooter_status({"scooter_id": scooter_id, "scooter_status": "Available"})
+            with self.status_lock:
+                self.previous_statuses[scooter_id] = "Available"
+            self.booking_index.discard(int(booking_id))
+            # The scooter's next booking may already be due to be reserved
+            self.reserve_scooter(scooter_id, datetime.now(AEST), aapi.api)
+
+
+        return response
+
+    @commands.register("GAB")
+    def get_all_bookings(self, payload, api):
+        """Get all bookings (GAB)."""
+        print(f"Get all bookings requested for user: {payload['email']}")
+        response = api.get_all_bookings(email=payload['email'])
+
+        return response
+
+    @commands.register("GABS", lane=LOW)
+    def get_all_booked_scooter_times(self, payload, api):
+        """Get all booked scooter times (GABS). Streamed in chunks to clients that ask for it."""
+        print("Get all booked scooter times")
+        return StreamingResponse(api.stream_all_bookings_for_scooters(),
+                                 collect=lambda bookings: {"all_booked_scooters": bookings})
+
+    @commands.register("GBC")
+    def get_booking_changes(self, payload, api):
+        """
+        Get the bookings changed since a cursor (GBC), with the IDs of those deleted and the cursor to send next
+        time, so a client can keep its own copy up to date without reading every booking on each refresh.
+        """
+        print(f"Get booking changes since {payload.get('cursor', 0)}")
+        return api.get_booking_changes(int(payload.get('cursor', 0)), payload.get('limit'))
+
+    @commands.register("GBI", lane=HIGH)
+    def get_booking_id(self, payload, api):
+        """Get booking ID (GBI)."""
+        print(f"Get booking ID requested for user: {payload['email']}")
+        data = api.get_all_bookings(email=payload['email'])
+        data_list = data.get("bookings", [])
+        response = []
+        print(data)
+        for booking in data_list:
+            start_time = self.parse_iso8601(booking.get("startDateTime"))
+            end_time = self.parse_iso8601(booking.get("endDateTime"))
+            current_time = AEST.localize(datetime.now())
+            print(f"curr: {current_time}")
+            print(f"start: {start_time}")
+            print(f"end: {end_time}")
+            print(start_time <= current_time <= end_time)
+            print(booking.get("scooterID"))
+            print(payload.get("scooter_id"))
+            print(booking.get("status"))
+            print(booking)
+            print(payload)
+            booking_scooter = booking.get("scooterID")
+            payload_scooter = payload.get("scooter_id")
+            print(f"booking_scooter: {booking_scooter}")
+            print(f"payload_scooter: {payload_scooter}")
+            print("############")
+
+            if (str(booking_scooter) == str(payload_scooter)):
+                print("Step 1")
+                if (booking.get("status") == "Active"):
+                    print("Step 2")
+                    if (start_time <= current_time <= end_time):
+                        print("Step 3")
+                        print("Adding booking")
+                        response.append(booking.get("bookingID"))
+                        print("Added booking")
+
+        if len(response) == 0:
+            return {"error": "No booking found"}
+        elif len(response) == 1:
+            print(response)
+            return {"bookingID": response[0]}
         else:
-            print(f"Unknown command: {command}")
-            return json.dumps({"error": "Unknown command"})
-            
+            return {"error": "Multiple bookings found"}
+
+    @commands.register("SBG", locked=True)
+    def set_booking_google_id(self, payload, api):
+        """Set booking google ID (SBG)."""
+        print(f"Updating booking Google ID for booking: {payload['booking_id']}")
+        response = api.set_booking_googleID(payload.get("booking_id"), payload.get("google_id"))
+        return response
+
+    @commands.register("GABFS", lane=LOW)
+    def get_all_bookings_for_scooter(self, payload, api):
+        """Get all bookings for a scooter (GABFS). Streamed in chunks to clients that ask for it."""
+        print(f"Get all bookings for a scooter: {payload['scooter_id']}")
+        return StreamingResponse(api.stream_all_bookings_for_scooter(payload.get("scooter_id")),
+                                 collect=lambda bookings: {"bookings": bookings} if bookings
+                                 else {"message": "No bookings found for this scooter."})
+
+    ###
+    # Customer API
+    ###
+    @commands.register("GCD")
+    def get_customer_details(self, payload, api):
+        """Get customer details (GCD)."""
+        print(f"Get customer details requested for user: {payload['email']}")
+        response = api.get_customer_details(email=payload['email'])
+
+        return response
+
+    @commands.register("GLD", lane=HIGH)
+    def get_login_details(self, payload, api):
+        """Get login details (GLD)."""
+        print(f"Getting login details requested for user: {payload['email']}")
+        customer_details = api.get_customer_details(email=payload['email'])
+        customer_password = api.get_login_details(email=payload['email'])
+        # Wrap the response into a dict or object
+        details = {
+            "email": customer_details.get("email"),
+            "password": customer_password.get("password"),
+            "role": customer_details.get("role"),
+        }
+
+        return details
+
+    @commands.register("RNC")
+    def register_new_customer(self, payload, api):
+        """Register new customer (RNC)."""
+        print(f"Add customer requested for user: {payload['email']}")
+        response = api.register_new_customer(payload)
+
+        return response
+
+    @commands.register("DC")
+    def delete_customer(self, payload, api):
+        """Delete customer (DC)."""
+        print(f"Delete customer requested for user: {payload['email']}")
+        response = api.delete_customer(email=payload['email'])
+
+        return response
+
+    @commands.register("UCF")
+    def update_customer_funds(self, payload, api):
+        """Update customer funds (UCF)."""
+        print(f"Update customer funds requested for user: {payload['email']}")
+        response = api.update_customer_funds(payload)
+
+        return response
 
-    def recv_all(self, conn, length):
+    @commands.register("GAC", lane=LOW)
+    def get_all_customers(self, payload, api):
+        """Get all customers (GAC). Streamed in chunks to clients that ask for it."""
+        print("Get all customers")
+        return StreamingResponse(api.stream_all_customers(),
+                                 collect=lambda customers: customers if customers
+                                 else {"message": "No customers found."})
+
+    @commands.register("UCD")
+    def update_customer_details(self, payload, api):
+        """Update customer details (UCD)."""
+        print(f"Update customer details requested for user: {payload['email']}")
+        response = api.update_customer_details(payload['email'], payload)
+
+        return response
+
+    @commands.register("FP")
+    def forgot_password(self, payload, api):
+        """Forgot password (FP)."""
+        print(f"Forgot password requested for user: {payload['email']}")
+        body = f"Click the link below to reset your password:\n{payload['url']}"
+        rec = ["group12.cosc2674@gmail.com", payload['email']]
+        EmailSender.send_email("backend/resources/smtp_details.json", rec, "Reset Password", body)
+
+        return {"message": "success"}
+
+    ###
+    # Scooter API
+    ###
+    @commands.register("GSD", lane=HIGH)
+    def get_scooter_details(self, payload, api):
+        """Get scooter details (GSD)."""
+        print(f"Get scooter details requested for scooter: {payload['scooter_id']}")
+        response = api.get_scooter_details(scooter_id=payload['scooter_id'])
+
+        return response
+
+    @commands.register("USS", lane=HIGH, locked=True)
+    def set_scooter_status(self, payload, api):
         """
-        Receive all of the data from a socket, given a length.
+        Set scooter state (USS).
 
-        :param conn: The socket connection to receive from.
-        :param length: The number of bytes to receive.
-        :return: The received data as a bytes object, or None if a zero-length packet is received.
+        A change made on the scooter itself ("origin": "agent") is recorded before it is written, so the change
+        feed's notification of it isn't pushed straight back to the agent.
         """
-        data = b""
-        while len(data) < length:
-            packet = conn.recv(length - len(data))
-            if not packet:
-                return None
-            data += packet
-        return data
-    
-    def _recv_exactly(self, sock, length: int):
-        """Helper function to ensure that exactly `length` bytes are read from the socket."""
-        data = b''
-        while len(data) < length:
-            packet = sock.recv(length - len(data))
-            if not packet:
-                return None  # Connection closed or error
-            data += packet
-        return data
-    
-    def check_active_bookings(self):
-        """
-        Check for active bookings and mark them as 'complete' if their endDateTime has elapsed.
-        """
-        api = api_handler()
-        print("Checking for active bookings...")
-        
-        # Get all active bookings from the API
-        active_bookings = api.get_active_bookings()
-        for booking_data in active_bookings.get('active_bookings', []):
-            booking = Booking.from_dict(booking_data)
-            # Convert booking's endDateTime to a UTC datetime object
-            if booking.endDateTime:
-                utc = pytz.utc
-                end_datetime_utc = utc.localize(datetime.strptime(booking.endDateTime, '%a, %d %b %Y %H:%M:%S %Z'))
-                # Convert UTC to local timezone
-                end_datetime_local = end_datetime_utc.astimezone(self.local_tz)
-                # Compare the converted local time with the current local time
-                if datetime.now(self.local_tz) > end_datetime_local and booking.status != 'Complete':
-                    print(f"Booking {booking.bookingID} has elapsed. Marking as complete...")
-                    api.set_booking_status_complete(booking.bookingID)
-    
-    def schedule_booking_check(self):
-        """
-        Schedule the booking check to run every hour.
-        """
-        # Schedule this method to run again in one hour (3600 seconds)
-        Timer(3600, self.run_booking_check_periodically).start()
-    
-    def run_booking_check_periodically(self):
-        """
-        Check for active bookings and reschedule the check to run again in one hour.
-        """
-        self.check_active_bookings()
-        self.schedule_booking_check()
-        
+        print(f"Set scooter state requested for user: {payload['scooter_id']}")
+        from_agent = payload.get('origin') == "agent"
+        if from_agent:
+            with self.status_lock:
+                self.previous_statuses[int(payload['scooter_id'])] = payload['status']
+        response = api.set_scooter_status(payload)
+        if from_agent and payload['status'] == "Available":
+            # Its next booking may already be due to be reserved
+            self.reserve_scooter(int(payload['scooter_id']), datetime.now(AEST), api)
+
+        return response
+
+    @commands.register("RSF", locked=True)
+    def report_scooter_fault(self, payload, api):
+        """Report scooter fault (RSF)."""
+        print(f"Report scooter fault requested for scooter: {payload['scooter_id']}")
+        status_payload = {"scooter_id":payload['scooter_id'], "status": "Needs Repair"}
+        response, fault_response, recipients = asyncio.run(
+            self.record_fault(payload, status_payload, async_api_handler(api, self.api_calls)))
+
+        if fault_response and isinstance(fault_response, list) and isinstance(fault_response[0], list):
+            fault_data = fault_response[0]  # Access the inner list
+
+            # Extract details using indices
+            fault_id = fault_data[0]
+            fault_notes = fault_data[6] 
+            start_date_time = fault_data[2]   
+            status = fault_data[4]            
+
+            # Construct the body
+            body = (
+                f"""Your scooter {payload['scooter_id']} has been reported as a fault. 
+                Fault details: 
+                \nFault ID: {fault_id} 
+                \nFault Notes: {fault_notes} 
+                \nReported at: {start_date_time} 
+                \nStatus: {status}"""
+            )
+        else:
+            body = f"Scooter {payload['scooter_id']} has been reported as a fault. No fault details found."
+
+        # Send email to engineers
+        # checking if email has valid format
+        rec = ['group12.cosc2674@gmail.com']
+        for recipient in recipients:
+            if '@' in recipient:
+                rec.append(recipient)
+        EmailSender.send_email("backend/resources/smtp_details.json", rec, f"Scooter {payload['scooter_id']} Fault Reported {start_date_time}", body)
+
+        return response
+
+    async def record_fault(self, payload, status_payload, aapi):
+        """
+        Mark a scooter as needing repair and record its fault, then read the fault back, while the engineers'
+        email addresses are read at the same time.
+
+        Args:
+            payload (dict): The RSF payload.
+            status_payload (dict): The scooter's new status.
+            aapi (async_api_handler): The async_api_handler to make the calls with.
+
+        Returns:
+            tuple: The response to recording the fault, the scooter's faults and the engineers' email addresses.
+        """
+        recipients = asyncio.ensure_future(aapi.get_all_engineer_emails())
+        _, response = await asyncio.gather(aapi.set_scooter_status(status_payload), aapi.update_scooter_fault(payload))
+        fault_response = await aapi.get_fault_by_scooter(payload['scooter_id'])
+        return response, fault_response, await recipients
+
+    @commands.register("GAS")
+    def get_all_scooters(self, payload, api):
+        """Get all scooters (GAS)."""
+        print("Get all scooters")
+        response = api.get_all_scooters()
+
+        return response
+
+    @commands.register("GSC")
+    def get_scooter_changes(self, payload, api):
+        """
+        Get the scooters changed since a cursor (GSC), with the IDs of those deleted and the cursor to send next
+        time, so a client can keep its own copy up to date without reading every scooter on each refresh.
+        """
+        print(f"Get scooter changes since {payload.get('cursor', 0)}")
+        return api.get_scooter_changes(int(payload.get('cursor', 0)), payload.get('limit'))
+
+    @commands.register("USL", lane=HIGH, locked=True)
+    def update_scooter_location(self, payload, api):
+        """Update scooter location (USL)."""
+        print(f"Update scooter location requested for scooter: {payload['scooter_id']}")
+        new_payload = {"latitude": payload['latitude'], "longitude": payload['longitude']}
+        response = api.update_scooter_location(payload['scooter_id'], new_payload)
+
+        return response
+
+    @commands.register("USI", lane=HIGH, locked=True)
+    def update_scooter_ip(self, payload, api):
+        """Update scooter ip (USI)."""
+        print(f"Update scooter ip requested for scooter: {payload['scooter_id']}")
+        new_payload = {"ip_address": payload['scooter_ip']}
+        response = api.update_scooter_ip_address(payload['scooter_id'], new_payload)
+
+        return response
+
+    @commands.register("HB", lane=HIGH)
+    def heartbeat(self, payload, api):
+        """
+        Heartbeat from an Agent Pi (HB), sent every few seconds with its scooter ID, IP address and status.
+
+        Records the agent as alive, and saves its IP address the first time it is heard from or when it changes,
+        which replaces the USI agents used to send at startup. Commands waiting in the scooter's outbox are then
+        delivered.
+        """
+        scooter_id = int(payload['scooter_id'])
+        ip = payload.get('ip_address')
+        if self.agents.beat(scooter_id, ip, payload.get('status')) and ip:
+            print(f"Scooter {scooter_id} is online at {ip}.")
+            api.update_scooter_ip_address(scooter_id, {"ip_address": ip})
+            self.agent_channels.assign(scooter_id, ip)
+            with self.status_lock:
+                self.scooter_ips[scooter_id] = ip
+        if self.outbox.has_pending(scooter_id):
+            # Catch the agent up on anything it missed while it was unreachable
+            self.deliver(scooter_id)
+
+        return {"message": "Heartbeat received."}
+
+    @commands.register("GAL")
+    def get_agent_liveness(self, payload, api):
+        """Get every Agent Pi's last heartbeat, IP address, reported status and whether it is alive (GAL)."""
+        return {"agents": self.agents.snapshot(), "dead_after": self.agents.dead_after}
+
+    @commands.register("FMS", lane=HIGH)
+    def find_my_scooter(self, payload, api):
+        """Find my scooter (FMS)."""
+        print(f"Find my scooter requested for scooter: {payload['scooter_id']}")
+        response = api.get_scooter_details(scooter_id=payload['scooter_id'])
+        scooter_ip = response.get("ipAddress")
+        print(self.send_request_to_agent(scooter_ip, "FMS", {"ip_address": scooter_ip}))
+
+        return {"success": True}
+
+    @commands.register("USD", locked=True)
+    def update_scooter_details(self, payload, api):
+        """Update scooter details (USD)."""
+        print(f"Update scooter details requested for scooter: {payload['scooter_id']}")
+        response = api.update_scooter_details(payload['scooter_id'], payload)
+
+        return response
+
+    ###
+    # Transaction API
+    ###
+    @commands.register("GTD")
+    def get_transaction_details(self, payload, api):
+        """Get transaction details (GTD)."""
+        print(f"Get transaction details requested for transaction: {payload['transaction_id']}")
+        response = api.get_transaction(transaction_id=payload['transaction_id'])
+
+        return response
+
+    @commands.register("ANT")
+    def add_transaction(self, payload, api):
+        """Add new transaction (ANT)."""
+        print("Add new transaction")
+        response = api.add_transaction(payload)
+
+        return response
+
+    @commands.register("GACT")
+    def get_customer_transactions(self, payload, api):
+        """Get all customer transactions (GACT)."""
+        print (f"Get all customer transactions requested for user: {payload['email']}")
+        response = api.get_customer_transactions(customer_id=payload['email'])
+
+        return response
+
+    ###
+    # Fault Log API
+    ###
+    @commands.register("GFBI")
+    def get_fault_by_id(self, payload, api):
+        """Get fault by id (GFBI)."""
+        print(f"Get fault by id: {payload['fault_id']}")
+        response = api.get_fault_by_id(payload['fault_id'])
+
+        return response
+
+    @commands.register("GOF")
+    def get_open_faults(self, payload, api):
+        """Get open faults (GOF)."""
+        print("Get open faults")
+        response = api.get_open_faults()
+
+        return response
+
+    @commands.register("GFBS")
+    def get_fault_by_scooter(self, payload, api):
+        """Get fault by scooter id (GFBS)."""
+        print(f"Get fault by scooter id: {payload['scooter_id']}")
+        response = api.get_fault_by_scooter(payload['scooter_id'])
+
+        return response
+
+    @commands.register("USF")
+    def update_scooter_fault(self, payload, api):
+        """Update scooter fault (USF)."""
+        print(f"Update scooter fault requested for scooter: {payload['scooter_id']}")
+        response = api.update_scooter_fault(payload)
+
+        return response
+
+    @commands.register("RESF")
+    def resolve_scooter_fault(self, payload, api):
+        """Resolve scooter fault (RESF)."""
+        print(f"Resolve scooter fault requested for scooter: {payload['fault_id']}")
+        aapi = async_api_handler(api, self.api_calls)
+        # The fault's scooter doesn't change when it is resolved, so it can be read at the same time
+        response, fault_response = run_concurrently(aapi.resolve_scooter_fault(payload['fault_id'], payload),
+                                                    aapi.get_fault_by_id(payload['fault_id']))
+
+        scooter_id = fault_response.get('scooterID')
+        status_payload = {"scooter_id": scooter_id, "status": "Available"}
+        print(f"Updating scooter status: {status_payload}")
+        api.set_scooter_status(status_payload)
+
+        return response
+
+    ###
+    # Batch
+    ###
+    @commands.register("BATCH")
+    def batch(self, payload, api):
+        """Run many commands in one round trip (BATCH)."""
+        print(f"Batch of {len(payload.get('commands', []))} commands requested")
+        return self.run_batch(payload, api)
+
+    ###
+    # Monitoring
+    ###
+    @commands.register("STATS", lane=HIGH)
+    def get_stats(self, payload, api):
+        """
+        Get per-command statistics, how many requests each priority lane has turned away, how many requests and
+        connections the rate limits and connection caps have rejected, how many retries were answered from
+        the idempotency store, whether the database change feed is connected, how many booking transitions are
+        scheduled, how many pushes to Agent Pis were sent, retried and given up on, which Agent Pis are
+        reachable, how many commands are waiting to be delivered to them, and how many status datagrams have been
+        multicast to the fleet (STATS).
+        """
+        feed = self.change_feed
+        return {
+            "commands": self.stats.snapshot(),
+            "lanes": self.lanes.snapshot() if self.lanes is not None else {},
+            "rate_limits": self.rate_limiter.snapshot(),
+            "connections": self.connection_limiter.snapshot(),
+            "idempotency": self.idempotency.snapshot(),
+            "change_feed": {"connected": feed is not None and feed.connected.is_set(),
+                            "received": feed.received if feed is not None else 0},
+            "transitions": {"scheduled": len(self.transitions), "fired": self.transitions.fired},
+            "agent_pushes": self.agent_pushes.snapshot(),
+            "agent_channels": self.agent_channels.snapshot(),
+            "agent_outbox": self.outbox.snapshot(),
+            "fleet": self.fleet.snapshot() if self.fleet is not None else None,
+        }
+
     def parse_iso8601(self, dt_string):
         """
         Converts times to AEST from the DB
@@ -0,0 +1,140 @@
+import json
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+import requests
+from urllib3.exceptions import ConnectTimeoutError, NewConnectionError
+from api_interface.api_interface import APIInterface, create_session
+from scooter_protocol.deadline import Deadline, DeadlineExceeded, deadline_scope
+
+
+class TestAPIInterfaceDeadline(unittest.TestCase):
+
+    def setUp(self):
+        self.api = APIInterface("http://localhost:8080", timeout=10)
+
+    @patch('api_interface.api_interface.requests.Session.get')
+    def test_timeout_without_deadline(self, mock_get):
+        self.api._send_get_request("scooter/1")
+
+        mock_get.assert_called_once_with("http://localhost:8080/scooter/1", params=None, timeout=10,
+                                         headers={"X-Deadline-Ms": "10000"})
+
+    @patch('api_interface.api_interface.requests.Session.put')
+    def test_deadline_cuts_timeout_and_is_forwarded(self, mock_put):
+        with deadline_scope(Deadline(2)):
+            self.api._send_put_request("booking/end_booking", {"booking_id": 1})
+
+        kwargs = mock_put.call_args.kwargs
+        self.assertLessEqual(kwargs["timeout"], 2)
+        self.assertLessEqual(int(kwargs["headers"]["X-Deadline-Ms"]), 2000)
+
+    @patch('api_interface.api_interface.requests.Session.post')
+    def test_expired_deadline_fails_fast(self, mock_post):
+        with deadline_scope(Deadline(0)):
+            with self.assertRaises(DeadlineExceeded):
+                self.api._send_post_request("booking/add_booking", {})
+        mock_post.assert_not_called()
+
+
+class DatabaseAPIStub(BaseHTTPRequestHandler):
+    """
+    Answers every request with {"ok": true}, except that it hangs up on the first `server.drops` requests and
+    answers the first `server.stalls` only after half a second.
+    """
+    protocol_version = "HTTP/1.1"
+
+    def handle_request(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self.server.ports.add(self.client_address[1])
+        if self.server.drops:
+            self.server.drops -= 1
+            self.close_connection = True
+            return
+        if self.server.stalls:
+            self.server.stalls -= 1
+            time.sleep(0.5)
+        body = json.dumps({"ok": True}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_GET = do_POST = do_PUT = do_DELETE = handle_request
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TestAPIInterfaceSession(unittest.TestCase):
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), DatabaseAPIStub)
+        self.server.ports = set()
+        self.server.drops = 0
+        self.server.stalls = 0
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.session = create_session(pool_size=2, retries=1)
+        self.addCleanup(self.session.close)
+        self.api = APIInterface(f"http://127.0.0.1:{self.server.server_address[1]}", timeout=5, session=self.session)
+
+    def test_connection_is_kept_open_between_requests(self):
+        for _ in range(3):
+            self.assertEqual(self.api._send_get_request("scooter/1"), {"ok": True})
+        self.api._send_put_request("scooter/1", {"status": "Available"})
+
+        self.assertEqual(len(self.server.ports), 1)
+
+    def test_dropped_idempotent_request_is_retried(self):
+        self.server.drops = 1
+
+        self.assertEqual(self.api._send_get_request("scooter/1"), {"ok": True})
+        self.assertEqual(len(self.server.ports), 2)
+
+    def test_dropped_post_is_not_retried(self):
+        self.server.drops = 1
+
+        with self.assertRaises(requests.ConnectionError):
+            self.api._send_post_request("booking/add_booking", {})
+        self.assertEqual(len(self.server.ports), 1)
+
+    def test_dropped_put_and_delete_are_not_retried(self):
+        for send in (lambda: self.api._send_put_request("scooter/1", {"status": "Available"}),
+                     lambda: self.api._send_delete_request("booking/1")):
+            self.server.drops = 1
+            self.server.ports.clear()
+
+            with self.assertRaises(requests.ConnectionError):
+                send()
+            self.assertEqual(len(self.server.ports), 1)
+
+    def test_timed_out_request_is_not_retried(self):
+        self.server.stalls = 2
+        self.api.timeout = 0.2
+
+        with self.assertRaises(requests.Timeout):
+            self.api._send_get_request("scooter/1")
+        self.assertEqual(self.server.stalls, 1)
+
+    def test_connect_timeout_is_not_retried(self):
+        retry = self.session.get_adapter(self.api.base_url).max_retries
+
+        with self.assertRaises(ConnectTimeoutError):
+            retry.increment("GET", "/scooter/1", error=ConnectTimeoutError("Connection timed out"))
+        # A refused connection fails straight away, so it is still retried
+        self.assertEqual(retry.increment("GET", "/scooter/1", error=NewConnectionError(None, "Connection refused")).connect, 0)
+
+    def test_retries_are_bounded(self):
+        self.server.drops = 5
+
+        with self.assertRaises(requests.ConnectionError):
+            self.api._send_get_request("scooter/1")
+        self.assertEqual(self.server.drops, 3)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -95,6 +95,18 @@ class TestBookingAPI(unittest.TestCase):
         mock_put.assert_called_once_with(expected_endpoint)
         self.assertEqual(response['status'], "completed")
 
+    @patch.object(APIInterface, '_send_put_request')
+    def test_complete_elapsed_bookings(self, mock_put):
+        # Arrange
+        mock_put.return_value = {"completed_bookings": [{"bookingID": 4, "scooterID": 1}]}
+
+        # Act
+        response = self.api.complete_elapsed_bookings()
+
+        # Assert
+        mock_put.assert_called_once_with("booking/complete_elapsed")
+        self.assertEqual(response['completed_bookings'], [{"bookingID": 4, "scooterID": 1}])
+
     @patch.object(APIInterface, '_send_put_request')
     def test_update_booking_cost(self, mock_put):
         # Arrange
@@ -145,5 +157,28 @@ class TestBookingAPI(unittest.TestCase):
         mock_put.assert_called_once_with(expected_endpoint, google_id)
         self.assertEqual(response['status'], "Google ID set")
 
+    @patch.object(APIInterface, '_stream_get_request')
+    def test_stream_all_bookings_for_scooter(self, mock_stream):
+        mock_stream.return_value = iter([{"bookingID": 1}, {"bookingID": 2}])
+
+        records = list(self.api.stream_all_bookings_for_scooter(3))
+
+        mock_stream.assert_called_once_with("booking/scooter/3/stream")
+        self.assertEqual(records, [{"bookingID": 1}, {"bookingID": 2}])
+
+    @patch('api_interface.api_interface.requests.Session.get')
+    def test_stream_get_request_yields_records_and_raises_on_error_line(self, mock_get):
+        response = mock_get.return_value.__enter__.return_value
+        response.status_code = 200
+        response.iter_lines.return_value = [b'{"bookingID": 1}', b'', b'{"error": "connection lost"}']
+
+        records = self.api.stream_booked_scooters_times()
+
+        self.assertEqual(next(records), {"bookingID": 1})
+        with self.assertRaises(RuntimeError):
+            next(records)
+        mock_get.assert_called_once_with("http://localhost:8080/booking/get_booked_scooters_times/stream", params=None, stream=True,
+                                         timeout=10, headers={})
+
 if __name__ == '__main__':
     unittest.main()
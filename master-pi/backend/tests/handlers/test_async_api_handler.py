@@ -0,0 +1,49 @@
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import MagicMock
+from handlers.async_API_handler import async_api_handler, run_concurrently
+from scooter_protocol.deadline import Deadline, deadline_scope, time_budget
+
+
+class TestAsyncAPIHandler(unittest.TestCase):
+
+    def setUp(self):
+        self.executor = ThreadPoolExecutor(max_workers=4)
+        self.addCleanup(self.executor.shutdown)
+        self.api = MagicMock()
+        self.aapi = async_api_handler(self.api, self.executor)
+
+    def test_calls_run_at_the_same_time(self):
+        # Each call waits for the other, so they only finish if they run at the same time
+        both_running = threading.Barrier(2, timeout=5)
+
+        def answer(response):
+            both_running.wait()
+            return response
+
+        self.api.get_scooter_details.side_effect = lambda scooter_id: answer({"scooterID": scooter_id})
+        self.api.get_customer_details.side_effect = lambda email: answer({"email": email})
+
+        scooter, customer = run_concurrently(self.aapi.get_scooter_details(1), self.aapi.get_customer_details("a@b.com"))
+
+        self.assertEqual(scooter, {"scooterID": 1})
+        self.assertEqual(customer, {"email": "a@b.com"})
+
+    def test_calls_keep_the_callers_deadline(self):
+        self.api.get_booking.side_effect = lambda booking_id: time_budget(None)
+
+        with deadline_scope(Deadline(2)):
+            [budget] = run_concurrently(self.aapi.get_booking(5))
+
+        self.assertLessEqual(budget, 2)
+        self.api.get_booking.assert_called_once_with(5)
+
+    def test_errors_are_raised_to_the_caller(self):
+        self.api.get_booking.side_effect = RuntimeError("database is down")
+
+        with self.assertRaises(RuntimeError):
+            run_concurrently(self.aapi.get_booking(5), self.aapi.get_scooter_details(1))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,545 @@
+import json
+import os
+import socket
+import tempfile
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from unittest.mock import ANY, MagicMock, patch
+from handlers.socket_handler import socket_handler, AEST
+from utils.keyed_lock import KeyedLock
+from utils.command_registry import CommandStats, HIGH, LOW
+from utils.rate_limiter import RateLimiter, ConnectionLimiter
+from utils.idempotency import IdempotencyStore
+from utils.booking_index import BookingIndex
+from utils.timer_queue import TimerQueue
+from utils.agent_dispatcher import AgentDispatcher
+from utils.agent_channels import AgentChannels
+from utils.agent_registry import AgentRegistry
+from utils.agent_outbox import AgentOutbox
+from scooter_protocol import ServerBusy, FleetPublisher
+
+
+class TestSocketHandler(unittest.TestCase):
+
+    def setUp(self):
+        """Create a socket_handler without starting its threads or listening socket."""
+        self.handler = socket_handler.__new__(socket_handler)
+        self.handler.command_locks = KeyedLock()
+        self.handler.stats = CommandStats()
+        self.handler.lanes = None
+        self.handler.rate_limiter = RateLimiter({LOW: {"rate": 1, "burst": 2}})
+        self.handler.rate_limit_exempt = {"ips": ["127.0.0.1"], "agents": True}
+        self.handler.connection_limiter = ConnectionLimiter(10, 2)
+        self.handler.idempotency = IdempotencyStore(ttl=60, max_keys=100)
+        self.handler.booking_index = BookingIndex(self.handler.parse_iso8601,
+                                                  on_insert=self.handler.schedule_transitions,
+                                                  on_remove=self.handler.cancel_transitions)
+        self.handler.transition_workers = ThreadPoolExecutor(max_workers=1)
+        self.addCleanup(self.handler.transition_workers.shutdown)
+        self.handler.expiry_lock = threading.Lock()
+        self.handler.expiry_queued = False
+        self.handler.transitions = TimerQueue()
+        self.handler.agent_channels = AgentChannels(65001, timeout=1)
+        self.handler.agents = AgentRegistry(dead_after=30)
+        self.outbox_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.outbox_dir.cleanup)
+        self.handler.outbox = AgentOutbox(os.path.join(self.outbox_dir.name, "agent_outbox.json"))
+        self.handler.agent_pushes = AgentDispatcher(lambda *request: self.handler.send_request_to_agent(*request),
+                                                    workers=4, retries=0)
+        # Pushes still running save the outbox, so they must finish before its directory is removed
+        self.addCleanup(self.handler.agent_pushes.join, 5)
+        self.handler.previous_statuses = {}
+        self.handler.scooter_ips = {}
+        self.handler.scooter_cursor = 0
+        self.handler.booking_cursor = 0
+        self.handler.status_lock = threading.Lock()
+        self.handler.status_version = 0
+        self.handler.change_feed = None
+        self.handler.fleet = None
+        self.handler.fleet_pending = {}
+        self.handler.api_calls = ThreadPoolExecutor(max_workers=4)
+        self.addCleanup(self.handler.api_calls.shutdown)
+        self.api = MagicMock()
+        self.handler.status_api = self.api
+
+    def run_due_transitions(self):
+        """Fire the due booking timers and wait for the transitions they queued to finish."""
+        fired = self.handler.transitions.run_due()
+        self.handler.transition_workers.submit(lambda: None).result()
+        return fired
+
+    def test_lock_keys(self):
+        keys = self.handler.lock_keys("SB", {"booking_id": 5, "scooter_id": 2, "email": "a@b.com"})
+
+        self.assertEqual(keys, [("booking", "5"), ("scooter", "2")])
+        self.assertEqual(self.handler.lock_keys("GAS", {}), [])
+
+    def test_batch_returns_results_in_order(self):
+        self.api.get_scooter_details.side_effect = lambda scooter_id: {"scooterID": scooter_id}
+        payload = {"commands": [
+            {"command": "GSD", "payload": {"scooter_id": 1}},
+            {"command": "GSD", "payload": {"scooter_id": 2}},
+        ]}
+
+        response = self.handler.command_handler("BATCH", payload, self.api)
+
+        self.assertEqual(response, {"results": [{"scooterID": 1}, {"scooterID": 2}]})
+
+    def test_batch_isolates_errors(self):
+        """A failing entry only fails its own result."""
+        self.api.get_scooter_details.return_value = {"scooterID": 1}
+        payload = {"commands": [
+            {"command": "GSD", "payload": {}},
+            {"command": "NOPE", "payload": {}},
+            {"command": "GSD", "payload": {"scooter_id": 1}},
+        ]}
+
+        results = self.handler.command_handler("BATCH", payload, self.api)["results"]
+
+        self.assertIn("error", results[0])
+        self.assertEqual(results[1], {"error": "Unknown command"})
+        self.assertEqual(results[2], {"scooterID": 1})
+
+    def test_batch_stop_on_error(self):
+        payload = {"stop_on_error": True, "commands": [
+            {"command": "NOPE", "payload": {}},
+            {"command": "GAS", "payload": {}},
+        ]}
+
+        results = self.handler.command_handler("BATCH", payload, self.api)["results"]
+
+        self.assertEqual(results[1], {"error": "Skipped after an earlier command failed"})
+        self.api.get_all_scooters.assert_not_called()
+
+    def test_stats_record_count_and_errors(self):
+        self.api.get_all_scooters.return_value = []
+        self.handler.run_command("GAS", {}, self.api)
+        self.handler.run_command("GAS", {}, self.api)
+        self.handler.run_command("NOPE", {}, self.api)
+
+        stats = self.handler.command_handler("STATS", {}, self.api)["commands"]
+
+        self.assertEqual(stats["GAS"]["count"], 2)
+        self.assertEqual(stats["GAS"]["errors"], 0)
+        self.assertEqual(stats["UNKNOWN"]["error_rate"], 1.0)
+
+    def test_message_lane(self):
+        """Ride-critical commands run in the high lane, and a batch runs in its least important command's lane."""
+        batch = {"command": "BATCH", "payload": {"commands": [{"command": "SB"}, {"command": "GABS"}]}}
+
+        self.assertEqual(self.handler.message_lane({"command": "EB"}), HIGH)
+        self.assertEqual(self.handler.message_lane({"command": "GAC"}), LOW)
+        self.assertEqual(self.handler.message_lane(batch), LOW)
+
+    def test_idempotency_key_replays_add_booking(self):
+        """A retried AB with the same key gets the first response, without adding a second booking."""
+        self.api.add_booking.return_value = {"message": "Booking added", "booking_id": 7}
+        message = {"command": "AB", "payload": {"email": "a@b.com", "scooter_id": 1}, "idempotency_key": "k1"}
+
+        first = self.handler.handle_message(message, ("10.0.0.5", 5000), self.api)
+        retry = self.handler.handle_message(message, ("10.0.0.5", 5001), self.api)
+
+        self.assertEqual(first, retry)
+        self.api.add_booking.assert_called_once()
+
+    def test_idempotency_key_does_not_replay_errors(self):
+        self.api.update_customer_funds.side_effect = [{"error": "Database unavailable"}, {"message": "Funds updated"}]
+        payload = {"email": "a@b.com", "funds": 10}
+
+        self.handler.run_command("UCF", payload, self.api, "k2")
+        response = self.handler.run_command("UCF", payload, self.api, "k2")
+
+        self.assertEqual(response, {"message": "Funds updated"})
+
+    def test_status_tick_reserves_scooter_for_booking_about_to_start(self):
+        """One tick of the status thread marks an Available scooter Booked when its next booking starts soon."""
+        start = datetime.now(AEST) + timedelta(minutes=5)
+        self.api.get_all_scooters.return_value = [{"scooterID": 1, "status": "Available", "ipAddress": "10.0.0.9"},
+                                                  {"scooterID": 2, "status": "Available", "ipAddress": "10.0.0.8"}]
+        self.api.get_active_bookings.return_value = {"active_bookings": [
+            {"bookingID": 7, "scooterID": 1, "startDateTime": start.isoformat(),
+             "endDateTime": (start + timedelta(hours=1)).isoformat()},
+        ]}
+        self.handler.send_request_to_agent = MagicMock()
+
+        with patch("handlers.socket_handler.time.sleep", side_effect=InterruptedError):
+            with self.assertRaises(InterruptedError):
+                self.handler.update_scooter_status_thread(self.api)
+        self.run_due_transitions()
+
+        self.api.set_scooter_status.assert_called_once_with({"scooter_id": 1, "status": "Booked"})
+        self.handler.agent_pushes.join()
+        self.handler.send_request_to_agent.assert_called_once_with("10.0.0.9", "USS", {"status": "Booked", "origin": "master", "version": ANY})
+        self.api.get_all_bookings_for_scooters.assert_not_called()
+
+    def test_resync_reads_only_changes_since_last_cursor(self):
+        """Resyncs follow the change cursors page by page, and only the first one reads everything."""
+        start = datetime.now(AEST) + timedelta(hours=2)
+        booking = {"bookingID": 7, "scooterID": 1, "status": "Active", "startDateTime": start.isoformat(),
+                   "endDateTime": (start + timedelta(hours=1)).isoformat()}
+        self.api.get_scooter_changes.side_effect = [
+            {"scooters": [{"scooterID": 1, "status": "Available", "ipAddress": "10.0.0.1"}], "deleted": [],
+             "cursor": 5, "more": True},
+            {"scooters": [{"scooterID": 2, "status": "Available", "ipAddress": "10.0.0.2"}], "deleted": [],
+             "cursor": 8, "more": False},
+            {"scooters": [], "deleted": [2], "cursor": 11, "more": False},
+        ]
+        self.api.get_booking_changes.side_effect = [
+            {"bookings": [booking], "deleted": [], "cursor": 9, "more": False},
+            {"bookings": [{**booking, "status": "Cancelled"}], "deleted": [], "cursor": 12, "more": False},
+        ]
+
+        self.handler.resync_scooters(self.api)
+        self.assertEqual(sorted(self.handler.previous_statuses), [1, 2])
+        self.assertEqual(len(self.handler.booking_index), 1)
+
+        self.handler.resync_scooters(self.api)
+
+        self.assertEqual([c.args[0] for c in self.api.get_scooter_changes.call_args_list], [0, 5, 8])
+        self.assertEqual([c.args[0] for c in self.api.get_booking_changes.call_args_list], [0, 9])
+        self.assertEqual((self.handler.scooter_cursor, self.handler.booking_cursor), (11, 12))
+        self.assertEqual(sorted(self.handler.previous_statuses), [1])
+        self.assertEqual(len(self.handler.booking_index), 0)
+        self.api.get_all_scooters.assert_not_called()
+        self.api.get_active_bookings.assert_not_called()
+
+    def test_resync_required_reads_everything_again(self):
+        """A cursor older than the deletions the database keeps is dropped, and what a full read misses is gone."""
+        start = datetime.now(AEST) + timedelta(hours=2)
+        booking = {"bookingID": 7, "scooterID": 1, "status": "Active", "startDateTime": start.isoformat(),
+                   "endDateTime": (start + timedelta(hours=1)).isoformat()}
+        self.api.get_scooter_changes.side_effect = [
+            {"scooters": [{"scooterID": 1, "status": "Available", "ipAddress": "10.0.0.1"},
+                          {"scooterID": 2, "status": "Available", "ipAddress": "10.0.0.2"}],
+             "deleted": [], "cursor": 8, "more": False},
+            {"scooters": [], "deleted": [], "cursor": 0, "more": False, "resync": True},
+            {"scooters": [{"scooterID": 1, "status": "Available", "ipAddress": "10.0.0.1"}], "deleted": [],
+             "cursor": 30, "more": False, "resync": False},
+        ]
+        self.api.get_booking_changes.side_effect = [
+            {"bookings": [booking], "deleted": [], "cursor": 9, "more": False},
+            {"bookings": [], "deleted": [], "cursor": 0, "more": False, "resync": True},
+            {"bookings": [{**booking, "bookingID": 8}], "deleted": [], "cursor": 31, "more": False, "resync": False},
+        ]
+
+        self.handler.resync_scooters(self.api)
+        self.handler.resync_scooters(self.api)
+
+        self.assertEqual([c.args[0] for c in self.api.get_scooter_changes.call_args_list], [0, 8, 0])
+        self.assertEqual([c.args[0] for c in self.api.get_booking_changes.call_args_list], [0, 9, 0])
+        self.assertEqual((self.handler.scooter_cursor, self.handler.booking_cursor), (30, 31))
+        self.assertEqual(sorted(self.handler.previous_statuses), [1])
+        self.assertEqual([b.booking_id for b in self.handler.booking_index.bookings_for(1)], [8])
+
+    def test_get_scooter_changes_command(self):
+        self.api.get_scooter_changes.return_value = {"scooters": [], "deleted": [], "cursor": 3, "more": False}
+
+        response = self.handler.command_handler("GSC", {"cursor": "3"}, self.api)
+
+        self.assertEqual(response["cursor"], 3)
+        self.api.get_scooter_changes.assert_called_once_with(3, None)
+
+    def test_change_feed_pushes_changed_scooter_status(self):
+        """A scooter change from the feed is pushed to its Agent Pi only if its status actually changed."""
+        self.handler.send_request_to_agent = MagicMock()
+        self.handler.apply_change({"table": "scooter", "op": "INSERT", "scooterID": 3, "status": "Available",
+                                   "ipAddress": "10.0.0.3"})
+        self.handler.apply_change({"table": "scooter", "op": "UPDATE", "scooterID": 3, "status": "Available",
+                                   "ipAddress": "10.0.0.3"})
+        self.handler.agent_pushes.join()
+        self.handler.send_request_to_agent.assert_not_called()
+
+        self.handler.apply_change({"table": "scooter", "op": "UPDATE", "scooterID": 3, "status": "Maintenance",
+                                   "ipAddress": "10.0.0.3"})
+        self.handler.agent_pushes.join()
+        self.handler.send_request_to_agent.assert_called_once_with("10.0.0.3", "USS", {"status": "Maintenance", "origin": "master", "version": ANY})
+
+    def test_change_feed_booking_reserves_scooter(self):
+        """A booking inserted through the feed is indexed and reserves its scooter without polling the API."""
+        self.handler.send_request_to_agent = MagicMock()
+        self.handler.apply_scooter_status({"scooterID": 4, "status": "Available", "ipAddress": "10.0.0.4"})
+        start = datetime.now(AEST) + timedelta(minutes=2)
+        self.handler.apply_change({"table": "booking", "op": "INSERT", "bookingID": 9, "scooterID": 4,
+                                   "status": "Active", "startDateTime": start.isoformat(),
+                                   "endDateTime": (start + timedelta(hours=1)).isoformat()})
+        self.run_due_transitions()
+
+        self.api.set_scooter_status.assert_called_once_with({"scooter_id": 4, "status": "Booked"})
+        self.handler.agent_pushes.join()
+        self.handler.send_request_to_agent.assert_called_once_with("10.0.0.4", "USS", {"status": "Booked", "origin": "master", "version": ANY})
+        self.api.get_all_scooters.assert_not_called()
+
+        # The trigger's notification of that update isn't pushed a second time
+        self.handler.apply_change({"table": "scooter", "op": "UPDATE", "scooterID": 4, "status": "Booked",
+                                   "ipAddress": "10.0.0.4"})
+        self.handler.agent_pushes.join()
+        self.assertEqual(self.handler.send_request_to_agent.call_count, 1)
+
+        self.handler.apply_change({"table": "booking", "op": "DELETE", "bookingID": 9, "scooterID": 4})
+        self.assertEqual(len(self.handler.booking_index), 0)
+
+    def test_booking_transitions_fire_when_due(self):
+        """A booking is reserved 10 minutes before it starts and completed when it ends, and not before."""
+        self.handler.send_request_to_agent = MagicMock()
+        self.handler.apply_scooter_status({"scooterID": 5, "status": "Available", "ipAddress": "10.0.0.5"})
+        now = [datetime.now(AEST).timestamp()]
+        self.handler.transitions.clock = lambda: now[0]
+        start = datetime.now(AEST) + timedelta(minutes=30)
+        self.api.add_booking.return_value = {"message": "Booking added successfully.", "booking_id": 11}
+        self.api.get_booking.return_value = {"bookingID": 11, "scooterID": 5, "status": "Active",
+                                             "startDateTime": start.isoformat(),
+                                             "endDateTime": (start + timedelta(hours=1)).isoformat()}
+
+        self.handler.command_handler("AB", {"scooter_id": 5}, self.api)
+        self.assertEqual(self.run_due_transitions(), 0)
+
+        now[0] = start.timestamp() - 9 * 60
+        with patch("handlers.socket_handler.datetime") as mock_datetime:
+            mock_datetime.now.return_value = datetime.fromtimestamp(now[0], AEST)
+            self.assertEqual(self.run_due_transitions(), 1)
+        self.api.set_scooter_status.assert_called_once_with({"scooter_id": 5, "status": "Booked"})
+
+        now[0] = start.timestamp() + 3600
+        self.assertEqual(self.run_due_transitions(), 0)
+        now[0] += 1
+        self.api.complete_elapsed_bookings.return_value = {"completed_bookings": [{"bookingID": 11, "scooterID": 5}]}
+        self.assertEqual(self.run_due_transitions(), 1)
+        self.api.complete_elapsed_bookings.assert_called_once_with()
+        self.assertEqual(len(self.handler.booking_index), 0)
+
+    def test_elapsed_bookings_are_completed_at_once_and_release_their_scooters(self):
+        """After an outage every elapsed booking is completed in one request, and only reserved scooters are freed."""
+        self.handler.send_request_to_agent = MagicMock()
+        self.api.get_all_scooters.return_value = [{"scooterID": 1, "status": "Booked", "ipAddress": "10.0.0.1"},
+                                                  {"scooterID": 2, "status": "In Use", "ipAddress": "10.0.0.2"},
+                                                  {"scooterID": 3, "status": "Booked", "ipAddress": "10.0.0.3"}]
+        self.api.complete_elapsed_bookings.return_value = {"completed_bookings": [
+            {"bookingID": booking_id, "scooterID": 1 + booking_id % 2} for booking_id in range(1000)]}
+        self.api.get_active_bookings.return_value = {"active_bookings": []}
+
+        self.handler.resync_scooters(self.api)
+
+        self.api.complete_elapsed_bookings.assert_called_once_with()
+        self.api.set_booking_status_complete.assert_not_called()
+        self.api.set_scooter_status.assert_called_once_with({"scooter_id": 1, "status": "Available"})
+        self.handler.agent_pushes.join()
+        self.handler.send_request_to_agent.assert_called_once_with("10.0.0.1", "USS", {"status": "Available", "origin": "master", "version": ANY})
+
+    def test_cancelled_booking_transitions_do_not_fire(self):
+        start = datetime.now(AEST) + timedelta(minutes=30)
+        self.handler.booking_index.apply({"bookingID": 12, "scooterID": 6, "status": "Active",
+                                          "startDateTime": start.isoformat(),
+                                          "endDateTime": (start + timedelta(hours=1)).isoformat()})
+        self.assertEqual(len(self.handler.transitions), 2)
+        self.api.cancel_booking.return_value = {"message": "Booking canceled successfully."}
+
+        self.handler.command_handler("CB", {"booking_id": 12}, self.api)
+
+        self.assertEqual(len(self.handler.transitions), 0)
+
+    def test_slow_transition_does_not_hold_up_timers(self):
+        """A timer only queues its transition, so a slow database API call doesn't delay the timers behind it."""
+        self.handler.apply_scooter_status({"scooterID": 5, "status": "Available", "ipAddress": "10.0.0.5"})
+        self.handler.send_request_to_agent = MagicMock()
+        released = threading.Event()
+        self.api.set_scooter_status.side_effect = lambda payload: released.wait(5)
+        start = datetime.now(AEST) + timedelta(minutes=2)
+        for booking_id in (13, 14):
+            self.handler.booking_index.apply({"bookingID": booking_id, "scooterID": 5, "status": "Active",
+                                              "startDateTime": start.isoformat(),
+                                              "endDateTime": (start + timedelta(hours=1)).isoformat()})
+
+        started = time.monotonic()
+        self.assertEqual(self.handler.transitions.run_due(), 2)
+        self.assertLess(time.monotonic() - started, 1)
+        released.set()
+        self.handler.transition_workers.submit(lambda: None).result()
+        self.api.set_scooter_status.assert_called_once_with({"scooter_id": 5, "status": "Booked"})
+
+    def test_elapsed_booking_timers_share_one_completion(self):
+        """Completion timers firing while a completion is waiting to run don't queue another request."""
+        self.api.complete_elapsed_bookings.return_value = {"completed_bookings": []}
+        blocked = threading.Event()
+        self.handler.transition_workers.submit(blocked.wait, 5)
+        end = datetime.now(AEST) - timedelta(minutes=5)
+        for booking_id in (15, 16, 17):
+            self.handler.booking_index.apply({"bookingID": booking_id, "scooterID": 7, "status": "Active",
+                                              "startDateTime": (end - timedelta(hours=1)).isoformat(),
+                                              "endDateTime": end.isoformat()})
+
+        self.handler.transitions.run_due()
+        blocked.set()
+        self.run_due_transitions()
+        self.api.complete_elapsed_bookings.assert_called_once_with()
+
+    def test_heartbeat_saves_ip_only_when_it_changes(self):
+        self.handler.command_handler("HB", {"scooter_id": "3", "ip_address": "10.0.0.3", "status": "Available"}, self.api)
+        self.handler.command_handler("HB", {"scooter_id": "3", "ip_address": "10.0.0.3", "status": "Available"}, self.api)
+        self.handler.command_handler("HB", {"scooter_id": "3", "ip_address": "10.0.0.4", "status": "Available"}, self.api)
+
+        self.assertEqual(self.api.update_scooter_ip_address.call_count, 2)
+        self.api.update_scooter_ip_address.assert_called_with(3, {"ip_address": "10.0.0.4"})
+        agents = self.handler.command_handler("GAL", {}, self.api)["agents"]
+        self.assertEqual(agents[3]["ip"], "10.0.0.4")
+        self.assertTrue(agents[3]["alive"])
+
+    def test_dead_agent_gets_latest_status_when_it_comes_back(self):
+        """Status changes for an agent that stopped sending heartbeats wait in its outbox, coalesced to the latest."""
+        self.handler.send_request_to_agent = MagicMock(return_value={"message": "success"})
+        now = [0]
+        self.handler.agents.clock = lambda: now[0]
+        self.handler.command_handler("HB", {"scooter_id": 3, "ip_address": "10.0.0.3", "status": "Available"}, self.api)
+        self.handler.apply_scooter_status({"scooterID": 3, "status": "Available", "ipAddress": "10.0.0.3"})
+
+        now[0] = 31
+        for status in ["Booked", "Maintenance", "Booked"]:
+            self.handler.apply_scooter_status({"scooterID": 3, "status": status, "ipAddress": "10.0.0.3"})
+        self.handler.agent_pushes.join()
+        self.handler.send_request_to_agent.assert_not_called()
+        self.assertEqual(len(self.handler.outbox), 1)
+
+        self.handler.command_handler("HB", {"scooter_id": 3, "ip_address": "10.0.0.3", "status": "Available"}, self.api)
+        self.handler.agent_pushes.join()
+        self.handler.send_request_to_agent.assert_called_once_with("10.0.0.3", "USS", {"status": "Booked", "origin": "master", "version": ANY})
+        self.assertEqual(len(self.handler.outbox), 0)
+
+    def test_failed_push_stays_in_outbox(self):
+        self.handler.send_request_to_agent = MagicMock(return_value=None)
+        self.handler.apply_scooter_status({"scooterID": 4, "status": "Available", "ipAddress": "10.0.0.4"})
+
+        self.handler.apply_scooter_status({"scooterID": 4, "status": "Booked", "ipAddress": "10.0.0.4"})
+        self.handler.agent_pushes.join()
+
+        self.assertEqual(self.handler.send_request_to_agent.call_count, 1)
+        self.assertEqual(self.handler.outbox.take(4)[0]["payload"], {"status": "Booked", "origin": "master", "version": ANY})
+
+    def test_pushed_statuses_have_increasing_versions(self):
+        self.handler.apply_scooter_status({"scooterID": 5, "status": "Available", "ipAddress": None})
+        self.handler.apply_scooter_status({"scooterID": 5, "status": "Booked", "ipAddress": None})
+        first = self.handler.outbox.take(5)[0]["payload"]["version"]
+
+        self.handler.apply_scooter_status({"scooterID": 5, "status": "Available", "ipAddress": None})
+
+        self.assertGreater(self.handler.outbox.take(5)[0]["payload"]["version"], first)
+
+    def test_status_set_by_agent_is_not_pushed_back(self):
+        self.handler.send_request_to_agent = MagicMock(return_value={"message": "success"})
+        self.handler.apply_scooter_status({"scooterID": 6, "status": "Booked", "ipAddress": "10.0.0.6"})
+
+        self.handler.command_handler("USS", {"scooter_id": "6", "status": "In Use", "origin": "agent"}, self.api)
+        # The change feed's notification of the agent's own write
+        self.handler.apply_scooter_status({"scooterID": 6, "status": "In Use", "ipAddress": "10.0.0.6"})
+
+        self.api.set_scooter_status.assert_called_once_with({"scooter_id": "6", "status": "In Use", "origin": "agent"})
+        self.handler.agent_pushes.join()
+        self.handler.send_request_to_agent.assert_not_called()
+        self.assertEqual(len(self.handler.outbox), 0)
+
+    def test_fleet_change_is_multicast_in_one_datagram(self):
+        """With the fleet channel on, a burst of status changes is batched into one datagram and no USS is sent."""
+        receiver = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        receiver.bind(("127.0.0.1", 0))
+        receiver.settimeout(5)
+        self.addCleanup(receiver.close)
+        self.handler.fleet = FleetPublisher(*receiver.getsockname())
+        self.addCleanup(self.handler.fleet.close)
+        self.handler.send_request_to_agent = MagicMock()
+        for scooter_id in range(1, 6):
+            self.handler.apply_scooter_status({"scooterID": scooter_id, "status": "Available", "ipAddress": None})
+
+        for scooter_id in range(1, 6):
+            self.handler.apply_scooter_status({"scooterID": scooter_id, "status": "Under Repair", "ipAddress": None})
+
+        self.assertIsNotNone(self.handler.transitions.due(("fleet", "flush")))
+        self.assertEqual(self.handler.flush_fleet(), 1)
+        datagram = json.loads(receiver.recv(1400))
+        self.assertEqual(datagram["seq"], 1)
+        self.assertEqual(datagram["records"], [[scooter_id, "Under Repair"] for scooter_id in range(1, 6)])
+        self.assertEqual(len(self.handler.outbox), 0)
+        self.handler.send_request_to_agent.assert_not_called()
+
+    def answer_together(self, calls=2):
+        """
+        Make a function that answers a mocked API call only once `calls` calls are waiting for an answer, so a
+        command only finishes if it makes them at the same time.
+        """
+        all_waiting = threading.Barrier(calls, timeout=5)
+
+        def answer(response):
+            all_waiting.wait()
+            return response
+
+        return answer
+
+    def test_end_booking_reads_scooter_and_customer_at_the_same_time(self):
+        answer = self.answer_together()
+        started = (datetime.now(AEST) - timedelta(minutes=10)).isoformat()
+        self.api.get_booking.return_value = {"scooterID": 3, "email": "a@b.com", "actualStartDateTime": started}
+        self.api.get_scooter_details.side_effect = lambda scooter_id: answer({"costMin": 0.5})
+        self.api.get_customer_details.side_effect = lambda email: answer({"funds": 20})
+        self.api.add_transaction.return_value = {"message": "Transaction added successfully."}
+        self.api.update_customer_funds.return_value = {"message": "Customer funds updated successfully."}
+        self.api.set_booking_status_complete.return_value = {"message": "Booking completed."}
+
+        response = self.handler.command_handler("EB", {"booking_id": 7}, self.api)
+
+        self.assertEqual(response, {"message": "Booking completed."})
+        cost = self.api.add_transaction.call_args.args[0]["transaction_amount"]
+        self.assertAlmostEqual(cost, 5, delta=0.1)
+        self.api.update_customer_funds.assert_called_once_with({"email": "a@b.com", "funds": 20 - cost})
+        self.api.set_scooter_status.assert_called_once_with({"scooter_id": 3, "scooter_status": "Available"})
+
+    @patch('handlers.socket_handler.EmailSender.send_email')
+    def test_report_fault_reads_engineers_while_recording_it(self, mock_send_email):
+        answer = self.answer_together()
+        self.api.update_scooter_fault.side_effect = lambda payload: answer({"message": "Fault recorded."})
+        self.api.get_all_engineer_emails.side_effect = lambda: answer(["engineer@example.com", "not an email"])
+        self.api.get_fault_by_scooter.return_value = [[11, 2, "2024-10-01 09:00", None, "Open", None, "Flat tyre"]]
+
+        response = self.handler.command_handler("RSF", {"scooter_id": 2}, self.api)
+
+        self.assertEqual(response, {"message": "Fault recorded."})
+        self.api.set_scooter_status.assert_called_once_with({"scooter_id": 2, "status": "Needs Repair"})
+        self.assertEqual(mock_send_email.call_args.args[1], ['group12.cosc2674@gmail.com', "engineer@example.com"])
+
+    def test_resolve_fault_reads_fault_while_resolving_it(self):
+        answer = self.answer_together()
+        self.api.resolve_scooter_fault.side_effect = lambda fault_id, payload: answer({"message": "Fault resolved."})
+        self.api.get_fault_by_id.side_effect = lambda fault_id: answer({"scooterID": 4})
+
+        response = self.handler.command_handler("RESF", {"fault_id": 9}, self.api)
+
+        self.assertEqual(response, {"message": "Fault resolved."})
+        self.api.set_scooter_status.assert_called_once_with({"scooter_id": 4, "status": "Available"})
+
+    def test_admit_message_rate_limits_by_ip_and_lane(self):
+        """A batch uses up one request per command, and other lanes and clients keep their own allowance."""
+        batch = {"command": "BATCH", "payload": {"commands": [{"command": "GAC"}, {"command": "GABS"}]}}
+        self.handler.admit_message(batch, ("10.0.0.5", 5000))
+
+        with self.assertRaises(ServerBusy):
+            self.handler.admit_message({"command": "GAC"}, ("10.0.0.5", 5001))
+        self.handler.admit_message({"command": "EB"}, ("10.0.0.5", 5001))
+        self.handler.admit_message({"command": "GAC"}, ("10.0.0.6", 5000))
+
+        stats = self.handler.command_handler("STATS", {}, self.api)
+        self.assertEqual(stats["rate_limits"]["rejected"], {LOW: 1})
+
+    def test_frontends_and_agents_are_not_rate_limited(self):
+        """The frontends send every user's requests from one address, so their users mustn't share one allowance."""
+        self.handler.agents.beat(1, "10.0.0.7", "Available")
+        for _ in range(5):
+            self.handler.admit_message({"command": "GABS"}, ("127.0.0.1", 5000))
+            self.handler.admit_message({"command": "GABS"}, ("10.0.0.7", 5000))
+
+        self.handler.rate_limit_exempt = {"ips": [], "agents": False}
+        self.handler.admit_message({"command": "GABS"}, ("127.0.0.1", 5000))
+        self.handler.admit_message({"command": "GABS"}, ("127.0.0.1", 5000))
+        with self.assertRaises(ServerBusy):
+            self.handler.admit_message({"command": "GABS"}, ("127.0.0.1", 5000))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import MagicMock
+from scooter_protocol import ProtocolServer
+from utils.agent_channels import AgentChannels, PING
+
+
+class TestAgentChannels(unittest.TestCase):
+
+    def setUp(self):
+        self.now = 0.0
+        self.connections = []
+
+        def connect(address, timeout):
+            connection = MagicMock()
+            connection.request.return_value = {"message": "success"}
+            self.connections.append((address, connection))
+            return connection
+
+        self.channels = AgentChannels(65001, timeout=5, keepalive=30, clock=lambda: self.now, connect=connect)
+
+    def test_channel_is_reused(self):
+        self.channels.request("10.0.0.1", "USS", {"status": "Booked"})
+        self.channels.request("10.0.0.1", "USS", {"status": "Available"})
+
+        self.assertEqual(len(self.connections), 1)
+        self.assertEqual(self.connections[0][0], ("10.0.0.1", 65001))
+        self.assertEqual(self.connections[0][1].request.call_count, 2)
+
+    def test_failed_agent_backs_off_before_reconnecting(self):
+        self.channels.request("10.0.0.1", "USS", {"status": "Booked"})
+        self.connections[0][1].request.side_effect = ConnectionError("reset")
+
+        with self.assertRaises(ConnectionError):
+            self.channels.request("10.0.0.1", "USS", {"status": "Available"})
+        self.connections[0][1].close.assert_called_once_with()
+
+        # Failed straight away, without reconnecting, until the reconnect delay has passed
+        with self.assertRaises(ConnectionError):
+            self.channels.request("10.0.0.1", "USS", {"status": "Available"})
+        self.assertEqual(len(self.connections), 1)
+
+        self.now += 1
+        self.assertEqual(self.channels.request("10.0.0.1", "USS", {"status": "Available"}), {"message": "success"})
+        self.assertEqual(len(self.connections), 2)
+        self.assertEqual(self.channels.snapshot()["agents"]["10.0.0.1"]["failures"], 0)
+
+    def test_idle_channels_are_pinged(self):
+        self.channels.request("10.0.0.1", "USS", {"status": "Booked"})
+        self.now = 10
+        self.channels.request("10.0.0.2", "USS", {"status": "Booked"})
+
+        self.now = 35
+        self.assertEqual(self.channels.ping_idle(), 1)
+        self.connections[0][1].request.assert_called_with(PING, {})
+
+    def test_moved_scooter_closes_old_channel(self):
+        self.channels.assign(1, "10.0.0.1")
+        self.channels.request("10.0.0.1", "USS", {"status": "Booked"})
+
+        self.channels.assign(1, "10.0.0.9")
+
+        self.connections[0][1].close.assert_called_once_with()
+        self.assertEqual(self.channels.snapshot()["open"], 0)
+
+
+class TestAgentChannelsLoopback(unittest.TestCase):
+
+    def test_requests_share_one_connection(self):
+        """An agent's listener answers every request sent over the one channel."""
+        accepted = []
+        executor = ThreadPoolExecutor(max_workers=1)
+        server = ProtocolServer(("127.0.0.1", 0), lambda message, addr: {"echo": message.get("command")}, executor)
+        original = server.handle_connection
+        server.handle_connection = lambda conn, addr: (accepted.append(addr), original(conn, addr))
+        server.bind()
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        channels = AgentChannels(server.address[1], timeout=5)
+        try:
+            for command in ["USS", "FMS", PING]:
+                self.assertEqual(channels.request("127.0.0.1", command, {}), {"echo": command})
+            self.assertEqual(len(accepted), 1)
+        finally:
+            channels.close()
+            server.close()
+            executor.shutdown()
+
+
+if __name__ == '__main__':
+    unittest.main()
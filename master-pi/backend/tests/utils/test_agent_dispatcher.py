@@ -0,0 +1,68 @@
+import threading
+import time
+import unittest
+from utils.agent_dispatcher import AgentDispatcher
+
+
+class TestAgentDispatcher(unittest.TestCase):
+
+    def test_unreachable_agents_time_out_in_parallel(self):
+        """Pushing to many unreachable agents takes about one timeout, not one per agent."""
+        def send(ip, command, payload):
+            time.sleep(0.1)  # An agent that never answers, given up on after its timeout
+            return None
+
+        dispatcher = AgentDispatcher(send, workers=50, retries=0)
+        started = time.monotonic()
+        results = dispatcher.push_all([f"10.0.0.{i}" for i in range(50)], "USS", {"status": "Maintenance"}).result(5)
+
+        self.assertLess(time.monotonic() - started, 1)
+        self.assertEqual(len(results["failed"]), 50)
+        self.assertEqual(dispatcher.snapshot()["failed"], 50)
+
+    def test_push_does_not_block_caller(self):
+        release = threading.Event()
+        dispatcher = AgentDispatcher(lambda ip, command, payload: release.wait(5) and "OK", workers=2)
+
+        started = time.monotonic()
+        future = dispatcher.push("10.0.0.1", "USS", {"status": "Booked"})
+
+        self.assertLess(time.monotonic() - started, 0.05)
+        self.assertFalse(future.done())
+        release.set()
+        self.assertEqual(future.result(5), "OK")
+
+    def test_requests_to_one_agent_stay_in_order(self):
+        sent = []
+
+        def send(ip, command, payload):
+            time.sleep(0.01 if payload["status"] == "Booked" else 0)
+            sent.append((ip, payload["status"]))
+            return "OK"
+
+        dispatcher = AgentDispatcher(send, workers=4)
+        for status in ["Booked", "Available", "Maintenance"]:
+            dispatcher.push("10.0.0.1", "USS", {"status": status})
+        dispatcher.push("10.0.0.2", "USS", {"status": "Available"})
+
+        self.assertTrue(dispatcher.join(5))
+        self.assertEqual([status for ip, status in sent if ip == "10.0.0.1"], ["Booked", "Available", "Maintenance"])
+
+    def test_failed_request_is_retried_with_backoff(self):
+        responses = [None, None, "OK"]
+        dispatcher = AgentDispatcher(lambda ip, command, payload: responses.pop(0), workers=1, retries=2, backoff=0.01)
+
+        results = dispatcher.push_all(["10.0.0.1"], "USS", {"status": "Booked"}).result(5)
+
+        self.assertEqual(results["sent"], ["10.0.0.1"])
+        self.assertEqual(results["responses"], {"10.0.0.1": "OK"})
+        self.assertEqual(dispatcher.snapshot()["retried"], 2)
+
+    def test_push_all_to_no_agents(self):
+        dispatcher = AgentDispatcher(lambda ip, command, payload: "OK", workers=1)
+
+        self.assertEqual(dispatcher.push_all([], "USS", {}).result(1), {"sent": [], "failed": [], "responses": {}})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+from utils import agent_outbox
+from utils.agent_outbox import AgentOutbox
+
+
+class TestAgentOutbox(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "agent_outbox.jsonl")
+        self.outbox = AgentOutbox(self.path)
+
+    def test_status_updates_are_coalesced(self):
+        self.outbox.put(1, "USS", {"status": "Booked"})
+        self.outbox.put(1, "FMS", {})
+        self.outbox.put(1, "USS", {"status": "Available"})
+
+        entries = self.outbox.take(1)
+
+        self.assertEqual([(entry["command"], entry["payload"]) for entry in entries],
+                         [("FMS", {}), ("USS", {"status": "Available"})])
+        self.assertEqual(self.outbox.snapshot()["coalesced"], 1)
+
+    def test_update_being_delivered_is_not_replaced(self):
+        self.outbox.put(1, "USS", {"status": "Booked"})
+        sending = self.outbox.take(1)[0]
+
+        self.outbox.put(1, "USS", {"status": "Available"})
+        self.assertEqual([entry["payload"] for entry in self.outbox.take(1)], [{"status": "Available"}])
+
+        self.outbox.done(1, sending["id"], delivered=True)
+        self.assertEqual(len(self.outbox), 1)
+
+    def test_failed_delivery_is_kept_for_the_next_attempt(self):
+        self.outbox.put(1, "USS", {"status": "Booked"})
+        entry = self.outbox.take(1)[0]
+        self.assertEqual(self.outbox.take(1), [])
+
+        self.outbox.done(1, entry["id"], delivered=False)
+
+        self.assertEqual(self.outbox.take(1)[0]["id"], entry["id"])
+
+    def test_outbox_survives_a_restart(self):
+        self.outbox.put(1, "USS", {"status": "Booked"})
+        self.outbox.put(2, "USS", {"status": "Available"})
+        delivered = self.outbox.take(2)[0]
+        self.outbox.done(2, delivered["id"], delivered=True)
+
+        reloaded = AgentOutbox(self.path)
+
+        self.assertEqual(reloaded.scooters(), [1])
+        pending = reloaded.take(1)[0]
+        self.assertEqual(pending["payload"], {"status": "Booked"})
+        self.assertGreater(reloaded.put(1, "FMS", {}), pending["id"])
+
+    def test_changes_are_appended_to_the_log(self):
+        self.outbox.put(1, "USS", {"status": "Booked"})
+        self.outbox.put(1, "USS", {"status": "Available"})
+        entry = self.outbox.take(1)[0]
+        self.outbox.done(1, entry["id"], delivered=True)
+
+        with open(self.path, encoding="utf-8") as file:
+            self.assertEqual(len(file.readlines()), 3)
+        self.assertEqual(AgentOutbox(self.path).scooters(), [])
+
+    def test_log_is_compacted_once_mostly_delivered(self):
+        with patch.object(agent_outbox, "COMPACT_AFTER", 11):
+            self.outbox.put(2, "FMS", {})
+            for _ in range(5):
+                self.outbox.put(1, "FMS", {})
+                self.outbox.done(1, self.outbox.take(1)[0]["id"], delivered=True)
+
+        with open(self.path, encoding="utf-8") as file:
+            self.assertEqual(len(file.readlines()), 1)
+        self.assertEqual([entry["command"] for entry in AgentOutbox(self.path).take(2)], ["FMS"])
+
+    def test_unfinished_record_is_skipped(self):
+        self.outbox.put(1, "USS", {"status": "Booked"})
+        with open(self.path, "a", encoding="utf-8") as file:
+            file.write('{"op": "put", "scooter": 1, "ent')
+
+        reloaded = AgentOutbox(self.path)
+
+        self.assertEqual([entry["payload"] for entry in reloaded.take(1)], [{"status": "Booked"}])
+
+
+if __name__ == '__main__':
+    unittest.main()
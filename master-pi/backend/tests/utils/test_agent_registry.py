@@ -0,0 +1,40 @@
+import unittest
+from utils.agent_registry import AgentRegistry
+
+
+class TestAgentRegistry(unittest.TestCase):
+
+    def setUp(self):
+        self.now = 0.0
+        self.registry = AgentRegistry(dead_after=30, clock=lambda: self.now)
+
+    def test_beat_reports_new_and_moved_agents(self):
+        self.assertTrue(self.registry.beat(1, "10.0.0.1", "Available"))
+        self.assertFalse(self.registry.beat(1, "10.0.0.1", "Booked"))
+        self.assertTrue(self.registry.beat(1, "10.0.0.2", "Booked"))
+
+        self.assertEqual(self.registry.snapshot()[1]["status"], "Booked")
+        self.assertFalse(self.registry.is_dead("10.0.0.1"))
+
+    def test_silent_agent_is_dead_until_it_beats_again(self):
+        self.registry.beat(1, "10.0.0.1", "Available")
+        self.registry.beat(2, "10.0.0.2", "Available")
+
+        self.now = 20
+        self.registry.beat(2, "10.0.0.2", "Available")
+        self.now = 31
+        self.assertTrue(self.registry.is_dead("10.0.0.1"))
+        self.assertFalse(self.registry.is_dead("10.0.0.2"))
+        self.assertEqual(self.registry.alive(), [2])
+
+        self.registry.beat(1, "10.0.0.1", "Available")
+        self.assertFalse(self.registry.is_dead("10.0.0.1"))
+
+    def test_unknown_agent_is_not_dead(self):
+        self.now = 1000
+
+        self.assertFalse(self.registry.is_dead("10.0.0.9"))
+
+
+if __name__ == '__main__':
+    unittest.main()
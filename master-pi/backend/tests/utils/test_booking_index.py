@@ -0,0 +1,57 @@
+import unittest
+from datetime import datetime, timedelta
+from unittest.mock import MagicMock
+import pytz
+from utils.booking_index import BookingIndex
+
+AEST = pytz.timezone('Australia/Sydney')
+NOW = AEST.localize(datetime(2024, 9, 1, 12, 0))
+
+
+def booking(booking_id, scooter_id, start_hours, end_hours):
+    """An Active booking as returned by /booking/active, starting and ending the given hours from NOW."""
+    return {"bookingID": booking_id, "scooterID": scooter_id,
+            "startDateTime": (NOW + timedelta(hours=start_hours)).isoformat(),
+            "endDateTime": (NOW + timedelta(hours=end_hours)).isoformat()}
+
+
+class TestBookingIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.parse = MagicMock(side_effect=lambda value: datetime.fromisoformat(value) if value else None)
+        self.index = BookingIndex(self.parse)
+
+    def test_next_booking_is_earliest_not_yet_ended(self):
+        self.index.refresh([booking(3, 1, 5, 6), booking(1, 1, -3, -2), booking(2, 1, 1, 2), booking(4, 2, 0, 1)])
+
+        self.assertEqual(self.index.next_booking(1, NOW).booking_id, 2)
+        self.assertEqual(self.index.next_booking(2, NOW).booking_id, 4)
+        self.assertIsNone(self.index.next_booking(3, NOW))
+
+    def test_refresh_only_parses_changes(self):
+        bookings = [booking(1, 1, 1, 2), booking(2, 1, 3, 4)]
+        self.index.refresh(bookings)
+        self.parse.reset_mock()
+
+        added, removed = self.index.refresh(bookings[1:] + [booking(5, 1, 0.5, 0.75)])
+
+        self.assertEqual((added, removed), (1, 1))
+        self.assertEqual(self.parse.call_count, 2)
+        self.assertEqual([b.booking_id for b in self.index.bookings_for(1)], [5, 2])
+
+    def test_changed_booking_is_moved(self):
+        self.index.refresh([booking(1, 1, 1, 2)])
+
+        self.index.refresh([booking(1, 2, 3, 4)])
+
+        self.assertIsNone(self.index.next_booking(1, NOW))
+        self.assertEqual(self.index.next_booking(2, NOW).start, NOW + timedelta(hours=3))
+
+    def test_unparseable_booking_is_skipped(self):
+        self.index.refresh([{"bookingID": 1, "scooterID": 1, "startDateTime": None, "endDateTime": None}])
+
+        self.assertEqual(len(self.index), 1)
+        self.assertIsNone(self.index.next_booking(1, NOW))
+
+if __name__ == '__main__':
+    unittest.main()
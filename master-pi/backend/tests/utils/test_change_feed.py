@@ -0,0 +1,34 @@
+import unittest
+from unittest.mock import MagicMock
+from utils.change_feed import ChangeFeed
+
+
+class TestChangeFeed(unittest.TestCase):
+
+    def setUp(self):
+        self.on_change = MagicMock()
+        self.feed = ChangeFeed("database_info.json", self.on_change, MagicMock())
+
+    def test_notification_is_decoded(self):
+        self.feed.handle_notification('{"table": "scooter", "op": "UPDATE", "scooterID": 1, "status": "Booked"}')
+
+        self.on_change.assert_called_once_with({"table": "scooter", "op": "UPDATE", "scooterID": 1, "status": "Booked"})
+        self.assertEqual(self.feed.received, 1)
+
+    def test_malformed_notification_is_ignored(self):
+        self.feed.handle_notification("not json")
+
+        self.on_change.assert_not_called()
+        self.assertEqual(self.feed.received, 0)
+
+    def test_handler_errors_do_not_stop_the_feed(self):
+        self.on_change.side_effect = KeyError("scooterID")
+
+        self.feed.handle_notification('{"table": "scooter"}')
+        self.feed.handle_notification('{"table": "booking"}')
+
+        self.assertEqual(self.on_change.call_count, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
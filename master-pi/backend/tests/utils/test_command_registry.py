@@ -0,0 +1,73 @@
+import threading
+import time
+import unittest
+from scooter_protocol import ServerBusy
+from utils.command_registry import CommandRegistry, CommandStats, HIGH, NORMAL
+from utils.priority_lanes import LaneExecutor
+
+
+class TestCommandRegistry(unittest.TestCase):
+
+    def test_register_and_lookup(self):
+        registry = CommandRegistry()
+
+        @registry.register("SB", lane=HIGH, locked=True)
+        def start_booking(instance, payload, api):
+            return payload
+
+        command = registry.get("SB")
+        self.assertEqual(command.handler(None, {"booking_id": 1}, None), {"booking_id": 1})
+        self.assertTrue(command.locked)
+        self.assertEqual(registry.lane("SB"), HIGH)
+        self.assertEqual(registry.lane("NOPE"), NORMAL)
+
+    def test_duplicate_code_is_rejected(self):
+        registry = CommandRegistry()
+        registry.register("GAS")(lambda instance, payload, api: None)
+
+        with self.assertRaises(ValueError):
+            registry.register("GAS")(lambda instance, payload, api: None)
+
+
+class TestCommandStats(unittest.TestCase):
+
+    def test_snapshot(self):
+        stats = CommandStats()
+        stats.record("GAS", 0.003)
+        stats.record("GAS", 0.020, error=True)
+        with self.assertRaises(ZeroDivisionError):
+            list(stats.time_records("GAS", (1 / 0 for _ in range(1)), time.perf_counter()))
+
+        snapshot = stats.snapshot()["GAS"]
+
+        self.assertEqual(snapshot["count"], 3)
+        self.assertEqual(snapshot["errors"], 2)
+        self.assertEqual(snapshot["histogram"]["<=5ms"], 1)
+        self.assertEqual(snapshot["histogram"]["<=25ms"], 1)
+        self.assertEqual(snapshot["p50_ms"], 5)
+
+
+class TestLaneExecutor(unittest.TestCase):
+
+    def test_sheds_load_past_capacity(self):
+        """Once the lane is full, further commands are turned away instead of queueing."""
+        lane = LaneExecutor("low", workers=1, capacity=2)
+        release = threading.Event()
+        try:
+            lane.submit(release.wait)
+            lane.submit(release.wait)
+            with self.assertRaises(ServerBusy):
+                lane.submit(release.wait)
+            self.assertEqual(lane.shed, 1)
+        finally:
+            release.set()
+            lane.shutdown()
+
+        # Capacity is given back as commands finish
+        lane = LaneExecutor("low", workers=1, capacity=1)
+        lane.submit(lambda: None).result()
+        lane.submit(lambda: None).result()
+        lane.shutdown()
+
+if __name__ == '__main__':
+    unittest.main()
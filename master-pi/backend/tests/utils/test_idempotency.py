@@ -0,0 +1,82 @@
+import threading
+import unittest
+from utils.idempotency import IdempotencyStore, request_fingerprint
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestIdempotencyStore(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.store = IdempotencyStore(ttl=60, max_keys=2, clock=self.clock)
+        self.calls = 0
+
+    def add_booking(self):
+        self.calls += 1
+        return {"booking_id": self.calls}
+
+    def test_replays_response(self):
+        first = self.store.run("key", "AB", self.add_booking)
+        second = self.store.run("key", "AB", self.add_booking)
+
+        self.assertEqual(first, second)
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(self.store.snapshot()["replayed"], 1)
+
+    def test_expires_after_ttl(self):
+        self.store.run("key", "AB", self.add_booking)
+        self.clock.now = 61
+
+        self.assertEqual(self.store.run("key", "AB", self.add_booking), {"booking_id": 2})
+
+    def test_oldest_forgotten_past_max_keys(self):
+        for key in ("a", "b", "c"):
+            self.store.run(key, "AB", self.add_booking)
+
+        self.assertEqual(self.store.run("a", "AB", self.add_booking), {"booking_id": 4})
+        self.assertEqual(self.store.run("c", "AB", self.add_booking), {"booking_id": 3})
+
+    def test_rejected_responses_are_not_kept(self):
+        self.store.run("key", "AB", lambda: {"error": "Database unavailable"}, keep=lambda r: "error" not in r)
+
+        self.assertEqual(self.store.run("key", "AB", self.add_booking), {"booking_id": 1})
+
+    def test_key_reused_for_different_request(self):
+        self.store.run("key", "AB", self.add_booking)
+
+        self.assertIn("error", self.store.run("key", "ANT", self.add_booking))
+
+    def test_retry_waits_for_running_request(self):
+        """A retry arriving while the first attempt is still running gets its response instead of running again."""
+        started, release = threading.Event(), threading.Event()
+
+        def slow():
+            started.set()
+            release.wait(5)
+            return self.add_booking()
+
+        results = []
+        first = threading.Thread(target=lambda: results.append(self.store.run("key", "AB", slow)))
+        first.start()
+        started.wait(5)
+        retry = threading.Thread(target=lambda: results.append(self.store.run("key", "AB", self.add_booking)))
+        retry.start()
+        release.set()
+        first.join(5)
+        retry.join(5)
+
+        self.assertEqual(results, [{"booking_id": 1}, {"booking_id": 1}])
+        self.assertEqual(self.calls, 1)
+
+    def test_fingerprint_ignores_key_order(self):
+        self.assertEqual(request_fingerprint("AB", {"a": 1, "b": 2}), request_fingerprint("AB", {"b": 2, "a": 1}))
+
+if __name__ == '__main__':
+    unittest.main()
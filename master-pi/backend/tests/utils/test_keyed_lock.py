@@ -0,0 +1,56 @@
+import threading
+import time
+import unittest
+from utils.keyed_lock import KeyedLock
+
+
+class TestKeyedLock(unittest.TestCase):
+
+    def setUp(self):
+        self.locks = KeyedLock()
+
+    def test_same_key_is_exclusive(self):
+        """Two threads holding the same key must not overlap."""
+        active = []
+        overlaps = []
+
+        def worker():
+            with self.locks.hold(("booking", "1")):
+                active.append(1)
+                if len(active) > 1:
+                    overlaps.append(True)
+                time.sleep(0.01)
+                active.pop()
+
+        threads = [threading.Thread(target=worker) for _ in range(5)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(overlaps, [])
+
+    def test_different_keys_run_concurrently(self):
+        """Holding one key must not block a different key."""
+        with self.locks.hold(("scooter", "1")):
+            acquired = threading.Event()
+
+            def worker():
+                with self.locks.hold(("scooter", "2")):
+                    acquired.set()
+
+            t = threading.Thread(target=worker)
+            t.start()
+            self.assertTrue(acquired.wait(1))
+            t.join()
+
+    def test_reentrant_and_released(self):
+        """The same thread can nest a key, and nothing is kept once every holder is done."""
+        with self.locks.hold(("booking", "1"), ("scooter", "2")):
+            with self.locks.hold(("scooter", "2")):
+                pass
+
+        self.assertEqual(self.locks._locks, {})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+import unittest
+from utils.rate_limiter import RateLimiter, ConnectionLimiter
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestRateLimiter(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.limiter = RateLimiter({"low": {"rate": 1, "burst": 2}}, clock=self.clock)
+
+    def test_burst_then_reject(self):
+        self.assertTrue(self.limiter.allow("10.0.0.5", "low"))
+        self.assertTrue(self.limiter.allow("10.0.0.5", "low"))
+        self.assertFalse(self.limiter.allow("10.0.0.5", "low"))
+        self.assertEqual(self.limiter.snapshot()["rejected"], {"low": 1})
+
+    def test_refills_over_time(self):
+        self.limiter.allow("10.0.0.5", "low", cost=2)
+        self.clock.now = 1.0
+
+        self.assertTrue(self.limiter.allow("10.0.0.5", "low"))
+        self.assertFalse(self.limiter.allow("10.0.0.5", "low"))
+
+    def test_clients_and_classes_are_independent(self):
+        """One client using up its allowance doesn't limit other clients, or classes without a limit."""
+        self.limiter.allow("10.0.0.5", "low", cost=2)
+
+        self.assertTrue(self.limiter.allow("10.0.0.6", "low"))
+        self.assertTrue(self.limiter.allow("10.0.0.5", "high"))
+
+    def test_cost_above_burst_runs_from_full_bucket(self):
+        self.assertTrue(self.limiter.allow("10.0.0.5", "low", cost=5))
+        self.assertFalse(self.limiter.allow("10.0.0.5", "low"))
+
+
+class TestConnectionLimiter(unittest.TestCase):
+
+    def test_per_client_cap(self):
+        limiter = ConnectionLimiter(max_connections=10, max_per_client=1)
+
+        self.assertTrue(limiter.acquire("10.0.0.5"))
+        self.assertFalse(limiter.acquire("10.0.0.5"))
+        self.assertTrue(limiter.acquire("10.0.0.6"))
+        limiter.release("10.0.0.5")
+        self.assertTrue(limiter.acquire("10.0.0.5"))
+        self.assertEqual(limiter.snapshot()["rejected"], 1)
+
+    def test_total_cap(self):
+        limiter = ConnectionLimiter(max_connections=1, max_per_client=1)
+
+        self.assertTrue(limiter.acquire("10.0.0.5"))
+        self.assertFalse(limiter.acquire("10.0.0.6"))
+        self.assertEqual(limiter.snapshot()["open"], 1)
+
+if __name__ == '__main__':
+    unittest.main()
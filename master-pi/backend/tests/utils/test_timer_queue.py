@@ -0,0 +1,59 @@
+import unittest
+from utils.timer_queue import TimerQueue
+
+
+class TestTimerQueue(unittest.TestCase):
+
+    def setUp(self):
+        self.now = 100.0
+        self.queue = TimerQueue(clock=lambda: self.now)
+        self.fired = []
+
+    def test_fires_due_timers_in_order(self):
+        self.queue.schedule("b", 120, lambda: self.fired.append("b"))
+        self.queue.schedule("a", 110, lambda: self.fired.append("a"))
+        self.queue.schedule("c", 130, lambda: self.fired.append("c"))
+
+        self.assertEqual(self.queue.run_due(), 0)
+        self.now = 125
+        self.assertEqual(self.queue.run_due(), 2)
+
+        self.assertEqual(self.fired, ["a", "b"])
+        self.assertEqual(len(self.queue), 1)
+
+    def test_past_timer_fires_straight_away(self):
+        self.queue.schedule("late", 50, lambda: self.fired.append("late"))
+
+        self.assertEqual(self.queue.run_due(), 1)
+
+    def test_rescheduling_replaces_timer(self):
+        self.queue.schedule("a", 110, lambda: self.fired.append("first"))
+        self.queue.schedule("a", 150, lambda: self.fired.append("second"))
+
+        self.now = 120
+        self.assertEqual(self.queue.run_due(), 0)
+        self.assertEqual(self.queue.due("a"), 150)
+        self.now = 150
+        self.queue.run_due()
+
+        self.assertEqual(self.fired, ["second"])
+
+    def test_cancel(self):
+        self.queue.schedule("a", 110, lambda: self.fired.append("a"))
+
+        self.assertTrue(self.queue.cancel("a"))
+        self.assertFalse(self.queue.cancel("a"))
+        self.now = 200
+        self.assertEqual(self.queue.run_due(), 0)
+        self.assertIsNone(self.queue.due("a"))
+
+    def test_failing_callback_does_not_stop_others(self):
+        self.queue.schedule("bad", 90, lambda: 1 / 0)
+        self.queue.schedule("good", 95, lambda: self.fired.append("good"))
+
+        self.assertEqual(self.queue.run_due(), 2)
+        self.assertEqual(self.fired, ["good"])
+
+
+if __name__ == '__main__':
+    unittest.main()
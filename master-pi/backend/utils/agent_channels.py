@@ -0,0 +1,148 @@
+import threading
+import time
+
+from scooter_protocol import PipelinedConnection
+
+# Command the agents answer straight away, sent on channels that have been idle to check they are still open
+PING = "PING"
+
+# Seconds to wait before reconnecting to an agent after a failure, doubled after each further failure up to the
+# maximum, so an agent that has dropped off the network isn't hammered with connection attempts
+RECONNECT_DELAY = 1
+MAX_RECONNECT_DELAY = 60
+
+
+class AgentChannels:
+    """
+    One persistent connection (channel) to each Agent Pi, reused for every request sent to it.
+
+    Channels are opened on first use and kept open, so a push costs a frame on an open connection rather than a
+    TCP handshake and HELLO. Each channel's health is tracked: once a request to an agent fails, requests to it
+    fail straight away until its reconnect delay has passed, and the delay doubles with each further failure, so
+    an unreachable agent neither holds up its callers nor causes a storm of reconnects after a network blip.
+    Channels that have been idle for `keepalive` seconds are pinged, so a dead connection is found and dropped
+    before a real request needs it.
+    """
+
+    def __init__(self, port, timeout, keepalive=30, clock=time.monotonic, connect=PipelinedConnection):
+        """
+        :param port: The port the agents listen on.
+        :param timeout: Seconds to wait for an agent to connect or answer.
+        :param keepalive: Seconds a channel may be idle before it is pinged.
+        :param clock: Function returning the current time in seconds, replaceable in tests.
+        :param connect: Called with an agent's (ip, port) and timeout to create its channel.
+        """
+        self.port = port
+        self.timeout = timeout
+        self.keepalive = keepalive
+        self.clock = clock
+        self.connect = connect
+        self._lock = threading.Lock()
+        self._channels = {}   # ip -> PipelinedConnection
+        self._health = {}     # ip -> {"failures", "retry_at", "last_used", "last_ok", "last_error"}
+        self._scooters = {}   # scooter ID -> ip
+
+    def request(self, ip, command, payload):
+        """
+        Send a request to an agent over its channel and wait for the response.
+
+        :return: The agent's response payload.
+        :raises ConnectionError: If the channel fails, or the agent failed recently and isn't due a reconnect.
+        :raises TimeoutError: If the agent doesn't answer within the timeout (or the current deadline).
+        """
+        with self._lock:
+            health = self._health.setdefault(ip, {"failures": 0, "retry_at": 0, "last_used": None,
+                                                   "last_ok": None, "last_error": None})
+            if health["failures"] and self.clock() < health["retry_at"]:
+                raise ConnectionError(f"Agent Pi at {ip} is unreachable, not retrying for "
+                                      f"{health['retry_at'] - self.clock():.1f}s.")
+            channel = self._channels.get(ip)
+            if channel is None:
+                channel = self._channels[ip] = self.connect((ip, self.port), timeout=self.timeout)
+            health["last_used"] = self.clock()
+
+        try:
+            response = channel.request(command, payload)
+        except (ConnectionError, TimeoutError) as e:
+            self._failed(ip, channel, e)
+            raise
+
+        with self._lock:
+            health["failures"] = 0
+            health["last_ok"] = self.clock()
+        return response
+
+    def assign(self, scooter_id, ip):
+        """
+        Record a scooter's IP address, closing the channel to its old address if it has moved.
+
+        :param scooter_id: The scooter.
+        :param ip: Its current IP address.
+        """
+        with self._lock:
+            old = self._scooters.get(scooter_id)
+            self._scooters[scooter_id] = ip
+            if old is None or old == ip or old in self._scooters.values():
+                return
+            channel = self._channels.pop(old, None)
+            self._health.pop(old, None)
+        if channel is not None:
+            channel.close()
+
+    def ping_idle(self):
+        """
+        Ping every healthy channel that has been idle for at least `keepalive` seconds.
+
+        :return: The number of channels pinged.
+        """
+        now = self.clock()
+        with self._lock:
+            idle = [ip for ip, health in self._health.items()
+                    if ip in self._channels and not health["failures"]
+                    and health["last_used"] is not None and now - health["last_used"] >= self.keepalive]
+        for ip in idle:
+            try:
+                self.request(ip, PING, {})
+            except (ConnectionError, TimeoutError) as e:
+                print(f"Agent Pi at {ip} didn't answer its keepalive: {e}")
+        return len(idle)
+
+    def start(self):
+        """Ping idle channels every `keepalive` seconds on a daemon thread."""
+        def run():
+            while True:
+                time.sleep(self.keepalive)
+                self.ping_idle()
+
+        thread = threading.Thread(target=run, name="agent-keepalive", daemon=True)
+        thread.start()
+        return thread
+
+    def _failed(self, ip, channel, error):
+        """Close a failed channel and push back the agent's next reconnect."""
+        with self._lock:
+            if self._channels.get(ip) is channel:
+                del self._channels[ip]
+            health = self._health[ip]
+            health["failures"] += 1
+            health["last_error"] = str(error)
+            delay = min(RECONNECT_DELAY * 2 ** (health["failures"] - 1), MAX_RECONNECT_DELAY)
+            health["retry_at"] = self.clock() + delay
+        channel.close()
+
+    def snapshot(self):
+        """Return how many channels are open and, for each agent, whether it is reachable and when it last answered."""
+        now = self.clock()
+        with self._lock:
+            agents = {ip: {"open": ip in self._channels, "failures": health["failures"],
+                           "seconds_since_ok": None if health["last_ok"] is None else round(now - health["last_ok"], 1),
+                           "last_error": health["last_error"]}
+                      for ip, health in self._health.items()}
+            return {"open": len(self._channels), "agents": agents}
+
+    def close(self):
+        """Close every channel."""
+        with self._lock:
+            channels, self._channels = list(self._channels.values()), {}
+        for channel in channels:
+            channel.close()
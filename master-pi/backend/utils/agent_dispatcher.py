@@ -0,0 +1,137 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
+
+class AgentDispatcher:
+    """
+    Sends requests to Agent Pis in the background, many agents at once.
+
+    Each agent has its own queue, drained in order by one worker at a time, so an agent's requests can't overtake
+    each other (e.g. an older USS arriving after a newer one), while different agents are sent to in parallel on
+    up to `workers` threads. A request that fails is retried up to `retries` times, waiting `backoff` seconds
+    before the first retry and twice as long before each one after. Pushing to a whole fleet therefore takes
+    about one agent's timeout (times its retries) rather than one timeout per unreachable agent.
+    """
+
+    def __init__(self, send, workers, retries=2, backoff=0.5):
+        """
+        :param send: send(ip, command, payload) sends one request and returns the agent's response, or None if it
+            failed. It is expected to give up within its own timeout.
+        :param workers: The most agents sent to at once.
+        :param retries: The number of times a failed request is retried.
+        :param backoff: Seconds to wait before the first retry, doubled before each one after.
+        """
+        self.send = send
+        self.workers = workers
+        self.retries = retries
+        self.backoff = backoff
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="agent-push")
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        self._queues = {}     # ip -> deque of (command, payload, Future), present while the agent is being sent to
+
+    def push(self, ip, command, payload):
+        """
+        Queue a request to an agent without waiting for it.
+
+        :return: A Future resolving to the agent's response, or None if every attempt failed.
+        """
+        future = Future()
+        with self._lock:
+            queue = self._queues.get(ip)
+            if queue is None:
+                queue = self._queues[ip] = deque()
+                self._executor.submit(self._drain, ip)
+            queue.append((command, payload, future))
+        return future
+
+    def push_all(self, ips, command, payload):
+        """
+        Queue the same request to many agents without waiting for them.
+
+        :return: A Future resolving, once every agent has answered or given up, to
+            {"sent": [ip, ...], "failed": [ip, ...], "responses": {ip: response}}.
+        """
+        ips = list(dict.fromkeys(ips))
+        results = Future()
+        responses = {}
+        remaining = [len(ips)]
+        if not ips:
+            results.set_result({"sent": [], "failed": [], "responses": {}})
+            return results
+
+        def done(ip, future):
+            with self._lock:
+                responses[ip] = future.result()
+                remaining[0] -= 1
+                finished = remaining[0] == 0
+            if finished:
+                results.set_result({
+                    "sent": [ip for ip in ips if responses[ip] is not None],
+                    "failed": [ip for ip in ips if responses[ip] is None],
+                    "responses": responses,
+                })
+
+        for ip in ips:
+            self.push(ip, command, payload).add_done_callback(lambda future, ip=ip: done(ip, future))
+        return results
+
+    def join(self, timeout=None):
+        """
+        Wait until every queued request has been sent or given up on.
+
+        :return: True if they all were, False if the timeout ran out first.
+        """
+        with self._idle:
+            return self._idle.wait_for(lambda: not self._queues, timeout)
+
+    def _drain(self, ip):
+        """Send an agent's queued requests in order until its queue is empty."""
+        while True:
+            with self._lock:
+                queue = self._queues[ip]
+                if not queue:
+                    del self._queues[ip]
+                    self._idle.notify_all()
+                    return
+                command, payload, future = queue.popleft()
+
+            response = self._send_with_retries(ip, command, payload)
+            future.set_result(response)
+
+    def _send_with_retries(self, ip, command, payload):
+        delay = self.backoff
+        for attempt in range(self.retries + 1):
+            if attempt:
+                with self._lock:
+                    self.retried += 1
+                time.sleep(delay)
+                delay *= 2
+            try:
+                response = self.send(ip, command, payload)
+            except Exception as e:
+                print(f"Error sending {command} to Agent Pi at {ip}: {e}")
+                response = None
+            if response is not None:
+                with self._lock:
+                    self.sent += 1
+                return response
+
+        with self._lock:
+            self.failed += 1
+        print(f"Giving up sending {command} to Agent Pi at {ip} after {self.retries + 1} attempts.")
+        return None
+
+    def snapshot(self):
+        """Return how many requests were sent, failed and retried, and how many agents are being sent to."""
+        with self._lock:
+            return {"sent": self.sent, "failed": self.failed, "retried": self.retried,
+                    "agents_busy": len(self._queues), "workers": self.workers}
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
@@ -0,0 +1,171 @@
+import itertools
+import json
+import os
+import threading
+from datetime import datetime
+
+# Commands that set state on the agent, so only the latest one waiting to be sent matters
+COALESCED_COMMANDS = {"USS"}
+
+# The log is rewritten with only the waiting commands once it holds this many records, and more than twice as
+# many as there are commands waiting
+COMPACT_AFTER = 1000
+
+
+class AgentOutbox:
+    """
+    Commands waiting to be delivered to each scooter's Agent Pi, saved to a log file so they survive a restart.
+
+    A command stays in the outbox until its agent has answered it, so a push that fails (or is never attempted,
+    because the agent is known to be offline) is delivered the next time the agent is reachable instead of being
+    lost. Commands are delivered in the order they were queued. A command in COALESCED_COMMANDS replaces the one
+    of the same kind still waiting for that scooter, so an agent that was offline through several status changes
+    is only sent the latest status.
+
+    Each change is appended to the log as one line of JSON (a "put" of a new command, naming any it replaces, or
+    the "done" of a delivered one) and synced to disk, so saving costs the same however many commands are
+    waiting. Once most of the log's records are for commands that have gone, it is compacted: rewritten with a
+    "put" for each waiting command to a temporary file that replaces it.
+    """
+
+    def __init__(self, path):
+        """
+        :param path: The log file the outbox is saved to. Commands already saved there are loaded.
+        """
+        self.path = path
+        self.delivered = 0
+        self.coalesced = 0
+        self._records = 0       # Records in the log file
+        self._lock = threading.Lock()
+        self._queues = {}       # scooter ID -> [{"id", "command", "payload", "queued_at"}, ...] oldest first
+        self._sending = set()   # IDs of the entries being delivered
+        self._load()
+        self._ids = itertools.count(max((entry["id"] for queue in self._queues.values() for entry in queue),
+                                        default=0) + 1)
+
+    def put(self, scooter_id, command, payload):
+        """
+        Queue a command for a scooter's agent.
+
+        :return: The entry's ID.
+        """
+        entry = {"id": next(self._ids), "command": command, "payload": payload,
+                 "queued_at": datetime.now().isoformat()}
+        with self._lock:
+            queue = self._queues.setdefault(scooter_id, [])
+            superseded = []
+            if command in COALESCED_COMMANDS:
+                superseded = [old for old in queue if old["command"] == command and old["id"] not in self._sending]
+                for old in superseded:
+                    queue.remove(old)
+                self.coalesced += len(superseded)
+            queue.append(entry)
+            self._append({"op": "put", "scooter": scooter_id, "entry": entry,
+                          "replaces": [old["id"] for old in superseded]})
+        return entry["id"]
+
+    def take(self, scooter_id):
+        """
+        Get the scooter's commands that aren't already being delivered, oldest first, marking them as being
+        delivered. Each must be handed back to done() once its delivery has succeeded or failed.
+        """
+        with self._lock:
+            entries = [entry for entry in self._queues.get(scooter_id, []) if entry["id"] not in self._sending]
+            self._sending.update(entry["id"] for entry in entries)
+            return [dict(entry) for entry in entries]
+
+    def done(self, scooter_id, entry_id, delivered):
+        """
+        Finish delivering a command: remove it if the agent answered it, otherwise keep it to try again later.
+        """
+        with self._lock:
+            self._sending.discard(entry_id)
+            if not delivered:
+                return
+            queue = self._queues.get(scooter_id, [])
+            for entry in queue:
+                if entry["id"] == entry_id:
+                    queue.remove(entry)
+                    break
+            if not queue:
+                self._queues.pop(scooter_id, None)
+            self.delivered += 1
+            self._append({"op": "done", "scooter": scooter_id, "id": entry_id})
+
+    def scooters(self):
+        """Get the IDs of the scooters with commands waiting."""
+        with self._lock:
+            return list(self._queues)
+
+    def has_pending(self, scooter_id):
+        with self._lock:
+            return bool(self._queues.get(scooter_id))
+
+    def __len__(self):
+        with self._lock:
+            return sum(len(queue) for queue in self._queues.values())
+
+    def snapshot(self):
+        """Return how many commands are waiting (and for how many scooters), delivered and coalesced away."""
+        with self._lock:
+            return {"pending": sum(len(queue) for queue in self._queues.values()), "scooters": len(self._queues),
+                    "delivered": self.delivered, "coalesced": self.coalesced}
+
+    def _load(self):
+        """Rebuild the queues by replaying the log, skipping a record left unfinished by a crash."""
+        try:
+            with open(self.path, "r", encoding="utf-8") as file:
+                lines = file.readlines()
+        except FileNotFoundError:
+            return
+        except OSError as e:
+            print(f"Could not load the agent outbox from {self.path}, starting empty: {e}")
+            return
+        for line in lines:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                print(f"Skipping an unreadable record in the agent outbox {self.path}")
+                continue
+            self._records += 1
+            queue = self._queues.setdefault(record["scooter"], [])
+            if record["op"] == "put":
+                replaced = set(record["replaces"])
+                queue[:] = [entry for entry in queue if entry["id"] not in replaced]
+                queue.append(record["entry"])
+            else:
+                queue[:] = [entry for entry in queue if entry["id"] != record["id"]]
+            if not queue:
+                del self._queues[record["scooter"]]
+
+    def _append(self, record):
+        """Append a record to the log and sync it to disk, compacting the log if it is due. Must hold _lock."""
+        try:
+            with open(self.path, "a", encoding="utf-8") as file:
+                file.write(json.dumps(record) + "\n")
+                file.flush()
+                os.fsync(file.fileno())
+            self._records += 1
+        except OSError as e:
+            print(f"Could not save the agent outbox to {self.path}: {e}")
+            return
+        pending = sum(len(queue) for queue in self._queues.values())
+        if self._records >= COMPACT_AFTER and self._records > 2 * pending:
+            self._compact(pending)
+
+    def _compact(self, pending):
+        """Rewrite the log with only the waiting commands, replacing it once it is complete. Must hold _lock."""
+        temporary = f"{self.path}.tmp"
+        try:
+            with open(temporary, "w", encoding="utf-8") as file:
+                for scooter_id, queue in self._queues.items():
+                    for entry in queue:
+                        file.write(json.dumps({"op": "put", "scooter": scooter_id, "entry": entry,
+                                               "replaces": []}) + "\n")
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(temporary, self.path)
+        except OSError as e:
+            print(f"Could not compact the agent outbox {self.path}: {e}")
+            return
+        self._records = pending
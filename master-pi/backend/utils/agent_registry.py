@@ -0,0 +1,70 @@
+import threading
+import time
+
+
+class AgentRegistry:
+    """
+    The last heartbeat (HB) heard from each Agent Pi: when, from which IP address, and the status it reported.
+
+    An agent that hasn't sent a heartbeat for `dead_after` seconds is considered dead, so pushes to it can be
+    skipped instead of waiting out a timeout. Agents that have never sent a heartbeat are unknown rather than
+    dead, so agents that don't send heartbeats are still pushed to.
+    """
+
+    def __init__(self, dead_after, clock=time.monotonic):
+        """
+        :param dead_after: Seconds without a heartbeat after which an agent is considered dead.
+        :param clock: Function returning the current time in seconds, replaceable in tests.
+        """
+        self.dead_after = dead_after
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._agents = {}   # scooter ID -> {"ip", "status", "last_seen"}
+        self._by_ip = {}    # ip -> scooter ID
+
+    def beat(self, scooter_id, ip, status):
+        """
+        Record a heartbeat.
+
+        :param scooter_id: The scooter the agent runs on.
+        :param ip: The IP address it sent the heartbeat from.
+        :param status: The status it reported.
+        :return: True if the scooter is new to the registry or its IP address has changed.
+        """
+        with self._lock:
+            agent = self._agents.get(scooter_id)
+            moved = agent is None or agent["ip"] != ip
+            if agent is not None and moved and self._by_ip.get(agent["ip"]) == scooter_id:
+                del self._by_ip[agent["ip"]]
+            self._agents[scooter_id] = {"ip": ip, "status": status, "last_seen": self.clock()}
+            self._by_ip[ip] = scooter_id
+            return moved
+
+    def knows(self, ip):
+        """Whether an Agent Pi is sending heartbeats from an IP address, dead or alive."""
+        with self._lock:
+            return ip in self._by_ip
+
+    def is_dead(self, ip):
+        """Whether the agent at an IP address has sent heartbeats before but none for `dead_after` seconds."""
+        with self._lock:
+            scooter_id = self._by_ip.get(ip)
+            if scooter_id is None:
+                return False
+            return self.clock() - self._agents[scooter_id]["last_seen"] > self.dead_after
+
+    def alive(self):
+        """Get the IDs of the scooters whose agents have sent a heartbeat within `dead_after` seconds."""
+        now = self.clock()
+        with self._lock:
+            return [scooter_id for scooter_id, agent in self._agents.items()
+                    if now - agent["last_seen"] <= self.dead_after]
+
+    def snapshot(self):
+        """Return, for each scooter that has sent a heartbeat, its IP, reported status and how long ago it was seen."""
+        now = self.clock()
+        with self._lock:
+            return {scooter_id: {"ip": agent["ip"], "status": agent["status"],
+                                 "seconds_since_seen": round(now - agent["last_seen"], 1),
+                                 "alive": now - agent["last_seen"] <= self.dead_after}
+                    for scooter_id, agent in self._agents.items()}
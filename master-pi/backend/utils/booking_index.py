@@ -0,0 +1,146 @@
+import bisect
+import threading
+from collections import namedtuple
+
+# An Active booking with its times already parsed. Ordered by start time, so each scooter's list stays sorted.
+IndexedBooking = namedtuple("IndexedBooking", ["start", "end", "booking_id", "scooter_id"])
+
+
+class BookingIndex:
+    """
+    Active bookings grouped by scooter, each scooter's ordered by start time, with their times parsed once.
+
+    refresh is given the current Active bookings and only applies the difference: new or changed bookings are
+    parsed and inserted, bookings that are no longer Active are removed, and everything else is left as it is.
+    Bookings whose end has passed are dropped from the front of their scooter's list as they are skipped, so
+    looking up a scooter's next booking only ever looks at the bookings still to come.
+    """
+
+    def __init__(self, parse, on_insert=None, on_remove=None):
+        """
+        :param parse: Converts a booking's startDateTime/endDateTime string to an aware datetime, or None if it
+            can't be parsed.
+        :param on_insert: Called with each IndexedBooking added to the index (including changed ones), e.g. to
+            schedule its transitions. Called holding the index's lock, so it mustn't use the index.
+        :param on_remove: Called with each IndexedBooking removed from the index, likewise.
+        """
+        self.parse = parse
+        self.on_insert = on_insert
+        self.on_remove = on_remove
+        self._lock = threading.Lock()
+        self._bookings = {}     # booking ID -> (source fields, IndexedBooking)
+        self._by_scooter = {}   # scooter ID -> [IndexedBooking, ...] ordered by start
+
+    def refresh(self, active_bookings):
+        """
+        Bring the index up to date with the current Active bookings.
+
+        :param active_bookings: Every Active booking, as returned by the /booking/active endpoint.
+        :return: (added, removed), the number of bookings inserted (including changed ones) and removed.
+        """
+        current = {}
+        for booking in active_bookings:
+            if isinstance(booking, dict) and booking.get("bookingID") is not None:
+                current[booking["bookingID"]] = booking
+
+        added = removed = 0
+        with self._lock:
+            for booking_id in [booking_id for booking_id in self._bookings if booking_id not in current]:
+                self._remove(booking_id)
+                removed += 1
+
+            for booking in current.values():
+                added += self._apply(booking)
+        return added, removed
+
+    def apply(self, booking):
+        """
+        Apply a change to a single booking, e.g. one read from the database's change feed.
+
+        :param booking: The booking's bookingID, scooterID, startDateTime, endDateTime and status. Bookings that
+            aren't Active (any more) are removed.
+        :return: True if the index changed.
+        """
+        with self._lock:
+            if booking.get("status") != "Active":
+                if booking.get("bookingID") in self._bookings:
+                    self._remove(booking["bookingID"])
+                    return True
+                return False
+            return bool(self._apply(booking))
+
+    def discard(self, booking_id):
+        """Remove a booking, e.g. because it was deleted. Does nothing if it isn't indexed."""
+        with self._lock:
+            if booking_id in self._bookings:
+                self._remove(booking_id)
+
+    def _apply(self, booking):
+        """Insert an Active booking unless it is already indexed as it is. Must be called holding _lock.
+
+        :return: 1 if the booking was inserted, otherwise 0.
+        """
+        booking_id = booking["bookingID"]
+        source = (booking.get("scooterID"), booking.get("startDateTime"), booking.get("endDateTime"))
+        known = self._bookings.get(booking_id)
+        if known is not None:
+            if known[0] == source:
+                return 0
+            self._remove(booking_id)
+        self._insert(booking_id, source)
+        return 1
+
+    def next_booking(self, scooter_id, now):
+        """
+        Get the scooter's earliest Active booking that hasn't ended yet.
+
+        :param scooter_id: The scooter to look up.
+        :param now: The current time, as an aware datetime.
+        :return: The IndexedBooking, or None if the scooter has no bookings still to come.
+        """
+        with self._lock:
+            bookings = self._by_scooter.get(scooter_id)
+            while bookings and bookings[0].end <= now:
+                bookings.pop(0)
+            return bookings[0] if bookings else None
+
+    def scooters(self):
+        """Get the IDs of every scooter with an indexed booking."""
+        with self._lock:
+            return list(self._by_scooter)
+
+    def bookings_for(self, scooter_id):
+        """Get the scooter's indexed bookings that haven't been skipped as ended, ordered by start time."""
+        with self._lock:
+            return list(self._by_scooter.get(scooter_id, []))
+
+    def __len__(self):
+        with self._lock:
+            return len(self._bookings)
+
+    def _insert(self, booking_id, source):
+        """Parse a booking and add it to its scooter's list. Must be called holding _lock."""
+        scooter_id, start, end = source
+        start, end = self.parse(start), self.parse(end)
+        indexed = None
+        if scooter_id is not None and start is not None and end is not None:
+            indexed = IndexedBooking(start, end, booking_id, scooter_id)
+            bisect.insort(self._by_scooter.setdefault(scooter_id, []), indexed)
+            if self.on_insert is not None:
+                self.on_insert(indexed)
+        # Bookings that can't be parsed are still remembered, so they aren't parsed again on every refresh
+        self._bookings[booking_id] = (source, indexed)
+
+    def _remove(self, booking_id):
+        """Remove a booking from the index. Must be called holding _lock."""
+        _, indexed = self._bookings.pop(booking_id)
+        if indexed is None:
+            return
+        if self.on_remove is not None:
+            self.on_remove(indexed)
+        bookings = self._by_scooter.get(indexed.scooter_id, [])
+        position = bisect.bisect_left(bookings, indexed)
+        if position < len(bookings) and bookings[position] == indexed:
+            del bookings[position]
+        if not bookings:
+            self._by_scooter.pop(indexed.scooter_id, None)
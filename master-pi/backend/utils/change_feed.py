@@ -0,0 +1,107 @@
+import json
+import select
+import threading
+import time
+
+try:
+    import psycopg2
+    from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
+except ImportError:  # Without psycopg2 the backend falls back to polling the database API
+    psycopg2 = None
+
+# The channel the triggers in database_handler/resources/create_schema.sql notify on
+CHANNEL = "scooter_share_changes"
+
+# Seconds to wait for a notification before checking the connection is still alive
+KEEPALIVE_INTERVAL = 30
+
+# Seconds to wait before reconnecting after the connection fails, doubled after each failure up to the maximum
+RECONNECT_DELAY = 1
+MAX_RECONNECT_DELAY = 30
+
+
+class ChangeFeed:
+    """
+    Listens for the change notifications PostgreSQL sends when a scooter, booking or fault changes.
+
+    Each notification's JSON payload is passed to on_change as a dictionary with a "table" ("scooter", "booking"
+    or "fault"), an "op" ("INSERT", "UPDATE" or "DELETE") and the changed row's fields. Changes made while the
+    feed isn't connected are never sent, so on_resync is called every time it (re)connects, once it is
+    listening, to catch up by reading the current state.
+    """
+
+    def __init__(self, db_info_file, on_change, on_resync, channel=CHANNEL):
+        """
+        :param db_info_file: Path to the database connection info (host, database, user, password, port).
+        :param on_change: Called with each change, on the feed's thread.
+        :param on_resync: Called after each (re)connection, on the feed's thread.
+        :param channel: The channel to listen on.
+        """
+        self.db_info_file = db_info_file
+        self.on_change = on_change
+        self.on_resync = on_resync
+        self.channel = channel
+        self.connected = threading.Event()
+        self.received = 0
+
+    @staticmethod
+    def available():
+        """Whether psycopg2 is installed, which the feed needs."""
+        return psycopg2 is not None
+
+    def start(self):
+        """Start listening on a daemon thread, reconnecting whenever the connection fails."""
+        thread = threading.Thread(target=self.run_forever, name="change-feed", daemon=True)
+        thread.start()
+        return thread
+
+    def run_forever(self):
+        delay = RECONNECT_DELAY
+        while True:
+            try:
+                self.listen()
+            except Exception as e:
+                print(f"Change feed disconnected: {e}")
+            if self.connected.is_set():
+                delay = RECONNECT_DELAY  # It was working, so retry promptly
+            self.connected.clear()
+            time.sleep(delay)
+            delay = min(delay * 2, MAX_RECONNECT_DELAY)
+
+    def listen(self):
+        """Connect, resynchronise and handle notifications until the connection fails."""
+        with open(self.db_info_file, "r", encoding="utf-8") as file:
+            info = json.load(file)
+
+        connection = psycopg2.connect(host=info["host"], database=info["database"], user=info["user"],
+                                      password=info["password"], port=info["port"], connect_timeout=5)
+        try:
+            connection.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+            with connection.cursor() as cursor:
+                cursor.execute(f"LISTEN {self.channel};")
+                print(f"Listening for database changes on {self.channel}.")
+                self.connected.set()
+                self.on_resync()
+
+                while True:
+                    if select.select([connection], [], [], KEEPALIVE_INTERVAL) == ([], [], []):
+                        cursor.execute("SELECT 1;")  # Raises if the connection has silently died
+                        continue
+                    connection.poll()
+                    while connection.notifies:
+                        self.handle_notification(connection.notifies.pop(0).payload)
+        finally:
+            connection.close()
+
+    def handle_notification(self, payload):
+        """Decode one notification's payload and pass it to on_change."""
+        try:
+            change = json.loads(payload)
+        except ValueError:
+            print(f"Ignoring malformed change notification: {payload}")
+            return
+        self.received += 1
+        try:
+            self.on_change(change)
+        except Exception as e:
+            print(f"Error handling change notification {change}: {e}")
@@ -0,0 +1,153 @@
+import bisect
+import threading
+import time
+from collections import namedtuple
+
+# Priority lanes, from most to least important. Each lane has its own workers, so a command never waits behind
+# commands from a less important lane.
+HIGH = "high"      # Ride-critical commands sent by scooters, e.g. starting and ending a booking
+NORMAL = "normal"  # Everything else
+LOW = "low"        # Admin reporting that reads whole tables; turned away first when the server is overloaded
+LANES = (HIGH, NORMAL, LOW)
+
+Command = namedtuple("Command", ["code", "handler", "lane", "locked"])
+
+
+class CommandRegistry:
+    """
+    Maps socket command codes (e.g. "AB", "GAS") to the methods that handle them.
+
+    Handlers are registered with the register decorator and called as handler(instance, payload, api).
+    """
+
+    def __init__(self):
+        self._commands = {}
+
+    def register(self, code, lane=NORMAL, locked=False):
+        """
+        Register the decorated method as the handler for a command.
+
+        :param code: The command code sent by clients.
+        :param lane: The priority lane the command runs in (HIGH, NORMAL or LOW).
+        :param locked: Whether the command changes a booking or scooter, and so must hold their locks while it runs.
+        """
+        if lane not in LANES:
+            raise ValueError(f"Unknown lane: {lane}")
+
+        def decorator(handler):
+            if code in self._commands:
+                raise ValueError(f"Command {code} is already registered")
+            self._commands[code] = Command(code, handler, lane, locked)
+            return handler
+        return decorator
+
+    def get(self, code):
+        """Return the Command registered for a code, or None if there isn't one."""
+        return self._commands.get(code)
+
+    def lane(self, code):
+        """Return the lane a command runs in. Unknown commands run in the NORMAL lane."""
+        command = self._commands.get(code)
+        return command.lane if command is not None else NORMAL
+
+    def codes(self):
+        """Return every registered command code."""
+        return list(self._commands)
+
+
+# Upper bounds of the latency histogram buckets in milliseconds; anything slower falls in a final "inf" bucket
+LATENCY_BUCKETS_MS = [1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000]
+
+
+class _CommandStats:
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.total_ms = 0.0
+        self.buckets = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+
+
+class CommandStats:
+    """
+    Thread-safe per-command counters: how many times each command ran, how many of those failed, and a latency
+    histogram.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def record(self, code, elapsed, error=False):
+        """
+        Record one run of a command.
+
+        :param code: The command code.
+        :param elapsed: How long the command took, in seconds.
+        :param error: Whether the command failed.
+        """
+        elapsed_ms = elapsed * 1000
+        bucket = bisect.bisect_left(LATENCY_BUCKETS_MS, elapsed_ms)
+        with self._lock:
+            stats = self._stats.get(code)
+            if stats is None:
+                stats = self._stats[code] = _CommandStats()
+            stats.count += 1
+            stats.errors += int(error)
+            stats.total_ms += elapsed_ms
+            stats.buckets[bucket] += 1
+
+    def time_records(self, code, records, start):
+        """
+        Wrap a lazily produced iterable of records so a command is only recorded once they have all been produced.
+
+        :param code: The command code.
+        :param records: The iterable of records, e.g. from a StreamingResponse.
+        :param start: The time.perf_counter() value when the command started.
+        """
+        error = False
+        try:
+            yield from records
+        except Exception:
+            error = True
+            raise
+        finally:
+            self.record(code, time.perf_counter() - start, error)
+
+    def snapshot(self):
+        """
+        Return the current statistics for every command that has run.
+
+        :return: {code: {"count", "errors", "error_rate", "mean_ms", "p50_ms", "p95_ms", "p99_ms", "histogram"}}.
+            Percentiles are the upper bound of the histogram bucket they fall in.
+        """
+        with self._lock:
+            copies = {code: (stats.count, stats.errors, stats.total_ms, list(stats.buckets))
+                      for code, stats in self._stats.items()}
+
+        labels = [f"<={bound}ms" for bound in LATENCY_BUCKETS_MS] + ["inf"]
+        snapshot = {}
+        for code, (count, errors, total_ms, buckets) in copies.items():
+            snapshot[code] = {
+                "count": count,
+                "errors": errors,
+                "error_rate": round(errors / count, 4) if count else 0.0,
+                "mean_ms": round(total_ms / count, 3) if count else 0.0,
+                "p50_ms": _percentile(buckets, count, 0.50),
+                "p95_ms": _percentile(buckets, count, 0.95),
+                "p99_ms": _percentile(buckets, count, 0.99),
+                "histogram": dict(zip(labels, buckets)),
+            }
+        return snapshot
+
+
+def _percentile(buckets, count, fraction):
+    """The upper bound of the bucket holding the given fraction of runs, or None if it is the open-ended bucket."""
+    if not count:
+        return None
+    target = fraction * count
+    seen = 0
+    for bound, bucket_count in zip(LATENCY_BUCKETS_MS, buckets):
+        seen += bucket_count
+        if seen >= target:
+            return bound
+    return None
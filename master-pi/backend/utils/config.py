@@ -0,0 +1,75 @@
+import json
+import logging
+
+DEFAULT_CONFIG = {
+    # Pushes to Agent Pis (e.g. USS) run in the background, this many agents at once, each retried this many
+    # times after waiting "agent-push-backoff" seconds (doubled before each further retry)
+    "agent-push-workers": 16,
+    "agent-push-retries": 2,
+    "agent-push-backoff": 0.5,
+    # Seconds without a heartbeat (HB) after which an Agent Pi is considered dead and isn't pushed to
+    "agent-dead-after": 30,
+    # Where commands waiting to be delivered to unreachable Agent Pis are saved, relative to the master-pi directory
+    "agent-outbox-file": "backend/resources/agent_outbox.jsonl",
+    # Seconds a connection to an Agent Pi may sit idle before it is pinged to check it is still open
+    "agent-keepalive": 30,
+    # Booking timers hand their work (reserving scooters, completing elapsed bookings) to this many threads, so a
+    # slow database API call can't hold up the timers behind it
+    "transition-workers": 2,
+    "backend-workers": 8,
+    "backend-high-workers": 4,
+    "backend-low-workers": 2,
+    "backend-low-queue": 8,
+    "compress-threshold": 1024,
+    # Listen for scooter and booking changes from PostgreSQL instead of polling the database API
+    "change-feed": True,
+    # The database API. Requests wait up to "timeout" seconds when the command has no deadline, over at most
+    # "pool-size" kept-open connections, and are retried up to "retries" times after a connection error.
+    # Commands making independent calls (e.g. EB) run up to "concurrent-calls" of them at once across all commands
+    "database-api": {"url": "http://localhost:8080", "timeout": 10, "pool-size": 16, "retries": 2,
+                     "concurrent-calls": 16},
+    "database-info": "database_handler/resources/database_info.json",
+    # Multicast scooter status changes to every Agent Pi over UDP instead of sending each its own USS. The
+    # latest sequence number is re-sent every "announce-interval" seconds so agents notice datagrams they missed
+    "fleet-multicast": {"enabled": False, "group": "239.255.65.1", "port": 65002, "ttl": 1, "announce-interval": 5},
+    "idempotency-ttl": 600,
+    "idempotency-max-keys": 10000,
+    "max-connections": 256,
+    "max-connections-per-client": 16,
+    # Token-bucket rate limits per client IP address and priority lane: "rate" requests per second, in bursts of
+    # up to "burst" requests
+    "rate-limits": {
+        "high": {"rate": 50, "burst": 100},
+        "normal": {"rate": 50, "burst": 100},
+        "low": {"rate": 2, "burst": 10},
+    },
+    # Clients the rate limits don't apply to: the frontends, which send the requests of all their users from one
+    # IP address. "ips" lists them by address (the Master Pi's own frontend connects from 127.0.0.1); with
+    # "agents" on, the Agent Pis (whose frontends run alongside the console) are exempt once they send heartbeats
+    "rate-limit-exempt": {"ips": ["127.0.0.1"], "agents": True},
+}
+
+
+def load_config(config_file="resources.json"):
+    """
+    Load the backend settings from the given JSON file.
+
+    Any setting missing from the file (or the whole file, if it can't be read) falls back to DEFAULT_CONFIG. Settings
+    holding a dictionary are merged one level deep, so e.g. "rate-limits" may override only the "low" lane.
+
+    :param config_file: Path to the JSON settings file, relative to the working directory.
+    :return: A dictionary containing every key in DEFAULT_CONFIG.
+    """
+    config = dict(DEFAULT_CONFIG)
+    try:
+        with open(config_file, "r") as file:
+            loaded = json.load(file)
+    except (OSError, json.JSONDecodeError) as e:
+        logging.warning(f"Could not load {config_file}, using default settings. Error: {e}")
+        return config
+
+    for key, value in loaded.items():
+        if isinstance(config.get(key), dict) and isinstance(value, dict):
+            value = {**config[key], **value}
+        config[key] = value
+    return config
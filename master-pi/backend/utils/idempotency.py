@@ -0,0 +1,97 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+
+class IdempotencyStore:
+    """
+    Remembers the responses of requests sent with an idempotency key, so a retry gets the first response back
+    instead of running the command again.
+
+    A retry that arrives while the first attempt is still running waits for it and gets the same response.
+    Responses are forgotten `ttl` seconds after they were produced, or sooner once more than `max_keys` are held.
+    Requests that raise, or whose response `keep` rejects (e.g. an error), are forgotten straight away so they can
+    be retried for real.
+    """
+
+    def __init__(self, ttl, max_keys, clock=time.monotonic):
+        """
+        :param ttl: Seconds to keep a response after it was produced.
+        :param max_keys: The most responses to keep at once; the oldest are forgotten first.
+        :param clock: Function returning the current time in seconds, replaceable in tests.
+        """
+        self.ttl = ttl
+        self.max_keys = max_keys
+        self.clock = clock
+        self.replayed = 0
+        self._lock = threading.Lock()
+        self._running = {}            # key -> (fingerprint, Future)
+        self._done = OrderedDict()    # key -> (fingerprint, response, expiry), oldest first
+
+    def run(self, key, fingerprint, fn, keep=lambda response: True):
+        """
+        Run fn() once for a key, or return the response of the request that already used it.
+
+        :param key: The idempotency key sent by the client.
+        :param fingerprint: Identifies the request, e.g. its command and payload. Reusing a key for a different
+            request is answered with an error rather than the other request's response.
+        :param fn: Runs the request and returns its response.
+        :param keep: Called with the response; only responses it returns True for are kept for replay.
+        :return: The response.
+        """
+        with self._lock:
+            self._evict(self.clock())
+            if key in self._done:
+                stored_fingerprint, response, _ = self._done[key]
+                running = None
+            elif key in self._running:
+                stored_fingerprint, running = self._running[key]
+            else:
+                future = Future()
+                self._running[key] = (fingerprint, future)
+                stored_fingerprint = None
+
+            if stored_fingerprint is not None:
+                if stored_fingerprint != fingerprint:
+                    return {"error": "Idempotency key was already used for a different request"}
+                self.replayed += 1
+
+        if stored_fingerprint is not None:
+            return running.result() if running is not None else response
+
+        try:
+            response = fn()
+        except BaseException as e:
+            with self._lock:
+                del self._running[key]
+            future.set_exception(e)
+            raise
+
+        with self._lock:
+            del self._running[key]
+            if keep(response):
+                self._done[key] = (fingerprint, response, self.clock() + self.ttl)
+                while len(self._done) > self.max_keys:
+                    self._done.popitem(last=False)
+        future.set_result(response)
+        return response
+
+    def _evict(self, now):
+        """Forget responses whose TTL has passed. Must be called holding _lock."""
+        while self._done:
+            key, (_, _, expiry) = next(iter(self._done.items()))
+            if expiry > now:
+                break
+            del self._done[key]
+
+    def snapshot(self):
+        """Return how many keys are held and how many requests have been answered with a replayed response."""
+        with self._lock:
+            return {"keys": len(self._done), "running": len(self._running), "replayed": self.replayed, "ttl": self.ttl}
+
+
+def request_fingerprint(command, payload):
+    """Identify a request by its command and payload, independent of the order of the payload's keys."""
+    return json.dumps([command, payload], sort_keys=True, default=str)
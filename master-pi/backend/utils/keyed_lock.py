@@ -0,0 +1,55 @@
+import threading
+from contextlib import contextmanager
+
+
+class KeyedLock:
+    """
+    A set of re-entrant locks created on demand for arbitrary keys, e.g. ("booking", "12") or ("scooter", "3").
+
+    Locks are only kept while they are held or waited on, so the registry does not grow with the number of
+    bookings or scooters ever seen.
+    """
+
+    def __init__(self):
+        self._guard = threading.Lock()
+        self._locks = {}
+
+    @contextmanager
+    def hold(self, *keys):
+        """
+        Hold the locks for all of the given keys for the duration of the with block.
+
+        Keys are always acquired in sorted order so two callers locking overlapping keys can't deadlock.
+
+        :param keys: Hashable, mutually comparable keys to lock.
+        """
+        ordered = sorted(set(keys))
+        locks = [self._checkout(key) for key in ordered]
+        acquired = 0
+        try:
+            for lock in locks:
+                lock.acquire()
+                acquired += 1
+            yield
+        finally:
+            for lock in reversed(locks[:acquired]):
+                lock.release()
+            for key in ordered:
+                self._checkin(key)
+
+    def _checkout(self, key):
+        with self._guard:
+            entry = self._locks.get(key)
+            if entry is None:
+                entry = self._locks[key] = [threading.RLock(), 0]
+            entry[1] += 1
+            return entry[0]
+
+    def _checkin(self, key):
+        with self._guard:
+            entry = self._locks.get(key)
+            if entry is None:
+                return
+            entry[1] -= 1
+            if entry[1] <= 0:
+                del self._locks[key]
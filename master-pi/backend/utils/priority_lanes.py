@@ -0,0 +1,81 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from scooter_protocol import ServerBusy
+
+
+class LaneExecutor:
+    """
+    A worker pool for one priority lane.
+
+    If the lane has a capacity, at most that many of its commands may be queued or running at once; submitting
+    another raises ServerBusy straight away instead of letting the backlog (and every client's wait) grow.
+    """
+
+    def __init__(self, name, workers, capacity=None):
+        """
+        :param name: The name of the lane, used for its thread names and error messages.
+        :param workers: The number of worker threads in the lane.
+        :param capacity: The most commands that may be queued or running at once, or None for no limit.
+        """
+        self.name = name
+        self.capacity = capacity
+        self.shed = 0
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"socket-{name}")
+        self._slots = threading.BoundedSemaphore(capacity) if capacity is not None else None
+        self._shed_lock = threading.Lock()
+
+    def submit(self, fn, *args):
+        """
+        Run fn(*args) on one of the lane's workers.
+
+        :raises ServerBusy: If the lane is already holding as many commands as its capacity allows.
+        """
+        if self._slots is None:
+            return self._executor.submit(fn, *args)
+
+        if not self._slots.acquire(blocking=False):
+            with self._shed_lock:
+                self.shed += 1
+            raise ServerBusy(f"Server is busy, {self.name} priority requests are being turned away. Try again shortly.")
+
+        def run():
+            try:
+                return fn(*args)
+            finally:
+                self._slots.release()
+
+        try:
+            return self._executor.submit(run)
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
+
+
+class PriorityLanes:
+    """One LaneExecutor per priority lane, chosen by name."""
+
+    def __init__(self, lanes):
+        """
+        :param lanes: A dictionary mapping each lane name to its LaneExecutor.
+        """
+        self.lanes = lanes
+
+    def executor(self, lane):
+        """Return the executor for a lane."""
+        return self.lanes[lane]
+
+    def snapshot(self):
+        """Return how each lane is configured and how many commands it has turned away."""
+        return {name: {"capacity": lane.capacity, "shed": lane.shed} for name, lane in self.lanes.items()}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        for lane in self.lanes.values():
+            lane.shutdown()
+        return False
@@ -0,0 +1,148 @@
+import threading
+import time
+from collections import defaultdict
+
+
+class TokenBucket:
+    """
+    A token bucket holding up to `burst` tokens, refilled at `rate` tokens per second.
+
+    Not thread-safe on its own; RateLimiter serialises access to its buckets.
+    """
+
+    def __init__(self, rate, burst, now):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = now
+
+    def take(self, cost, now):
+        """
+        Take `cost` tokens if the bucket has them.
+
+        :return: True if the tokens were taken, False if the caller is over its rate.
+        """
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens < cost:
+            return False
+        self.tokens -= cost
+        return True
+
+    def is_full(self, now):
+        """Whether the bucket would be full by now, i.e. forgetting it would change nothing."""
+        return self.tokens + (now - self.updated) * self.rate >= self.burst
+
+
+class RateLimiter:
+    """
+    Token-bucket rate limits per client and command class.
+
+    Each (client, class) pair gets its own bucket, so a scooter looping on one command can only use up its own
+    allowance for that class of command. Buckets that have refilled are forgotten, so memory doesn't grow with
+    the number of clients ever seen.
+    """
+
+    # How many checks to run between sweeps for buckets that can be forgotten
+    SWEEP_INTERVAL = 1000
+
+    def __init__(self, limits, clock=time.monotonic):
+        """
+        :param limits: {command class: {"rate": tokens per second, "burst": bucket size}}. Classes without an
+            entry are not limited.
+        :param clock: Function returning the current time in seconds, replaceable in tests.
+        """
+        self.limits = limits
+        self.clock = clock
+        self.rejected = defaultdict(int)
+        self._buckets = {}
+        self._lock = threading.Lock()
+        self._checks = 0
+
+    def allow(self, client, command_class, cost=1):
+        """
+        Check a request against the client's allowance for its command class, using it up if there is enough.
+
+        :param client: The client key, e.g. its IP address.
+        :param command_class: The class of command, e.g. its priority lane.
+        :param cost: The number of tokens the request uses, e.g. the number of commands in a batch.
+        :return: True if the request may run, False if it should be rejected.
+        """
+        limit = self.limits.get(command_class)
+        if limit is None:
+            return True
+
+        now = self.clock()
+        with self._lock:
+            key = (client, command_class)
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = TokenBucket(limit["rate"], limit["burst"], now)
+            # A request costing more than a full bucket can still run once the bucket is full
+            allowed = bucket.take(min(cost, bucket.burst), now)
+            if not allowed:
+                self.rejected[command_class] += 1
+
+            self._checks += 1
+            if self._checks % self.SWEEP_INTERVAL == 0:
+                self._buckets = {k: b for k, b in self._buckets.items() if not b.is_full(now)}
+        return allowed
+
+    def snapshot(self):
+        """Return the configured limits and how many requests each command class has rejected."""
+        with self._lock:
+            return {
+                "limits": self.limits,
+                "rejected": dict(self.rejected),
+                "tracked_clients": len({client for client, _ in self._buckets}),
+            }
+
+
+class ConnectionLimiter:
+    """Caps the number of connections open at once, both in total and from any one client."""
+
+    def __init__(self, max_connections, max_per_client):
+        """
+        :param max_connections: The most connections open at once across every client.
+        :param max_per_client: The most connections any one client may have open at once.
+        """
+        self.max_connections = max_connections
+        self.max_per_client = max_per_client
+        self.rejected = 0
+        self._open = defaultdict(int)
+        self._total = 0
+        self._lock = threading.Lock()
+
+    def acquire(self, client):
+        """
+        Count a new connection from a client, unless it would go over a cap.
+
+        :return: True if the connection may be served, False if it should be closed straight away.
+        """
+        with self._lock:
+            if self._total >= self.max_connections or self._open[client] >= self.max_per_client:
+                self.rejected += 1
+                if not self._open[client]:
+                    del self._open[client]
+                return False
+            self._open[client] += 1
+            self._total += 1
+            return True
+
+    def release(self, client):
+        """Stop counting a connection once it has closed."""
+        with self._lock:
+            self._open[client] -= 1
+            self._total -= 1
+            if self._open[client] <= 0:
+                del self._open[client]
+
+    def snapshot(self):
+        """Return the caps, how many connections are open and how many have been refused."""
+        with self._lock:
+            return {
+                "max_connections": self.max_connections,
+                "max_per_client": self.max_per_client,
+                "open": self._total,
+                "rejected": self.rejected,
+            }
@@ -0,0 +1,111 @@
+import heapq
+import itertools
+import threading
+import time
+
+# Longest the timer thread sleeps at once, so timers still fire on time if the system clock is changed
+MAX_WAIT = 60
+
+
+class TimerQueue:
+    """
+    Runs callbacks at given times, each identified by a key, on a single thread.
+
+    Timers are kept in a heap ordered by when they are due, so the thread only wakes when the earliest timer is
+    due (or a new timer is due sooner), and the work done is proportional to the number of timers scheduled and
+    fired rather than to everything they were scheduled for. Scheduling a key that already has a timer replaces
+    it; replaced and cancelled timers are dropped when they reach the front of the heap.
+    """
+
+    def __init__(self, clock=time.time):
+        """
+        :param clock: Function returning the current time in seconds since the epoch, replaceable in tests.
+        """
+        self.clock = clock
+        self.fired = 0
+        self._condition = threading.Condition()
+        self._heap = []       # [when, sequence, key, callback], callback None once replaced or cancelled
+        self._timers = {}     # key -> its live heap entry
+        self._sequence = itertools.count()
+
+    def schedule(self, key, when, callback):
+        """
+        Run callback() at a time, replacing any timer the key already has.
+
+        :param key: Identifies the timer, e.g. ("complete", booking_id).
+        :param when: Seconds since the epoch. A time that has already passed fires as soon as possible.
+        :param callback: Called with no arguments on the timer thread.
+        """
+        with self._condition:
+            self._cancel(key)
+            entry = [when, next(self._sequence), key, callback]
+            self._timers[key] = entry
+            heapq.heappush(self._heap, entry)
+            if self._heap[0] is entry:
+                self._condition.notify()  # Due sooner than the thread is waiting for
+
+    def cancel(self, key):
+        """
+        Cancel the key's timer.
+
+        :return: True if it had one that hadn't fired yet.
+        """
+        with self._condition:
+            return self._cancel(key)
+
+    def due(self, key):
+        """When the key's timer is due, or None if it has none."""
+        with self._condition:
+            entry = self._timers.get(key)
+            return entry[0] if entry is not None else None
+
+    def run_due(self):
+        """
+        Fire every timer that is due, in the order they are due.
+
+        :return: The number of timers fired.
+        """
+        now = self.clock()
+        callbacks = []
+        with self._condition:
+            while self._heap and self._heap[0][0] <= now:
+                _, _, key, callback = heapq.heappop(self._heap)
+                if callback is not None:
+                    del self._timers[key]
+                    callbacks.append((key, callback))
+
+        for key, callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                print(f"Error running timer {key}: {e}")
+        self.fired += len(callbacks)
+        return len(callbacks)
+
+    def start(self):
+        """Fire timers as they fall due on a daemon thread."""
+        thread = threading.Thread(target=self.run_forever, name="timer-queue", daemon=True)
+        thread.start()
+        return thread
+
+    def run_forever(self):
+        while True:
+            with self._condition:
+                while self._heap and self._heap[0][3] is None:
+                    heapq.heappop(self._heap)  # Drop replaced and cancelled timers rather than waking for them
+                wait = self._heap[0][0] - self.clock() if self._heap else MAX_WAIT
+                if wait > 0:
+                    self._condition.wait(min(wait, MAX_WAIT))
+            self.run_due()
+
+    def __len__(self):
+        with self._condition:
+            return len(self._timers)
+
+    def _cancel(self, key):
+        """Cancel the key's timer. Must be called holding _condition."""
+        entry = self._timers.pop(key, None)
+        if entry is None:
+            return False
+        entry[3] = None
+        return True
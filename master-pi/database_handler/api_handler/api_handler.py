@@ -4,12 +4,14 @@ from .booking_api_handler import BookingAPI
 from .transaction_api_handler import TransactionAPI
 from .scooter_api_handler import ScooterAPI
 from .faultlog_api_handler import FaultLogAPI
+from .deadline import register_deadline_handling
 
 
 class APIHandler:
     def __init__(self, db_info_file):
         self.app = Flask(__name__)
         self.db_info_file = db_info_file
+        register_deadline_handling(self.app)
         # Initialize handler classes with the same db_info_file
         self.user_handler = UserAPI(self.app, db_info_file)
         self.booking_handler = BookingAPI(self.app, db_info_file)
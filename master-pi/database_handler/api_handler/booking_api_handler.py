@@ -1,5 +1,7 @@
 from flask import request, jsonify
 from db_driver.booking_db_handler import BookingHandler
+from db_driver.base_db_handler import CHANGES_LIMIT
+from .streaming import ndjson_response
 
 class BookingAPI:
     def __init__(self, app, db_info_file):
@@ -15,11 +17,15 @@ class BookingAPI:
         app.add_url_rule('/booking/end_booking', 'end_booking', self.end_booking, methods=['PUT'])
         app.add_url_rule('/booking/get_bookings/<email>', 'get_bookings_for_customer', self.get_bookings_for_customer, methods=['GET'])
         app.add_url_rule('/booking/get_booked_scooters_times', 'get_booked_scooters_times', self.get_booked_scooters_times, methods=['GET'])
+        app.add_url_rule('/booking/get_booked_scooters_times/stream', 'stream_booked_scooters_times', self.stream_booked_scooters_times, methods=['GET'])
         app.add_url_rule('/booking/complete/<int:booking_id>', 'set_booking_complete', self.set_booking_complete, methods=['PUT'])
+        app.add_url_rule('/booking/complete_elapsed', 'complete_elapsed_bookings', self.complete_elapsed_bookings, methods=['PUT'])
         app.add_url_rule('/booking/update_cost/<int:booking_id>', 'update_booking_cost', self.update_booking_cost, methods=['PUT'])
         app.add_url_rule('/booking/active', 'get_all_active_bookings', self.get_all_active_bookings, methods=['GET'])
+        app.add_url_rule('/booking/changes', 'get_booking_changes', self.get_booking_changes, methods=['GET'])
         app.add_url_rule('/booking/<int:booking_id>/set_googleID', 'set_booking_googleID', self.set_booking_googleID, methods=['PUT'])
         app.add_url_rule('/booking/scooter/<int:scooter_id>', 'get_all_bookings_for_scooter', self.get_all_bookings_for_scooter, methods=['GET'])
+        app.add_url_rule('/booking/scooter/<int:scooter_id>/stream', 'stream_all_bookings_for_scooter', self.stream_all_bookings_for_scooter, methods=['GET'])
 
     def get_booking(self, booking_id):
         """
@@ -99,6 +105,15 @@ class BookingAPI:
         except Exception as e:
             return jsonify({"error": str(e)}), 400
         
+    def stream_booked_scooters_times(self):
+        """
+        API endpoint to stream every booking's scooter, time slot and status as newline-delimited JSON.
+
+        Returns:
+            Response: Streaming NDJSON response with one booking per line.
+        """
+        return ndjson_response(self.booking_handler.stream_all_booked_scooters_and_times())
+
     def set_booking_complete(self, booking_id):
         """
         API endpoint to set a booking's status to 'Complete'.
@@ -115,6 +130,40 @@ class BookingAPI:
         except Exception as e:
             return jsonify({"error": str(e)}), 400
         
+    def get_booking_changes(self):
+        """
+        API endpoint to retrieve the bookings added, changed or deleted since a cursor.
+
+        Query parameters:
+            since (int): The cursor returned by the previous call, 0 (the default) for every booking.
+            limit (int): The most changed (and the most deleted) bookings to return at once, 500 by default.
+
+        Returns:
+            Response: JSON response with the changed bookings, the IDs of the deleted ones, the new cursor and
+            whether there are more changes to read, or a 400 error.
+        """
+        try:
+            changes = self.booking_handler.get_bookings_changed_since(
+                cursor=request.args.get('since', 0, type=int),
+                limit=request.args.get('limit', CHANGES_LIMIT, type=int)
+            )
+            return jsonify(changes)
+        except Exception as e:
+            return jsonify({"error": str(e)}), 400
+
+    def complete_elapsed_bookings(self):
+        """
+        API endpoint to set every Active booking whose end has passed to 'Complete'.
+
+        Returns:
+            Response: JSON response with the bookingID and scooterID of each booking completed, or a 400 error.
+        """
+        try:
+            completed = self.booking_handler.complete_elapsed_bookings()
+            return jsonify({"completed_bookings": completed})
+        except Exception as e:
+            return jsonify({"error": str(e)}), 400
+
     def update_booking_cost(self, booking_id):
         """
         API endpoint to update the cost of a booking.
@@ -189,4 +238,16 @@ class BookingAPI:
             else:
                 return jsonify({"message": "No bookings found for this scooter."}), 404
         except Exception as e:
-            return jsonify({"error": str(e)}), 400
\ No newline at end of file
+            return jsonify({"error": str(e)}), 400
+
+    def stream_all_bookings_for_scooter(self, scooter_id):
+        """
+        API endpoint to stream all bookings for a specific scooter as newline-delimited JSON, newest first.
+
+        Args:
+            scooter_id (int): The ID of the scooter.
+
+        Returns:
+            Response: Streaming NDJSON response with one booking per line, empty if there are none.
+        """
+        return ndjson_response(self.booking_handler.stream_all_bookings_for_scooter(scooter_id))
@@ -0,0 +1,37 @@
+import psycopg2
+from flask import request, jsonify
+from db_driver.deadline import DeadlineExceeded, set_request_deadline
+
+# Header the backend sends with the time the request has left, in milliseconds
+DEADLINE_HEADER = "X-Deadline-Ms"
+
+
+def register_deadline_handling(app):
+    """
+    Make every request honour the deadline sent in its X-Deadline-Ms header.
+
+    The deadline is set for the request's thread, so DatabaseDriver limits its connection and queries to the time
+    left (see DatabaseDriver._get_connection). A request that runs out of time is answered with a 504.
+
+    Args:
+        app (Flask): The application to register the hooks on.
+    """
+    @app.before_request
+    def start_deadline():
+        header = request.headers.get(DEADLINE_HEADER)
+        try:
+            milliseconds = float(header) if header is not None else None
+        except ValueError:
+            milliseconds = None
+        set_request_deadline(milliseconds)
+        if milliseconds is not None and milliseconds <= 0:
+            return jsonify({"error": "Deadline exceeded before the request could run."}), 504
+
+    @app.teardown_request
+    def clear_deadline(exc):
+        set_request_deadline(None)
+
+    @app.errorhandler(DeadlineExceeded)
+    @app.errorhandler(psycopg2.errors.QueryCanceled)
+    def deadline_exceeded(e):
+        return jsonify({"error": f"Deadline exceeded: {e}"}), 504
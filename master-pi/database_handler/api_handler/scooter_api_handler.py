@@ -1,5 +1,6 @@
 from flask import request, jsonify
 from db_driver.scooter_db_handler import ScooterHandler
+from db_driver.base_db_handler import CHANGES_LIMIT
 
 class ScooterAPI:
     def __init__(self, app, db_info_file):
@@ -11,6 +12,7 @@ class ScooterAPI:
         app.add_url_rule('/scooter/<int:scooter_id>', 'get_scooter', self.get_scooter, methods=['GET'])
         app.add_url_rule('/scooter/update_scooter_status', 'update_scooter_status', self.update_scooter_status, methods=['PUT'])
         app.add_url_rule('/scooter/scooters', 'get_all_scooters', self.get_all_scooters, methods=['GET'])
+        app.add_url_rule('/scooter/changes', 'get_scooter_changes', self.get_scooter_changes, methods=['GET'])
         app.add_url_rule('/scooter/update_ip_address/<int:scooter_id>', 'update_scooter_ip_address', self.update_scooter_ip_address, methods=['PUT'])
         app.add_url_rule('/scooter/update_location/<int:scooter_id>', 'update_scooter_location', self.update_scooter_location, methods=['PUT'])
         app.add_url_rule('/scooter/update_details/<int:scooter_id>', 'update_scooter_details', self.update_scooter_details, methods=['PUT'])
@@ -49,6 +51,27 @@ class ScooterAPI:
         result = self.scooter_handler.get_all_scooters()
         return jsonify(result if result else [])
     
+    def get_scooter_changes(self):
+        """
+        API endpoint to retrieve the scooters added, changed or deleted since a cursor.
+
+        Query parameters:
+            since (int): The cursor returned by the previous call, 0 (the default) for every scooter.
+            limit (int): The most changed (and the most deleted) scooters to return at once, 500 by default.
+
+        Returns:
+            Response: JSON response with the changed scooters, the IDs of the deleted ones, the new cursor and
+            whether there are more changes to read, or a 400 error.
+        """
+        try:
+            changes = self.scooter_handler.get_scooters_changed_since(
+                cursor=request.args.get('since', 0, type=int),
+                limit=request.args.get('limit', CHANGES_LIMIT, type=int)
+            )
+            return jsonify(changes)
+        except Exception as e:
+            return jsonify({"error": str(e)}), 400
+
     def update_scooter_ip_address(self, scooter_id):
         """
         API endpoint to update the IP address for a scooter.
@@ -0,0 +1,24 @@
+from flask import Response, current_app, stream_with_context
+
+
+def ndjson_response(batches):
+    """
+    Stream records to the client as newline-delimited JSON, one record per line, as they are read.
+
+    Records are encoded exactly as jsonify would encode them. Because the status code has already been sent by
+    the time a later batch fails, an error part way through is reported as a final {"error": ...} line.
+
+    Args:
+        batches (iterable): Lists of records, e.g. from one of the db_driver stream_* methods.
+
+    Returns:
+        Response: A streaming application/x-ndjson response.
+    """
+    def generate():
+        try:
+            for batch in batches:
+                yield "".join(current_app.json.dumps(record) + "\n" for record in batch)
+        except Exception as e:
+            yield current_app.json.dumps({"error": str(e)}) + "\n"
+
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
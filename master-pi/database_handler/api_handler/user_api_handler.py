@@ -1,5 +1,6 @@
 from flask import request, jsonify
 from db_driver.user_db_handler import UserHandler
+from .streaming import ndjson_response
 
 class UserAPI:
     def __init__(self, app, db_info_file):
@@ -14,6 +15,7 @@ class UserAPI:
         app.add_url_rule('/user/delete/<email>', 'delete_customer', self.delete_customer, methods=['DELETE'])
         app.add_url_rule('/user/update_funds', 'update_customer_funds', self.update_customer_funds, methods=['PUT'])
         app.add_url_rule('/user/customers', 'get_all_customers', self.get_all_customers, methods=['GET'])
+        app.add_url_rule('/user/customers/stream', 'stream_all_customers', self.stream_all_customers, methods=['GET'])
         app.add_url_rule('/user/update_details/<email>', 'update_user_details', self.update_user_details, methods=['PUT'])
         app.add_url_rule('/user/engineers/emails', 'get_engineer_emails', self.get_engineer_emails, methods=['GET'])
 
@@ -85,6 +87,15 @@ class UserAPI:
         else:
             return jsonify({"message": "No customers found."}), 404
         
+    def stream_all_customers(self):
+        """
+        API endpoint to stream all customers' details as newline-delimited JSON, one customer per line.
+
+        Returns:
+            Response: Streaming NDJSON response, empty if there are no customers.
+        """
+        return ndjson_response(self.user_handler.stream_all_customers())
+
     def update_user_details(self, email):
         """
         API endpoint to update a user's details.
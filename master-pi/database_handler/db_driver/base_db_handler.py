@@ -1,8 +1,16 @@
 import logging
+import time
 import pytz
 from db_driver.database_driver import DatabaseDriver
 from datetime import datetime
 
+# Most changed rows (and, separately, deleted rows) returned by one call for changes since a cursor
+CHANGES_LIMIT = 500
+# Days a deleted row is kept in DeletedRow. A client whose cursor is older must read the whole table again
+DELETED_ROW_RETENTION_DAYS = 7
+# Seconds between prunes of DeletedRow, which run from the reads of changes
+PRUNE_INTERVAL = 3600
+
 class BaseHandler:
     def __init__(self, db_info):
         """
@@ -10,6 +18,7 @@ class BaseHandler:
         """
         self._db_info = db_info
         self._db_driver = DatabaseDriver(db_info)
+        self._pruned_at = None
         self._setup_logging()
 
     def _setup_logging(self):
@@ -31,4 +40,99 @@ class BaseHandler:
             dt = aest_tz.localize(dt)  # Localize to AEST
         else:  # If timezone-aware datetime
             dt = dt.astimezone(aest_tz)  # Convert to AEST
-        return dt
\ No newline at end of file
+        return dt
+
+    def _changes_since(self, table, columns, cursor, limit=CHANGES_LIMIT):
+        """
+        Retrieve the rows of a table inserted, updated or deleted since a cursor, in the order they changed.
+
+        Every inserted or updated row is stamped with the ID of the transaction that wrote it (changeXid) and a
+        number from the change_seq sequence (changeSeq), and every deleted row is recorded in DeletedRow the same
+        way (see create_schema.sql). Writers don't wait for each other, so they may commit out of order; instead
+        only the changes of transactions below the snapshot's xmin, all of which have finished, are returned.
+        The cursor is the transaction up to which the client has every change, so passing back the cursor
+        returned by the previous call gets only what changed in between, including what was still being written
+        then. The changed and deleted rows are read from one snapshot, so neither can move the cursor past a
+        change the other hasn't seen.
+
+        Args:
+            table (str): The table, "Scooter" or "Booking".
+            columns (list): The columns to return for each changed row.
+            cursor (int): The cursor returned by the previous call, or 0 for every row.
+            limit (int): The most changed rows, and the most deleted rows, to return at once. The last
+                transaction returned is always returned whole, so a call may return more.
+
+        Returns:
+            dict: {"rows": [...], "deleted": [ID, ...], "cursor": int, "more": bool, "resync": bool}. If "more" is
+            True there are further changes, to be read by calling again with the new cursor. If "resync" is True
+            the cursor is older than the deletions kept (see _prune_deleted_rows), so nothing else is returned and
+            the client must read the whole table again, with cursor 0.
+        """
+        if self._pruned_at is None or time.monotonic() - self._pruned_at >= PRUNE_INTERVAL:
+            self._prune_deleted_rows()
+            self._pruned_at = time.monotonic()
+
+        changed_query = f"SELECT {', '.join(columns)}, changeXid FROM {table} WHERE "
+        deleted_query = "SELECT rowID, changeXid FROM DeletedRow WHERE tableName = %s AND "
+        with self._db_driver.read_snapshot() as select:
+            # Every transaction below xmin has committed or rolled back, so its changes are final
+            horizon, pruned_xid = select(
+                "SELECT pg_snapshot_xmin(pg_current_snapshot())::text::bigint, "
+                "(SELECT prunedXid FROM ChangeRetention WHERE tableName = %s)", (table,))[0]
+            if cursor and pruned_xid is not None and cursor < pruned_xid:
+                self.logger.info(f"Cursor {cursor} for {table} is older than the deletions kept, a resync is required.")
+                return {"rows": [], "deleted": [], "cursor": 0, "more": False, "resync": True}
+
+            window = "changeXid > %s AND changeXid < %s ORDER BY changeXid, changeSeq LIMIT %s"
+            rows = select(changed_query + window, (cursor, horizon, limit))
+            deleted = select(deleted_query + window, (table, cursor, horizon, limit))
+
+            # A list cut short by the limit may be missing changes of transactions below the other's last one, so
+            # only the transactions before the lower of the two are returned this time, then that one in full
+            ends = []
+            if len(rows) == limit:
+                ends.append(rows[-1][-1])
+            if len(deleted) == limit:
+                ends.append(deleted[-1][-1])
+            if ends:
+                end = min(ends)
+                rows = [row for row in rows if row[-1] < end]
+                deleted = [row for row in deleted if row[-1] < end]
+                rows += select(changed_query + "changeXid = %s ORDER BY changeSeq", (end,))
+                deleted += select(deleted_query + "changeXid = %s ORDER BY changeSeq", (table, end))
+
+        rows = [dict(zip(columns, row)) for row in rows]
+        self.logger.info(f"{len(rows)} rows changed and {len(deleted)} deleted in {table} since {cursor}.")
+        return {"rows": rows, "deleted": [row_id for row_id, _ in deleted],
+                "cursor": min(ends) if ends else max(cursor, horizon - 1), "more": bool(ends), "resync": False}
+
+    def _prune_deleted_rows(self, retention_days=DELETED_ROW_RETENTION_DAYS):
+        """
+        Delete the rows of DeletedRow older than the retention window, so it doesn't grow without bound.
+
+        Each table's rows are pruned up to the last transaction that deleted one of them before the window, and
+        that transaction is recorded in ChangeRetention. Every deletion by a later transaction is kept, so a
+        cursor at or above it still gets every deletion since, and one below it is told to resync.
+
+        Args:
+            retention_days (int): Days a deleted row is kept.
+
+        Returns:
+            list: (tableName, prunedXid) for each table pruned.
+        """
+        pruned = self._db_driver.execute_returning(
+            """
+            WITH cutoff AS (
+                SELECT tableName, max(changeXid) AS prunedXid FROM DeletedRow
+                WHERE deletedAt < now() - make_interval(days => %s) GROUP BY tableName
+            ), pruned AS (
+                DELETE FROM DeletedRow USING cutoff
+                WHERE DeletedRow.tableName = cutoff.tableName AND DeletedRow.changeXid <= cutoff.prunedXid
+            )
+            INSERT INTO ChangeRetention (tableName, prunedXid) SELECT tableName, prunedXid FROM cutoff
+            ON CONFLICT (tableName) DO UPDATE SET prunedXid = GREATEST(ChangeRetention.prunedXid, EXCLUDED.prunedXid)
+            RETURNING tableName, prunedXid
+            """, (retention_days,))
+        for table, pruned_xid in pruned:
+            self.logger.info(f"Pruned deleted {table} rows up to transaction {pruned_xid}.")
+        return pruned
@@ -1,4 +1,4 @@
-from .base_db_handler import BaseHandler
+from .base_db_handler import BaseHandler, CHANGES_LIMIT
 
 class BookingHandler(BaseHandler):
     def add_booking(self, email, scooter_id, start_datetime, end_datetime, cost, deposit_cost, status='Active', google_id=None):
@@ -219,6 +219,25 @@ class BookingHandler(BaseHandler):
             self.logger.error(f"Error retrieving booked scooters and times: {e}")
             raise
 
+    def stream_all_booked_scooters_and_times(self):
+        """
+        Retrieve all booked scooters, their time slots and their status a batch at a time.
+
+        Yields:
+            list: The next batch of bookings, each a dictionary as returned by get_all_booked_scooters_and_times.
+        """
+        query = "SELECT scooterID, startDateTime, endDateTime, status FROM Booking"
+        columns = [
+            "scooterID",
+            "startDateTime",
+            "endDateTime",
+            "status",
+        ]
+
+        for rows in self._db_driver.stream_query(query):
+            yield [dict(zip(columns, row)) for row in rows]
+        self.logger.info("Streamed all booked scooters and their time slots.")
+
     def set_booking_complete(self, booking_id):
         """
         Set a booking's status to 'Complete'.
@@ -240,6 +259,28 @@ class BookingHandler(BaseHandler):
             self.logger.error(f"Error marking booking {booking_id} as complete: {e}")
             raise
         
+    def complete_elapsed_bookings(self):
+        """
+        Set every Active booking whose end has passed to 'Complete', in a single statement.
+
+        Returns:
+            list: The bookingID and scooterID of each booking completed.
+        """
+        query = """
+        UPDATE Booking
+        SET status = 'Complete'
+        WHERE status = 'Active' AND endDateTime < now()
+        RETURNING bookingID, scooterID
+        """
+
+        try:
+            results = self._db_driver.execute_returning(query)
+            self.logger.info(f"{len(results)} elapsed bookings marked as complete.")
+            return [{"bookingID": booking_id, "scooterID": scooter_id} for booking_id, scooter_id in results]
+        except Exception as e:
+            self.logger.error(f"Error completing elapsed bookings: {e}")
+            raise
+
     def update_booking_cost(self, booking_id, new_cost):
         """
         Update the cost of a booking.
@@ -298,6 +339,41 @@ class BookingHandler(BaseHandler):
             self.logger.error(f"Error retrieving active bookings: {e}")
             raise
 
+    def get_bookings_changed_since(self, cursor, limit=CHANGES_LIMIT):
+        """
+        Retrieve the bookings added, changed or deleted since a cursor.
+
+        Args:
+            cursor (int): The cursor returned by the previous call, or 0 for every booking.
+            limit (int): The most changed (and the most deleted) bookings to return at once.
+
+        Returns:
+            dict: {"bookings": [...], "deleted": [bookingID, ...], "cursor": int, "more": bool,
+                  "resync": bool}
+        """
+        columns = [
+            "email",
+            "scooterID",
+            "bookingID",
+            "startDateTime",
+            "endDateTime",
+            "actualStartDateTime",
+            "actualEndDateTime",
+            "cost",
+            "depositCost",
+            "googleID",
+            "status",
+            "updatedAt",
+            "changeSeq"
+        ]
+        try:
+            changes = self._changes_since("Booking", columns, cursor, limit)
+        except Exception as e:
+            self.logger.error(f"Error retrieving bookings changed since {cursor}: {e}")
+            raise
+        changes["bookings"] = changes.pop("rows")
+        return changes
+
     def set_booking_googleID(self, booking_id, google_id):
         """
         Add the google ID of a booking to the database.
@@ -356,3 +432,33 @@ class BookingHandler(BaseHandler):
         except Exception as e:
             self.logger.error(f"Error retrieving bookings for scooter {scooter_id}: {e}")
             raise
+
+    def stream_all_bookings_for_scooter(self, scooter_id):
+        """
+        Retrieve all bookings for a specific scooter a batch at a time, newest first.
+
+        Args:
+            scooter_id (int): The ID of the scooter.
+
+        Yields:
+            list: The next batch of bookings, each a dictionary as returned by get_all_bookings_for_scooter.
+        """
+        query = "SELECT * FROM Booking WHERE scooterID = %s ORDER BY startDateTime DESC"
+        params = (scooter_id,)
+        columns = [
+            "email",
+            "scooterID",
+            "bookingID",
+            "startDateTime",
+            "endDateTime",
+            "actualStartDateTime",
+            "actualEndDateTime",
+            "cost",
+            "depositCost",
+            "googleID",
+            "status"
+        ]
+
+        for rows in self._db_driver.stream_query(query, params):
+            yield [dict(zip(columns, row)) for row in rows]
+        self.logger.info(f"Streamed all bookings for scooter {scooter_id}.")
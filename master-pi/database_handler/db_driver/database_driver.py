@@ -1,7 +1,12 @@
 import logging
+import math
 from contextlib import contextmanager
 import psycopg2
 import json
+from db_driver.deadline import DeadlineExceeded, remaining_time
+
+# Seconds to wait for a connection to PostgreSQL, unless "connect_timeout" is set in the database info file
+DEFAULT_CONNECT_TIMEOUT = 5
 
 class DatabaseDriver:
     def __init__(self, db_info):
@@ -46,9 +51,21 @@ class DatabaseDriver:
     def _get_connection(self):
         """
         Context manager to open and close a PostgreSQL connection.
+
+        If the request being handled has a deadline (see db_driver.deadline), connecting may only take the time
+        it has left, and that time is set as the connection's statement_timeout so PostgreSQL cancels any query
+        that would overrun it.
         """
         config = self._config
         connection = None
+        connect_timeout = config.get('connect_timeout', DEFAULT_CONNECT_TIMEOUT)
+        options = None
+        remaining = remaining_time()
+        if remaining is not None:
+            if remaining <= 0:
+                raise DeadlineExceeded("Request ran out of time before connecting to the database.")
+            connect_timeout = min(connect_timeout, math.ceil(remaining))
+            options = f"-c statement_timeout={max(1, int(remaining * 1000))}"
         try:
             # Establish a connection to the PostgreSQL database
             connection = psycopg2.connect(
@@ -56,7 +73,9 @@ class DatabaseDriver:
                 database=config['database'],
                 user=config['user'],
                 password=config['password'],
-                port=config['port']
+                port=config['port'],
+                connect_timeout=connect_timeout,
+                options=options
             )
             self.logger.info("Connection to the PostgreSQL database established successfully.")
             yield connection
@@ -101,3 +120,85 @@ class DatabaseDriver:
         except Exception as e:
             self.logger.error(f"Error executing query: {e}")
             raise
+
+    def execute_returning(self, query, params=None):
+        """
+        Execute an INSERT, UPDATE or DELETE query with a RETURNING clause and return every row it returns.
+
+        Args:
+            query (str): The SQL query to execute.
+            params (tuple): Optional parameters for the SQL query.
+
+        Returns:
+            list: The returned rows, one per row the query changed.
+        """
+        try:
+            with self._get_connection() as conn:
+                cursor = conn.cursor()
+                self.logger.info(f"Executing query: {query} with params: {params}")
+                cursor.execute(query, params)
+                results = cursor.fetchall()
+                conn.commit()
+                self.logger.info(f"Query executed successfully, {len(results)} rows returned.")
+                return results
+        except Exception as e:
+            self.logger.error(f"Error executing query: {e}")
+            raise
+
+    @contextmanager
+    def read_snapshot(self):
+        """
+        Context manager for reading from one snapshot of the database. The queries run with the function it yields
+        share a read-only REPEATABLE READ transaction, so they all see the same committed data however many
+        writes commit in between.
+
+        Yields:
+            callable: Runs a SELECT query, given the query and its optional parameters, and returns its rows.
+        """
+        try:
+            with self._get_connection() as conn:
+                conn.set_session(isolation_level=psycopg2.extensions.ISOLATION_LEVEL_REPEATABLE_READ, readonly=True)
+                with conn.cursor() as cursor:
+                    def select(query, params=None):
+                        self.logger.info(f"Executing query: {query} with params: {params}")
+                        cursor.execute(query, params)
+                        return cursor.fetchall()
+
+                    try:
+                        yield select
+                    finally:
+                        conn.rollback()
+        except Exception as e:
+            self.logger.error(f"Error reading from a snapshot: {e}")
+            raise
+
+    def stream_query(self, query, params=None, batch_size=500):
+        """
+        Execute a SELECT query and yield its rows a batch at a time.
+
+        The rows are read through a server-side cursor, so only one batch is held in memory however many rows
+        the query returns. The connection stays open until the generator is exhausted or closed.
+
+        Args:
+            query (str): The SELECT query to execute.
+            params (tuple): Optional parameters for the SQL query.
+            batch_size (int): The number of rows to fetch from the database at a time.
+
+        Yields:
+            list: The next batch of rows.
+        """
+        try:
+            with self._get_connection() as conn:
+                with conn.cursor(name="stream_query") as cursor:
+                    cursor.itersize = batch_size
+                    self.logger.info(f"Streaming query: {query} with params: {params}")
+                    cursor.execute(query, params)
+                    while True:
+                        rows = cursor.fetchmany(batch_size)
+                        if not rows:
+                            break
+                        yield rows
+                self.logger.info("Query streamed successfully.")
+        except Exception as e:
+            self.logger.error(f"Error streaming query: {e}")
+            raise
@@ -0,0 +1,32 @@
+import contextvars
+import time
+
+# The time the request being handled must be answered by, on the monotonic clock, or None if it has no deadline
+_deadline = contextvars.ContextVar("request_deadline", default=None)
+
+
+class DeadlineExceeded(TimeoutError):
+    """Raised instead of running a query for a request whose deadline has already passed."""
+
+
+def set_request_deadline(milliseconds):
+    """
+    Set the deadline of the request being handled on this thread.
+
+    Args:
+        milliseconds (float): The time the request has left, or None to clear the deadline.
+    """
+    _deadline.set(None if milliseconds is None else time.monotonic() + milliseconds / 1000)
+
+
+def remaining_time():
+    """
+    Get the time the request being handled has left.
+
+    Returns:
+        float: Seconds left (never less than 0), or None if the request has no deadline.
+    """
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return max(0.0, deadline - time.monotonic())
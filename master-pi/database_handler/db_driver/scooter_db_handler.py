@@ -1,4 +1,7 @@
-from .base_db_handler import BaseHandler
+from .base_db_handler import BaseHandler, CHANGES_LIMIT
+
+SCOOTER_COLUMNS = ['scooterID', 'make', 'colour', 'longitude', 'latitude', 'costMin', 'batteryPercentage', 'status',
+                   'ipAddress', 'updatedAt', 'changeSeq']
 
 class ScooterHandler(BaseHandler):
     def update_scooter_status(self, scooter_id, new_status):
@@ -40,9 +43,7 @@ class ScooterHandler(BaseHandler):
             result = self._db_driver.execute_query(query, params)
             if result:
                 self.logger.info(f"Scooter details retrieved for scooter ID {scooter_id}.")
-                columns = ['scooterID', 'make', 'colour', 'longitude', 'latitude', 'costMin',
-                           'batteryPercentage', 'status', 'ipAddress', 'faultNotes']
-                scooter_data = dict(zip(columns, result[0]))
+                scooter_data = dict(zip(SCOOTER_COLUMNS, result[0]))
                 return scooter_data
             else:
                 self.logger.warning(f"No scooter found with ID: {scooter_id}")
@@ -65,9 +66,7 @@ class ScooterHandler(BaseHandler):
             result = self._db_driver.execute_query(query)
             if result:
                 self.logger.info("Scooter details retrieved for all scooters.")
-                columns = ['scooterID', 'make', 'colour', 'longitude', 'latitude', 'costMin',
-                        'batteryPercentage', 'status', 'ipAddress', 'faultNotes']
-                scooters = [dict(zip(columns, row)) for row in result]
+                scooters = [dict(zip(SCOOTER_COLUMNS, row)) for row in result]
                 return scooters
             else:
                 self.logger.warning("No scooters found.")
@@ -76,6 +75,26 @@ class ScooterHandler(BaseHandler):
             self.logger.error(f"Error retrieving all scooters: {e}")
             return []
         
+    def get_scooters_changed_since(self, cursor, limit=CHANGES_LIMIT):
+        """
+        Retrieve the scooters added, changed or deleted since a cursor.
+
+        Args:
+            cursor (int): The cursor returned by the previous call, or 0 for every scooter.
+            limit (int): The most changed (and the most deleted) scooters to return at once.
+
+        Returns:
+            dict: {"scooters": [...], "deleted": [scooterID, ...], "cursor": int, "more": bool,
+                  "resync": bool}
+        """
+        try:
+            changes = self._changes_since("Scooter", SCOOTER_COLUMNS, cursor, limit)
+        except Exception as e:
+            self.logger.error(f"Error retrieving scooters changed since {cursor}: {e}")
+            raise
+        changes["scooters"] = changes.pop("rows")
+        return changes
+
     def update_scooter_location(self, scooter_id, latitude, longitude):
         """
         Update the location (latitude and longitude) of a scooter in the Scooter table.
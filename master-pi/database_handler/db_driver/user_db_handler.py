@@ -151,6 +151,21 @@ class UserHandler(BaseHandler):
             self.logger.error(f"Error retrieving all customers: {e}")
             return []
         
+    def stream_all_customers(self):
+        """
+        Retrieve all customers from the SystemUser table a batch at a time.
+
+        Yields:
+            list: The next batch of customers, each a dictionary as returned by get_all_customers.
+        """
+        query = "SELECT * FROM SystemUser WHERE role = %s"
+        params = ('Customer',)
+        columns = ['email', 'password', 'firstName', 'lastName', 'phoneNo', 'funds', 'role']
+
+        for rows in self._db_driver.stream_query(query, params):
+            yield [dict(zip(columns, row)) for row in rows]
+        self.logger.info("Streamed all customers.")
+
     def update_user_details(self, email, password, first_name, last_name, phone_no, funds, role):
         """
         Update all details for a given user in the SystemUser table.
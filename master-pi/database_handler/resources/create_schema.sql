@@ -4,6 +4,15 @@ DROP TABLE IF EXISTS Transaction;
 DROP TABLE IF EXISTS FaultLog;
 DROP TABLE IF EXISTS Scooter;
 DROP TABLE IF EXISTS SystemUser;
+DROP TABLE IF EXISTS DeletedRow;
+DROP TABLE IF EXISTS ChangeRetention;
+DROP SEQUENCE IF EXISTS change_seq;
+
+-- Change tracking: every insert or update of a scooter or booking stamps the row with the ID of the transaction
+-- writing it (changeXid), the next number from change_seq (changeSeq) and the time (updatedAt), and every delete
+-- is recorded in DeletedRow the same way, so a client that remembers the transaction up to which it has seen every
+-- change (its cursor) can ask for just the rows changed since
+CREATE SEQUENCE change_seq;
 
 -- Creating Customer table
 CREATE TABLE SystemUser (
@@ -26,7 +35,10 @@ CREATE TABLE Scooter (
     costMin REAL,
     batteryPercentage INT,
     status VARCHAR(50),
-    ipAddress VARCHAR(50)
+    ipAddress VARCHAR(50),
+    updatedAt TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now(),
+    changeSeq BIGINT NOT NULL DEFAULT nextval('change_seq'),
+    changeXid BIGINT NOT NULL DEFAULT pg_current_xact_id()::text::bigint
 );
 
 -- Creating Booking table with foreign keys
@@ -42,10 +54,38 @@ CREATE TABLE Booking (
     depositCost REAL,
     googleID VARCHAR(255),
     status VARCHAR(50) DEFAULT 'Active' CHECK (status IN ('Active', 'Complete', 'Cancelled')),
+    updatedAt TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now(),
+    changeSeq BIGINT NOT NULL DEFAULT nextval('change_seq'),
+    changeXid BIGINT NOT NULL DEFAULT pg_current_xact_id()::text::bigint,
     FOREIGN KEY (email) REFERENCES SystemUser(email) ON DELETE CASCADE,
     FOREIGN KEY (scooterID) REFERENCES Scooter(scooterID) ON DELETE SET NULL
 );
 
+-- Active bookings by end time, so elapsed bookings are found without scanning every booking
+CREATE INDEX booking_active_end ON Booking (endDateTime) WHERE status = 'Active';
+
+-- Rows changed since a cursor, found without scanning the whole table
+CREATE INDEX scooter_change ON Scooter (changeXid, changeSeq);
+CREATE INDEX booking_change ON Booking (changeXid, changeSeq);
+
+-- Scooters and bookings that have been deleted, stamped like the rows changed
+CREATE TABLE DeletedRow (
+    changeSeq BIGINT PRIMARY KEY DEFAULT nextval('change_seq'),
+    changeXid BIGINT NOT NULL DEFAULT pg_current_xact_id()::text::bigint,
+    tableName VARCHAR(50) NOT NULL,
+    rowID INT NOT NULL,
+    deletedAt TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now()
+);
+CREATE INDEX deleted_row_table_change ON DeletedRow (tableName, changeXid, changeSeq);
+-- Deleted rows older than the retention window are pruned, to stop DeletedRow growing without bound, and the
+-- last transaction pruned from each table is kept here: a cursor below it may have missed a deletion, so a client
+-- holding one must read the whole table again
+CREATE INDEX deleted_row_deleted_at ON DeletedRow (deletedAt);
+CREATE TABLE ChangeRetention (
+    tableName VARCHAR(50) PRIMARY KEY,
+    prunedXid BIGINT NOT NULL
+);
+
 -- Creating Transaction table with foreign keys
 CREATE TABLE Transaction (
     email VARCHAR(255),
@@ -68,4 +108,103 @@ CREATE TABLE FaultLog (
 );
 
 -- Set the timezone to AEST for the current session
-ALTER DATABASE scooter_system SET timezone TO 'Australia/Sydney';
\ No newline at end of file
+ALTER DATABASE scooter_system SET timezone TO 'Australia/Sydney';
+
+-- Change feed: every change to a scooter, booking or fault is announced with NOTIFY on the
+-- scooter_share_changes channel, as a small JSON object, so the backend learns of it straight away instead
+-- of polling the tables. Payloads use the same field names as the API responses.
+CREATE OR REPLACE FUNCTION notify_scooter_change() RETURNS trigger AS $$
+DECLARE
+    changed Scooter;
+BEGIN
+    IF TG_OP = 'DELETE' THEN changed := OLD; ELSE changed := NEW; END IF;
+    PERFORM pg_notify('scooter_share_changes', json_build_object(
+        'table', 'scooter', 'op', TG_OP,
+        'scooterID', changed.scooterID, 'status', changed.status, 'ipAddress', changed.ipAddress
+    )::text);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION notify_booking_change() RETURNS trigger AS $$
+DECLARE
+    changed Booking;
+BEGIN
+    IF TG_OP = 'DELETE' THEN changed := OLD; ELSE changed := NEW; END IF;
+    PERFORM pg_notify('scooter_share_changes', json_build_object(
+        'table', 'booking', 'op', TG_OP,
+        'bookingID', changed.bookingID, 'scooterID', changed.scooterID, 'status', changed.status,
+        'startDateTime', changed.startDateTime, 'endDateTime', changed.endDateTime
+    )::text);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION notify_fault_change() RETURNS trigger AS $$
+DECLARE
+    changed FaultLog;
+BEGIN
+    IF TG_OP = 'DELETE' THEN changed := OLD; ELSE changed := NEW; END IF;
+    PERFORM pg_notify('scooter_share_changes', json_build_object(
+        'table', 'fault', 'op', TG_OP,
+        'faultID', changed.faultID, 'scooterID', changed.scooterID, 'status', changed.status
+    )::text);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Location and battery updates are frequent and nothing listens for them, so only status and IP changes notify
+CREATE TRIGGER scooter_changed
+    AFTER INSERT OR DELETE ON Scooter
+    FOR EACH ROW EXECUTE FUNCTION notify_scooter_change();
+CREATE TRIGGER scooter_status_changed
+    AFTER UPDATE OF status, ipAddress ON Scooter
+    FOR EACH ROW
+    WHEN (OLD.status IS DISTINCT FROM NEW.status OR OLD.ipAddress IS DISTINCT FROM NEW.ipAddress)
+    EXECUTE FUNCTION notify_scooter_change();
+
+CREATE TRIGGER booking_changed
+    AFTER INSERT OR UPDATE OF scooterID, startDateTime, endDateTime, status OR DELETE ON Booking
+    FOR EACH ROW EXECUTE FUNCTION notify_booking_change();
+
+CREATE TRIGGER fault_changed
+    AFTER INSERT OR UPDATE OF status OR DELETE ON FaultLog
+    FOR EACH ROW EXECUTE FUNCTION notify_fault_change();
+
+
+-- Change tracking (see change_seq above). Writers don't wait for each other, so transactions may commit in any
+-- order; readers only return the changes of transactions below their snapshot's xmin, which have all finished,
+-- and resume from there next time, so a change committed late is never skipped.
+CREATE OR REPLACE FUNCTION stamp_change() RETURNS trigger AS $$
+BEGIN
+    NEW.changeXid := pg_current_xact_id()::text::bigint;
+    NEW.changeSeq := nextval('change_seq');
+    NEW.updatedAt := now();
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION record_deletion() RETURNS trigger AS $$
+BEGIN
+    IF TG_TABLE_NAME = 'scooter' THEN
+        INSERT INTO DeletedRow (tableName, rowID) VALUES ('Scooter', OLD.scooterID);
+    ELSE
+        INSERT INTO DeletedRow (tableName, rowID) VALUES ('Booking', OLD.bookingID);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER scooter_stamped
+    BEFORE INSERT OR UPDATE ON Scooter
+    FOR EACH ROW EXECUTE FUNCTION stamp_change();
+CREATE TRIGGER scooter_deleted
+    AFTER DELETE ON Scooter
+    FOR EACH ROW EXECUTE FUNCTION record_deletion();
+
+CREATE TRIGGER booking_stamped
+    BEFORE INSERT OR UPDATE ON Booking
+    FOR EACH ROW EXECUTE FUNCTION stamp_change();
+CREATE TRIGGER booking_deleted
+    AFTER DELETE ON Booking
+    FOR EACH ROW EXECUTE FUNCTION record_deletion();
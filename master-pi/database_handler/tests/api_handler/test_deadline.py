@@ -0,0 +1,40 @@
+import unittest
+from flask import Flask, jsonify
+from api_handler.deadline import register_deadline_handling
+from db_driver.deadline import DeadlineExceeded, remaining_time
+
+
+class TestDeadlineHandling(unittest.TestCase):
+    def setUp(self):
+        self.app = Flask(__name__)
+        register_deadline_handling(self.app)
+        self.app.add_url_rule('/remaining', 'remaining', lambda: jsonify({"remaining": remaining_time()}))
+        self.app.add_url_rule('/slow', 'slow', self.slow)
+        self.client = self.app.test_client()
+
+    def slow(self):
+        raise DeadlineExceeded("Request ran out of time before connecting to the database.")
+
+    def test_header_sets_remaining_time(self):
+        response = self.client.get('/remaining', headers={"X-Deadline-Ms": "2000"})
+
+        self.assertGreater(response.get_json()["remaining"], 1.5)
+        self.assertLessEqual(response.get_json()["remaining"], 2.0)
+
+    def test_no_header_means_no_deadline(self):
+        self.assertIsNone(self.client.get('/remaining').get_json()["remaining"])
+
+    def test_expired_deadline_fails_fast(self):
+        response = self.client.get('/remaining', headers={"X-Deadline-Ms": "0"})
+
+        self.assertEqual(response.status_code, 504)
+
+    def test_deadline_exceeded_is_504(self):
+        response = self.client.get('/slow', headers={"X-Deadline-Ms": "1000"})
+
+        self.assertEqual(response.status_code, 504)
+        self.assertIn("error", response.get_json())
+
+
+if __name__ == '__main__':
+    unittest.main()
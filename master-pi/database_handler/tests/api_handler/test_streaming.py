@@ -0,0 +1,38 @@
+import json
+import unittest
+from datetime import datetime
+from flask import Flask
+from api_handler.streaming import ndjson_response
+
+
+class TestNdjsonResponse(unittest.TestCase):
+    def setUp(self):
+        self.app = Flask(__name__)
+        self.batches = None
+        self.app.add_url_rule('/stream', 'stream', lambda: ndjson_response(self.batches))
+
+    def stream(self, batches):
+        self.batches = batches
+        response = self.app.test_client().get('/stream')
+        return response.mimetype, response.get_data(as_text=True)
+
+    def test_one_record_per_line_encoded_like_jsonify(self):
+        batches = iter([[{"scooterID": 1, "startDateTime": datetime(2024, 9, 1, 10, 0)}], [{"scooterID": 2}]])
+
+        mimetype, body = self.stream(batches)
+
+        self.assertEqual(mimetype, "application/x-ndjson")
+        lines = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual(lines, [{"scooterID": 1, "startDateTime": "Sun, 01 Sep 2024 10:00:00 GMT"}, {"scooterID": 2}])
+
+    def test_error_part_way_through_is_last_line(self):
+        def batches():
+            yield [{"scooterID": 1}]
+            raise RuntimeError("connection lost")
+
+        _, body = self.stream(batches())
+
+        self.assertEqual(json.loads(body.splitlines()[-1]), {"error": "connection lost"})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -214,6 +214,39 @@ class TestBookingHandler(unittest.TestCase):
             booking_id
         )
         
+    def test_complete_elapsed_bookings(self):
+        self.mock_db_driver.execute_returning.return_value = [(4, 1), (9, 2)]
+
+        result = self.booking_handler.complete_elapsed_bookings()
+
+        query = self.mock_db_driver.execute_returning.call_args[0][0]
+        self.assertEqual(
+            re.sub(r'\s+', ' ', query.strip()),
+            "UPDATE Booking SET status = 'Complete' WHERE status = 'Active' AND endDateTime < now() "
+            "RETURNING bookingID, scooterID"
+        )
+        self.assertEqual(result, [{"bookingID": 4, "scooterID": 1}, {"bookingID": 9, "scooterID": 2}])
+
+    def test_get_bookings_changed_since(self):
+        select = self.mock_db_driver.read_snapshot.return_value.__enter__.return_value
+        select.side_effect = [
+            [(90, None)],
+            [('a@b.com', 1, 12, '2024-09-15 10:00:00', '2024-09-15 12:00:00', None, None, 5.0, 1.0, None,
+              'Cancelled', '2024-09-14 09:00:00', 88, 85)],
+            [],
+        ]
+
+        result = self.booking_handler.get_bookings_changed_since(80)
+
+        query, params = select.call_args_list[1][0]
+        self.assertTrue(query.endswith("changeSeq, changeXid FROM Booking WHERE changeXid > %s AND changeXid < %s "
+                                       "ORDER BY changeXid, changeSeq LIMIT %s"))
+        self.assertEqual(params, (80, 90, 500))
+        self.assertEqual(select.call_args_list[2][0][1], ("Booking", 80, 90, 500))
+        self.assertEqual(result["bookings"][0]["bookingID"], 12)
+        self.assertEqual(result["bookings"][0]["status"], "Cancelled")
+        self.assertEqual(result["cursor"], 89)
+
     def test_update_booking_cost_success(self):
         booking_id = 123
         new_cost = 75.0
@@ -303,5 +336,17 @@ class TestBookingHandler(unittest.TestCase):
         # Verify the result
         self.assertEqual(result, bookings)
 
+    def test_stream_all_booked_scooters_and_times(self):
+        start = datetime(2024, 9, 15, 10, 0)
+        end = datetime(2024, 9, 15, 12, 0)
+        self.mock_db_driver.stream_query.return_value = iter([[(1, start, end, 'Active')], [(2, start, end, 'Complete')]])
+
+        batches = list(self.booking_handler.stream_all_booked_scooters_and_times())
+
+        self.assertEqual(batches, [
+            [{"scooterID": 1, "startDateTime": start, "endDateTime": end, "status": "Active"}],
+            [{"scooterID": 2, "startDateTime": start, "endDateTime": end, "status": "Complete"}],
+        ])
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,62 @@
+import unittest
+from unittest.mock import patch, MagicMock
+from psycopg2.extensions import ISOLATION_LEVEL_REPEATABLE_READ
+from db_driver.database_driver import DatabaseDriver, DEFAULT_CONNECT_TIMEOUT
+from db_driver.deadline import DeadlineExceeded, set_request_deadline
+
+
+class TestDatabaseDriverDeadline(unittest.TestCase):
+    def setUp(self):
+        self.driver = DatabaseDriver(db_info='resources/database_info.json')
+
+    def tearDown(self):
+        set_request_deadline(None)
+
+    @patch('db_driver.database_driver.psycopg2.connect')
+    def test_no_deadline_uses_connect_timeout_only(self, mock_connect):
+        with self.driver._get_connection():
+            pass
+
+        kwargs = mock_connect.call_args.kwargs
+        self.assertEqual(kwargs["connect_timeout"], DEFAULT_CONNECT_TIMEOUT)
+        self.assertIsNone(kwargs["options"])
+
+    @patch('db_driver.database_driver.psycopg2.connect')
+    def test_deadline_sets_statement_timeout(self, mock_connect):
+        set_request_deadline(1500)
+
+        with self.driver._get_connection():
+            pass
+
+        kwargs = mock_connect.call_args.kwargs
+        self.assertEqual(kwargs["connect_timeout"], 2)
+        timeout_ms = int(kwargs["options"].split("=")[1])
+        self.assertTrue(1000 < timeout_ms <= 1500)
+
+    @patch('db_driver.database_driver.psycopg2.connect')
+    def test_expired_deadline_does_not_connect(self, mock_connect):
+        set_request_deadline(0)
+
+        with self.assertRaises(DeadlineExceeded):
+            self.driver.execute_query("SELECT 1")
+        mock_connect.assert_not_called()
+
+    @patch('db_driver.database_driver.psycopg2.connect')
+    def test_snapshot_queries_share_one_read_only_transaction(self, mock_connect):
+        connection = mock_connect.return_value
+        cursor = connection.cursor.return_value.__enter__.return_value
+        cursor.fetchall.side_effect = [[(1,)], [(2,)]]
+
+        with self.driver.read_snapshot() as select:
+            self.assertEqual(select("SELECT 1"), [(1,)])
+            self.assertEqual(select("SELECT 2"), [(2,)])
+
+        mock_connect.assert_called_once()
+        connection.set_session.assert_called_once_with(isolation_level=ISOLATION_LEVEL_REPEATABLE_READ, readonly=True)
+        self.assertEqual(cursor.execute.call_count, 2)
+        connection.rollback.assert_called_once_with()
+        connection.commit.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,14 +1,92 @@
 import unittest
 import re
+from contextlib import contextmanager
 from unittest.mock import MagicMock
+from db_driver.base_db_handler import DELETED_ROW_RETENTION_DAYS
 from db_driver.scooter_db_handler import ScooterHandler  # Adjust the import according to your module structure
 
+class ChangeLogDatabase:
+    """
+    A stand-in for the database driver that knows only which transaction last changed or deleted each scooter.
+    `running` maps the transactions that haven't committed yet to the scooters they change, which no query
+    sees until commit() is called. A query run on its own sees every transaction committed so far; queries
+    inside read_snapshot() see only those committed before it began. `between_reads` is called once, after
+    the first query, to commit a write in between. The next prune removes the deletions by transactions up to
+    `expired_through`, as if they had aged out of the retention window.
+    """
+
+    def __init__(self, changed):
+        self.changed = dict(changed)    # scooterID -> changeXid
+        self.deleted = []               # (scooterID, changeXid)
+        self.running = {}               # changeXid -> [scooterID, ...]
+        self.between_reads = None
+        self.expired_through = None
+        self.pruned_xid = None
+
+    def commit(self, xid):
+        for scooter_id in self.running.pop(xid):
+            self.changed[scooter_id] = xid
+
+    def _state(self):
+        xids = list(self.changed.values()) + [xid for _, xid in self.deleted] + list(self.running)
+        xmin = min(self.running, default=max(xids, default=0) + 1)
+        return dict(self.changed), list(self.deleted), xmin, self.pruned_xid
+
+    def _select(self, state, query, params):
+        changed, deleted, xmin, pruned_xid = state
+        if "pg_snapshot_xmin" in query:
+            return [(xmin, pruned_xid)]
+        if "FROM DeletedRow" in query:
+            params = params[1:]
+            rows = sorted(((xid, row_id) for row_id, xid in deleted))
+        else:
+            rows = sorted((xid, scooter_id) for scooter_id, xid in changed.items())
+        if "changeXid = %s" in query:
+            rows = [row for row in rows if row[0] == params[0]]
+        else:
+            cursor, horizon, limit = params
+            rows = [row for row in rows if cursor < row[0] < horizon][:limit]
+        if "FROM DeletedRow" in query:
+            return [(row_id, xid) for xid, row_id in rows]
+        return [(scooter_id,) + (None,) * 10 + (xid,) for xid, scooter_id in rows]
+
+    def _after_read(self):
+        write, self.between_reads = self.between_reads, None
+        if write:
+            write()
+
+    def execute_returning(self, query, params=None):
+        if self.expired_through is None:
+            return []
+        self.deleted = [(row_id, xid) for row_id, xid in self.deleted if xid > self.expired_through]
+        self.pruned_xid, self.expired_through = self.expired_through, None
+        return [("Scooter", self.pruned_xid)]
+
+    def execute_query(self, query, params=None):
+        rows = self._select(self._state(), query, params)
+        self._after_read()
+        return rows
+
+    @contextmanager
+    def read_snapshot(self):
+        state = self._state()
+
+        def select(query, params=None):
+            rows = self._select(state, query, params)
+            self._after_read()
+            return rows
+
+        yield select
+
+
 class TestScooterHandler(unittest.TestCase):
     def setUp(self):
         # Set up a mock database driver and pass it to ScooterHandler
         self.mock_db_driver = MagicMock()
         self.scooter_handler = ScooterHandler(db_info='resources/database_info.json')
         self.scooter_handler._db_driver = self.mock_db_driver
+        # Runs the queries made inside read_snapshot()
+        self.select = self.mock_db_driver.read_snapshot.return_value.__enter__.return_value
 
     def assert_query_called_once_with(self, expected_query, *args):
         call_args = self.mock_db_driver.execute_query.call_args[0]
@@ -122,6 +200,126 @@ class TestScooterHandler(unittest.TestCase):
         # Verify the result
         self.assertEqual(result, scooter_data_list)
         
+    def test_get_scooters_changed_since(self):
+        self.select.side_effect = [
+            [(50, None)],
+            [(2, 'Make', 'Red', 1.0, 2.0, 0.5, 90, 'Booked', '10.0.0.2', '2024-09-15 10:00:00', 41, 44)],
+            [(7, 46)],
+        ]
+
+        result = self.scooter_handler.get_scooters_changed_since(40)
+
+        horizon_query, scooter_query, deleted_query = [call[0] for call in self.select.call_args_list]
+        self.assertEqual(horizon_query, ("SELECT pg_snapshot_xmin(pg_current_snapshot())::text::bigint, "
+                                         "(SELECT prunedXid FROM ChangeRetention WHERE tableName = %s)", ("Scooter",)))
+        self.assertEqual(
+            scooter_query,
+            ("SELECT scooterID, make, colour, longitude, latitude, costMin, batteryPercentage, status, ipAddress, "
+             "updatedAt, changeSeq, changeXid FROM Scooter WHERE changeXid > %s AND changeXid < %s "
+             "ORDER BY changeXid, changeSeq LIMIT %s", (40, 50, 500))
+        )
+        self.assertEqual(deleted_query[1], ("Scooter", 40, 50, 500))
+        self.assertEqual([scooter["scooterID"] for scooter in result["scooters"]], [2])
+        self.assertEqual(result["scooters"][0]["status"], "Booked")
+        self.assertEqual(result["scooters"][0]["changeSeq"], 41)
+        self.assertNotIn("changeXid", result["scooters"][0])
+        self.assertEqual(result["deleted"], [7])
+        self.assertEqual(result["cursor"], 49)
+        self.assertFalse(result["more"])
+
+    def test_changes_cut_short_stop_where_the_first_list_did(self):
+        """Transactions after the last one a cut-short list reached are left for the next call; that one is whole."""
+        self.select.side_effect = [
+            [(100, None)],
+            [(1,) + (None,) * 10 + (10,), (2,) + (None,) * 10 + (12,)],
+            [(5, 11), (6, 14)],
+            [(2,) + (None,) * 10 + (12,), (3,) + (None,) * 10 + (12,)],
+            [],
+        ]
+
+        result = self.scooter_handler.get_scooters_changed_since(0, limit=2)
+
+        self.assertEqual(self.select.call_args_list[3][0][1], (12,))
+        self.assertEqual([scooter["scooterID"] for scooter in result["scooters"]], [1, 2, 3])
+        self.assertEqual(result["deleted"], [5])
+        self.assertEqual(result["cursor"], 12)
+        self.assertTrue(result["more"])
+
+    def test_no_changes_moves_the_cursor_up_to_running_transactions(self):
+        self.select.side_effect = [[(50, None)], [], []]
+
+        result = self.scooter_handler.get_scooters_changed_since(40)
+
+        self.assertEqual(result, {"scooters": [], "deleted": [], "cursor": 49, "more": False, "resync": False})
+
+    def test_cursor_older_than_pruned_deletions_must_resync(self):
+        """Once deletions are pruned, a cursor from before them is told to resync, and a full read starts again."""
+        database = ChangeLogDatabase({1: 10, 2: 11})
+        database.deleted = [(3, 12), (4, 15)]
+        self.scooter_handler._db_driver = database
+
+        first = self.scooter_handler.get_scooters_changed_since(0)
+        database.changed[5] = 16
+        database.expired_through = 12
+        self.scooter_handler._pruned_at = None
+        stale = self.scooter_handler.get_scooters_changed_since(11)
+        current = self.scooter_handler.get_scooters_changed_since(first["cursor"])
+        full = self.scooter_handler.get_scooters_changed_since(0)
+
+        self.assertEqual(first["cursor"], 15)
+        self.assertEqual(stale, {"scooters": [], "deleted": [], "cursor": 0, "more": False, "resync": True})
+        self.assertEqual([scooter["scooterID"] for scooter in current["scooters"]], [5])
+        self.assertFalse(current["resync"])
+        self.assertEqual([scooter["scooterID"] for scooter in full["scooters"]], [1, 2, 5])
+        self.assertEqual(full["deleted"], [4])
+        self.assertFalse(full["resync"])
+
+    def test_deleted_rows_are_pruned_at_most_once_per_interval(self):
+        self.select.side_effect = [[(50, None)], [], [], [(50, None)], [], []]
+        self.mock_db_driver.execute_returning.return_value = []
+
+        self.scooter_handler.get_scooters_changed_since(40)
+        self.scooter_handler.get_scooters_changed_since(49)
+
+        self.mock_db_driver.execute_returning.assert_called_once()
+        query, params = self.mock_db_driver.execute_returning.call_args[0]
+        self.assertIn("DELETE FROM DeletedRow", query)
+        self.assertIn("INSERT INTO ChangeRetention", query)
+        self.assertEqual(params, (DELETED_ROW_RETENTION_DAYS,))
+
+    def test_change_committed_between_reads_is_not_skipped(self):
+        """A scooter changed, and another deleted, after the changed rows are read are both seen by the next call."""
+        database = ChangeLogDatabase({1: 10})
+
+        def write():
+            database.changed[2] = 11
+            database.deleted.append((3, 12))
+
+        database.between_reads = write
+        self.scooter_handler._db_driver = database
+
+        first = self.scooter_handler.get_scooters_changed_since(0)
+        second = self.scooter_handler.get_scooters_changed_since(first["cursor"])
+
+        self.assertEqual([scooter["scooterID"] for scooter in first["scooters"] + second["scooters"]], [1, 2])
+        self.assertEqual(first["deleted"] + second["deleted"], [3])
+        self.assertEqual(second["cursor"], 12)
+
+    def test_change_committed_out_of_order_is_not_skipped(self):
+        """A transaction still running while a later one commits is returned once it commits, not passed over."""
+        database = ChangeLogDatabase({1: 10, 3: 21})
+        database.running[20] = [2]
+        self.scooter_handler._db_driver = database
+
+        first = self.scooter_handler.get_scooters_changed_since(0)
+        database.commit(20)
+        second = self.scooter_handler.get_scooters_changed_since(first["cursor"])
+
+        self.assertEqual([scooter["scooterID"] for scooter in first["scooters"]], [1])
+        self.assertEqual(first["cursor"], 19)
+        self.assertEqual([scooter["scooterID"] for scooter in second["scooters"]], [2, 3])
+        self.assertEqual(second["cursor"], 21)
+
     def test_update_scooter_location_success(self):
         scooter_id = 1
         latitude = 50.1234
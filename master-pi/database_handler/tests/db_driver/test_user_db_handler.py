@@ -222,6 +222,22 @@ class TestUserHandler(unittest.TestCase):
         # Verify the result
         self.assertEqual(result, [])
 
+    def test_stream_all_customers(self):
+        # Set up the mock to return the customers in two batches
+        self.mock_db_driver.stream_query.return_value = iter([
+            [('user1@example.com', 'hashed_password1', 'John', 'Doe', '1234567890', 100.0, 'Customer')],
+            [('user2@example.com', 'hashed_password2', 'Jane', 'Doe', '0987654321', 50.0, 'Customer')],
+        ])
+
+        # Call the method to test
+        batches = list(self.user_handler.stream_all_customers())
+
+        # Verify each batch is converted separately and the query is streamed
+        self.mock_db_driver.stream_query.assert_called_once_with("SELECT * FROM SystemUser WHERE role = %s", ('Customer',))
+        self.assertEqual(len(batches), 2)
+        self.assertEqual(batches[1][0]['email'], 'user2@example.com')
+        self.assertEqual(batches[1][0]['funds'], 50.0)
+
     def test_update_user_details_success(self):
         email = 'alice.smith@example.com'
         password = 'newpassword123'
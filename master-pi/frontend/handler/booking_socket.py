@@ -74,3 +74,21 @@ class BookingSocket:
         
         response = self.socket_manager.send_and_receive(message)
         return response
+
+    def iter_all_bookings_for_scooter(self, scooter_id):
+        """Yield every booking for a specific scooter, newest first, as it is streamed from the Master Pi"""
+
+        message = {
+            "command": "GABFS",
+            "payload": {"scooter_id": scooter_id},
+        }
+        return self.socket_manager.stream(message)
+
+    def get_all_bookings_for_scooters(self, scooter_ids):
+        """Get all booking details for many scooters in one round trip, in the same order as scooter_ids"""
+
+        messages = [
+            {"command": "GABFS", "payload": {"scooter_id": scooter_id}}
+            for scooter_id in scooter_ids
+        ]
+        return self.socket_manager.send_batch(messages)
@@ -60,6 +60,14 @@ class CustomerSocket:
         response = self.socket_manager.send_and_receive(message)
         return response
 
+    def iter_all_customers(self):
+        """Yield every customer's details as they are streamed from the Master Pi"""
+
+        message = {
+            "command": "GAC",
+        }
+        return self.socket_manager.stream(message)
+
     def update_customer(self, updated_data):
         """Update customer details in Master Pi"""
         message = {
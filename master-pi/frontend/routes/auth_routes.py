@@ -16,7 +16,7 @@ def login_routes(app):
             customer_socket = CustomerSocket()
             try:
                 response = customer_socket.login_customer(email)
-            except ConnectionRefusedError:
+            except (ConnectionError, TimeoutError):
                 flash("Server connection issue. Please try again later.", "error")
                 return redirect(url_for("login"))
 
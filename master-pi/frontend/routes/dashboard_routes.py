@@ -44,7 +44,7 @@ def dashboard_routes(app):
         scooter_socket = ScooterSocket()
         try:
             all_scooter_details = scooter_socket.get_all_scooters()
-        except ConnectionRefusedError:
+        except (ConnectionError, TimeoutError):
             flash("Server connection error - Server may be down", "error")
             return render_template("dashboard.html")
         
@@ -71,13 +71,6 @@ def dashboard_routes(app):
         if not is_logged_in():
             return redirect(url_for("login"))
         
-        customer_socket = CustomerSocket()
-        try:
-            all_customer_details = customer_socket.get_all_customers()
-        except ConnectionRefusedError:
-            flash("Server connection error - Server may be down", "error")
-            return render_template("dashboard.html")
-        
         customers = get_all_customers()
         
         return render_template("view_all_customers.html", customers=customers)
@@ -93,7 +86,7 @@ def dashboard_routes(app):
 
         try:
             all_customers = customer_socket.get_all_customers()
-        except ConnectionRefusedError:
+        except (ConnectionError, TimeoutError):
             flash("Server connection error - Server may be down", "error")
             return render_template("dashboard.html")
 
@@ -140,7 +133,7 @@ def dashboard_routes(app):
 
         try:
             all_scooters = scooter_socket.get_all_scooters()
-        except ConnectionRefusedError:
+        except (ConnectionError, TimeoutError):
             flash("Server connection error - Server may be down", "error")
             return render_template("dashboard.html")
 
@@ -190,7 +183,7 @@ def dashboard_routes(app):
 
         try:
             all_scooters = scooter_socket.get_all_scooters()
-        except ConnectionRefusedError:
+        except (ConnectionError, TimeoutError):
             flash("Server connection error - Server may be down", "error")
             return render_template("dashboard.html")
 
@@ -228,7 +221,7 @@ def dashboard_routes(app):
 
         try:
             all_scooters = scooter_socket.get_all_scooters()
-        except ConnectionRefusedError:
+        except (ConnectionError, TimeoutError):
             flash("Server connection error - Server may be down", "error")
             return render_template("dashboard.html")
 
@@ -269,7 +262,7 @@ def dashboard_routes(app):
 
         try:
             all_scooters = scooter_socket.get_all_scooters()
-        except ConnectionRefusedError:
+        except (ConnectionError, TimeoutError):
             flash("Server connection error - Server may be down", "error")
             return render_template("dashboard.html")
 
@@ -313,8 +306,8 @@ def dashboard_routes(app):
                     # Generate data based on the selected option
                     scooter_ids = get_all_scooter_ids(scooter_socket)
                     bookings = []
-                    for scooter_id in scooter_ids:
-                        bookings += get_all_scooters_bookings(booking_socket, scooter_id)
+                    for all_scooter_bookings in booking_socket.get_all_bookings_for_scooters(scooter_ids):
+                        bookings += format_scooter_bookings(all_scooter_bookings.get("bookings", []))
 
                     # Generate the visualization based on user input
                     vis.generate_visualisation(selected_option, bookings)
@@ -328,7 +321,9 @@ def dashboard_routes(app):
 
     
     def get_all_scooters_bookings(booking_socket, scooter_id):
-        all_scooter_bookings = booking_socket.get_all_bookings_for_scooter(scooter_id)
+        return format_scooter_bookings(booking_socket.iter_all_bookings_for_scooter(scooter_id))
+
+    def format_scooter_bookings(all_scooter_bookings):
         bookings = [
             {
                 "booking_id": booking["bookingID"],
@@ -343,7 +338,7 @@ def dashboard_routes(app):
                 "google_id": booking["googleID"],
                 "status": booking["status"],
             }
-            for booking in all_scooter_bookings.get("bookings", [])
+            for booking in all_scooter_bookings
         ]
         
         return bookings
@@ -362,24 +357,27 @@ def dashboard_routes(app):
         """
         customer_socket = CustomerSocket()
         try:
-            all_customer_details = customer_socket.get_all_customers()
-        except ConnectionRefusedError:
+            # Customers are streamed from the Master Pi and trimmed down as each chunk arrives
+            customers = [
+                {
+                    "email": customer["email"],
+                    "firstName": customer["firstName"],
+                    "lastName": customer["lastName"],
+                    "phoneNo": customer["phoneNo"],
+                    "funds": customer["funds"],
+                    "role": customer["role"],
+                    "password": customer["password"],
+                }
+                for customer in customer_socket.iter_all_customers()
+            ]
+        except (ConnectionError, TimeoutError):
             flash("Server connection error - Server may be down", "error")
-            return render_template("dashboard.html")
-        
-        customers = [
-            {
-                "email": customer["email"],
-                "firstName": customer["firstName"],
-                "lastName": customer["lastName"],
-                "phoneNo": customer["phoneNo"],
-                "funds": customer["funds"],
-                "role": customer["role"],
-                "password": customer["password"],
-            }
-            for customer in all_customer_details
-        ]
-        
+            return []
+        except RuntimeError as e:
+            # The Master Pi answered with an error instead, e.g. because it is busy
+            flash(f"Could not load customers - {e}", "error")
+            return []
+
         return customers
         
 def hash_password(password):
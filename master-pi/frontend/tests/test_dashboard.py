@@ -1,6 +1,10 @@
+import socket
 import unittest
+from unittest.mock import patch
 from bs4 import BeautifulSoup
 from app import ScooterWebApp
+from handler.socket_manager import SocketManager
+from scooter_protocol import PipelinedConnection
 
 
 class DashboardTests(unittest.TestCase):
@@ -38,6 +42,22 @@ class DashboardTests(unittest.TestCase):
             "Flash message does not contain the expected text",
         )
 
+    def test_master_pi_unreachable(self):
+        """Test that the page says the server may be down, rather than failing, when the Master Pi refuses connections"""
+        # A port nothing listens on, so connecting to it is refused
+        with socket.socket() as unused:
+            unused.bind(("127.0.0.1", 0))
+            address = unused.getsockname()
+        manager = object.__new__(SocketManager)
+        manager.connection = PipelinedConnection(address, timeout=1)
+
+        with patch.object(SocketManager, "_instance", manager):
+            response = self.client.get("/view-all-scooters")
+
+        self.assertEqual(response.status_code, 200)
+        message_text = BeautifulSoup(response.data, "html.parser").select_one(".message").get_text(strip=True)
+        self.assertIn("Server may be down", message_text)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -1,6 +1,9 @@
 python3 -m venv venv
 source venv/bin/activate
 
+# The shared scooter_protocol package, used by every component below
+pip install -e ..
+
 cd database_handler
 pip install pipreqs
 pipreqs --force
@@ -3,9 +3,13 @@ source venv/bin/activate
 
 # Install Dependencies
 
+# The shared scooter_protocol package, used by every component below
+pip install -e .
+
 cd master-pi/backend
 pip install pipreqs
 pipreqs --force
+sed -i 's/psycopg2==.*/psycopg2-binary==2.9.9/' requirements.txt
 make
 
 cd ../database_handler
@@ -47,4 +51,5 @@ cd ../console
 python -m unittest discover
 
 cd ../../
+python -m unittest discover -s scooter_protocol/tests -t .
 rm -r venv/
\ No newline at end of file
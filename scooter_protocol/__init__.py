@@ -0,0 +1,16 @@
+"""
+Shared socket protocol used by the Master Pi backend, the Agent Pi console and both frontends.
+
+Every message is a length-prefixed frame (4-byte big-endian length, then the encoded message). See
+master-pi/backend/resources/socket_commands.md for the message format.
+"""
+from .framing import send_frame, recv_frame, recv_exactly, set_nodelay, MAX_FRAME_SIZE
+from .session import Session
+from .connection import PipelinedConnection
+from .server import ProtocolServer, ClientConnection, ServerBusy
+from .streaming import StreamingResponse
+from .idempotency import KEYED_COMMANDS, new_idempotency_key
+from .deadline import Deadline, DeadlineExceeded, deadline_scope, current_deadline
+from .fleet import FleetPublisher, FleetSubscriber
+
+__all__ = ['send_frame', 'recv_frame', 'recv_exactly', 'set_nodelay', 'MAX_FRAME_SIZE', 'Session', 'PipelinedConnection', 'ProtocolServer', 'ClientConnection', 'ServerBusy', 'StreamingResponse', 'KEYED_COMMANDS', 'new_idempotency_key', 'Deadline', 'DeadlineExceeded', 'deadline_scope', 'current_deadline', 'FleetPublisher', 'FleetSubscriber']
@@ -0,0 +1,111 @@
+"""
+Micro-benchmark comparing the shared framing in scooter_protocol.framing with the framing the socket endpoints used
+before it: a recv loop building the frame with `data += packet`, and separate sendall calls for the header and the
+body on a socket with Nagle's algorithm left on.
+
+Run from the root of the repository:
+
+    python -m scooter_protocol.benchmarks.framing_benchmark
+"""
+import argparse
+import socket
+import struct
+import threading
+import time
+
+from scooter_protocol import framing
+
+
+def legacy_send_frame(sock, data):
+    sock.sendall(struct.pack('>I', len(data)))
+    sock.sendall(data)
+
+
+def legacy_recv_all(sock, length):
+    data = b''
+    while len(data) < length:
+        packet = sock.recv(length - len(data))
+        if not packet:
+            return None
+        data += packet
+    return data
+
+
+def legacy_recv_frame(sock):
+    raw_length = legacy_recv_all(sock, 4)
+    if raw_length is None:
+        return None
+    return legacy_recv_all(sock, struct.unpack('>I', raw_length)[0])
+
+
+IMPLEMENTATIONS = {
+    "legacy": (legacy_send_frame, legacy_recv_frame, False),
+    "shared": (framing.send_frame, framing.recv_frame, True),
+}
+
+
+def echo_server(listener, send, recv, nodelay):
+    """Echo every frame back on each accepted connection until the client disconnects."""
+    while True:
+        try:
+            conn, _ = listener.accept()
+        except OSError:
+            return
+        if nodelay:
+            framing.set_nodelay(conn)
+        with conn:
+            while True:
+                data = recv(conn)
+                if data is None:
+                    break
+                send(conn, data)
+
+
+def connect(name):
+    """Start an echo server using the given implementation and return (listener, client socket)."""
+    send, recv, nodelay = IMPLEMENTATIONS[name]
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.bind(("127.0.0.1", 0))
+    listener.listen()
+    threading.Thread(target=echo_server, args=(listener, send, recv, nodelay), daemon=True).start()
+    client = socket.create_connection(listener.getsockname())
+    if nodelay:
+        framing.set_nodelay(client)
+    return listener, client
+
+
+def measure(name, size, rounds):
+    """Time `rounds` echo round trips of a `size` byte frame, returning the seconds taken."""
+    send, recv, _ = IMPLEMENTATIONS[name]
+    listener, client = connect(name)
+    payload = b"x" * size
+    try:
+        send(client, payload)
+        recv(client)  # Warm up the connection
+        start = time.perf_counter()
+        for _ in range(rounds):
+            send(client, payload)
+            recv(client)
+        return time.perf_counter() - start
+    finally:
+        client.close()
+        listener.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--small-rounds", type=int, default=200, help="Round trips of a small frame")
+    parser.add_argument("--large-rounds", type=int, default=10, help="Round trips of a large frame")
+    parser.add_argument("--large-size", type=int, default=8 * 1024 * 1024, help="Size of the large frame in bytes")
+    args = parser.parse_args()
+
+    print(f"{'framing':<8} {'small frame round trip':>24} {'large frame throughput':>24}")
+    for name in IMPLEMENTATIONS:
+        latency = measure(name, 256, args.small_rounds) / args.small_rounds
+        elapsed = measure(name, args.large_size, args.large_rounds)
+        throughput = 2 * args.large_size * args.large_rounds / elapsed / (1024 * 1024)
+        print(f"{name:<8} {latency * 1000:>21.3f} ms {throughput:>19.1f} MiB/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+import calendar
+import json
+import re
+import struct
+import time
+from functools import lru_cache
+
+try:
+    import msgpack
+except ImportError:  # The compact codec is optional, every peer can always fall back to JSON
+    msgpack = None
+
+
+def encode(message) -> bytes:
+    """Encode a message as JSON, the encoding used before a connection has negotiated one."""
+    return json.dumps(message).encode()
+
+
+def decode(data: bytes):
+    """Decode a JSON message."""
+    return json.loads(data.decode())
+
+
+class JsonCodec:
+    """Plain JSON, understood by every client and server."""
+    id = 0
+    name = "json"
+
+    def encode(self, message) -> bytes:
+        return encode(message)
+
+    def decode(self, data: bytes):
+        return decode(data)
+
+
+# Field names sent often enough to be worth a one-byte code. Codes must never be reused or reordered: append new
+# names to the end and bump the version in CompactCodec.name if an existing code has to change.
+KEYS = [
+    "command", "payload", "request_id", "error", "message", "results", "success",
+    "scooter_id", "booking_id", "email", "status", "scooter_status",
+    "scooterID", "make", "colour", "longitude", "latitude", "costMin", "batteryPercentage", "ipAddress",
+    "bookingID", "startDateTime", "endDateTime", "actualStartDateTime", "actualEndDateTime",
+    "cost", "depositCost", "googleID", "all_booked_scooters", "bookings", "active_bookings",
+    "password", "firstName", "lastName", "phoneNo", "funds", "role",
+    "transactionID", "datetime", "transactionAmount",
+    "faultID", "resolution", "faultNotes",
+]
+
+# Values of the fields below that are sent as one-byte codes instead of strings
+ENUM_KEYS = {"status", "scooter_status", "role"}
+ENUMS = [
+    "Available", "Booked", "In Use", "Needs Repair", "Under Repair", "Needs Repairs",
+    "Active", "Complete", "Cancelled",
+    "Open", "Resolved", "In Progress",
+    "Customer", "Admin", "Engineer",
+]
+
+KEY_CODES = {name: code for code, name in enumerate(KEYS)}
+ENUM_CODES = {name: code for code, name in enumerate(ENUMS)}
+
+# Dates come out of the DB API in RFC 1123 form, e.g. "Sun, 01 Sep 2024 10:00:00 GMT", which is always 29 characters
+HTTP_DATE_LENGTH = 29
+HTTP_DATE = re.compile(r"[A-Z][a-z]{2}, \d{2} [A-Z][a-z]{2} \d{4} \d{2}:\d{2}:\d{2} GMT\Z")
+DAYS = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
+MONTHS = ["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"]
+MONTH_NUMBERS = {name: number for number, name in enumerate(MONTHS, 1)}
+
+HTTP_DATE_EXT = 1
+ENUM_EXT = 2
+TIMESTAMP = struct.Struct(">q")
+
+# A list of dicts that all have the same keys is sent as one map holding the keys once and a list of row values
+TABLE_KEYS = -1
+TABLE_ROWS = -2
+
+SCALARS = {int, float, bool, type(None)}
+STRINGS = {str, type(None)}
+
+
+@lru_cache(maxsize=4096)
+def format_http_date(timestamp: int) -> str:
+    """Format a UTC timestamp the way the DB API does, e.g. "Sun, 01 Sep 2024 10:00:00 GMT"."""
+    t = time.gmtime(timestamp)
+    return "%s, %02d %s %04d %02d:%02d:%02d GMT" % (
+        DAYS[t.tm_wday], t.tm_mday, MONTHS[t.tm_mon - 1], t.tm_year, t.tm_hour, t.tm_min, t.tm_sec)
+
+
+@lru_cache(maxsize=4096)
+def _pack_http_date(value: str):
+    """Pack an RFC 1123 date into an ext type, or return None if it isn't one that unpacks to the same string."""
+    if not HTTP_DATE.match(value) or value[8:11] not in MONTH_NUMBERS:
+        return None
+    timestamp = calendar.timegm((int(value[12:16]), MONTH_NUMBERS[value[8:11]], int(value[5:7]),
+                                 int(value[17:19]), int(value[20:22]), int(value[23:25])))
+    # The weekday and day of the month have to be right for the date to come back exactly as it was sent
+    if format_http_date(timestamp) != value:
+        return None
+    return msgpack.ExtType(HTTP_DATE_EXT, TIMESTAMP.pack(timestamp))
+
+
+class CompactCodec:
+    """
+    MessagePack with known field names, status/role values and RFC 1123 dates packed into small integers, and
+    lists of records sent as tables so each field name is only sent once.
+
+    Decoding restores the exact message JSON would have carried, so callers can't tell which codec was used.
+    """
+    id = 1
+    name = "msgpack/1"
+
+    def encode(self, message) -> bytes:
+        return msgpack.packb(self._compact(message), use_bin_type=True)
+
+    def decode(self, data: bytes):
+        return msgpack.unpackb(data, raw=False, strict_map_key=False,
+                               ext_hook=self._ext_hook, object_hook=self._object_hook)
+
+    def _compact(self, value):
+        kind = type(value)
+        if kind is dict:
+            return self._compact_dict(value)
+        if kind is list or kind is tuple:
+            if len(value) > 1 and type(value[0]) is dict:
+                table = self._compact_table(value)
+                if table is not None:
+                    return table
+            return [self._compact(item) for item in value]
+        if kind is str:
+            return self._compact_str(value)
+        return value
+
+    def _compact_dict(self, value):
+        compacted = {}
+        for key, item in value.items():
+            if type(key) is not str:
+                key = str(key)  # JSON only has string keys, so integer keys are free to use as codes
+            if key in ENUM_KEYS and type(item) is str and item in ENUM_CODES:
+                item = msgpack.ExtType(ENUM_EXT, bytes([ENUM_CODES[item]]))
+            elif type(item) not in SCALARS:
+                item = self._compact(item)
+            compacted[KEY_CODES.get(key, key)] = item
+        return compacted
+
+    def _compact_table(self, rows):
+        """Compact a list of dicts into a table, or return None if the dicts don't all share the same keys."""
+        first = rows[0]
+        keys = list(first)
+        if not keys:
+            return None
+        for row in rows:
+            if type(row) is not dict or row.keys() != first.keys():
+                return None
+
+        columns = [self._compact_column(str(key), [row[key] for row in rows]) for key in keys]
+        return {
+            TABLE_KEYS: [KEY_CODES.get(str(key), str(key)) for key in keys],
+            TABLE_ROWS: list(zip(*columns)),
+        }
+
+    def _compact_column(self, key, column):
+        kinds = set(map(type, column))
+        if kinds <= SCALARS:
+            return column
+        if key in ENUM_KEYS and kinds <= STRINGS:
+            return [msgpack.ExtType(ENUM_EXT, bytes([ENUM_CODES[item]])) if item in ENUM_CODES else item
+                    for item in column]
+        if kinds <= STRINGS:
+            # Only date columns need looking at value by value
+            sample = next((item for item in column if item is not None), None)
+            if sample is None or len(sample) != HTTP_DATE_LENGTH:
+                return column
+            return [self._compact_str(item) if item is not None else None for item in column]
+        return [self._compact(item) for item in column]
+
+    def _compact_str(self, value):
+        if len(value) != HTTP_DATE_LENGTH:
+            return value
+        return _pack_http_date(value) or value
+
+    def _object_hook(self, value):
+        if TABLE_KEYS in value:
+            keys = [KEYS[key] if type(key) is int else key for key in value[TABLE_KEYS]]
+            return [dict(zip(keys, row)) for row in value[TABLE_ROWS]]
+        return {KEYS[key] if type(key) is int else key: item for key, item in value.items()}
+
+    def _ext_hook(self, code, data):
+        if code == HTTP_DATE_EXT:
+            return format_http_date(TIMESTAMP.unpack(data)[0])
+        if code == ENUM_EXT:
+            return ENUMS[data[0]]
+        return msgpack.ExtType(code, data)
+
+
+JSON_CODEC = JsonCodec()
+CODECS = [CompactCodec(), JSON_CODEC] if msgpack is not None else [JSON_CODEC]
+CODECS_BY_NAME = {codec.name: codec for codec in CODECS}
+CODECS_BY_ID = {codec.id: codec for codec in CODECS}
+
+
+def available_encodings():
+    """The names of the encodings this process supports, most preferred first."""
+    return [codec.name for codec in CODECS]
+
+
+def choose_codec(offered):
+    """
+    Pick the codec to use for a connection.
+
+    :param offered: Encoding names offered by the client, most preferred first.
+    :return: The first offered codec this process supports, or JSON if there are none in common.
+    """
+    for name in offered or []:
+        if name in CODECS_BY_NAME:
+            return CODECS_BY_NAME[name]
+    return JSON_CODEC
@@ -0,0 +1,71 @@
+import zlib
+
+from .framing import MAX_FRAME_SIZE
+
+try:
+    import zstandard
+except ImportError:  # zstd is optional, zlib is always available
+    zstandard = None
+
+# Frames at least this big are compressed, if the connection negotiated compression and it makes them smaller
+DEFAULT_THRESHOLD = 1024
+
+# A compressed frame never expands to more than an uncompressed one could be, so it can't be used to exhaust memory
+MAX_DECOMPRESSED_SIZE = MAX_FRAME_SIZE
+
+
+class ZlibCompressor:
+    """zlib (deflate), available everywhere."""
+    id = 1
+    name = "zlib"
+
+    def compress(self, data: bytes) -> bytes:
+        return zlib.compress(data, 6)
+
+    def decompress(self, data: bytes) -> bytes:
+        decompressor = zlib.decompressobj()
+        try:
+            result = decompressor.decompress(data, MAX_DECOMPRESSED_SIZE)
+        except zlib.error as e:
+            raise ValueError(f"Malformed zlib frame: {e}") from e
+        if decompressor.unconsumed_tail:
+            raise ValueError(f"Compressed frame expands to more than {MAX_DECOMPRESSED_SIZE} bytes")
+        return result
+
+
+class ZstdCompressor:
+    """Zstandard, which compresses about as well as zlib at a fraction of the CPU cost."""
+    id = 2
+    name = "zstd"
+
+    def compress(self, data: bytes) -> bytes:
+        return zstandard.ZstdCompressor(level=3).compress(data)
+
+    def decompress(self, data: bytes) -> bytes:
+        try:
+            return zstandard.ZstdDecompressor().decompress(data, max_output_size=MAX_DECOMPRESSED_SIZE)
+        except zstandard.ZstdError as e:
+            raise ValueError(f"Malformed zstd frame: {e}") from e
+
+
+COMPRESSORS = [ZstdCompressor(), ZlibCompressor()] if zstandard is not None else [ZlibCompressor()]
+COMPRESSORS_BY_NAME = {compressor.name: compressor for compressor in COMPRESSORS}
+COMPRESSORS_BY_ID = {compressor.id: compressor for compressor in COMPRESSORS}
+
+
+def available_compression():
+    """The names of the compression methods this process supports, most preferred first."""
+    return [compressor.name for compressor in COMPRESSORS]
+
+
+def choose_compressor(offered):
+    """
+    Pick the compression method to use for a connection.
+
+    :param offered: Compression names offered by the client, most preferred first.
+    :return: The first offered compressor this process supports, or None if there are none in common.
+    """
+    for name in offered or []:
+        if name in COMPRESSORS_BY_NAME:
+            return COMPRESSORS_BY_NAME[name]
+    return None
@@ -0,0 +1,244 @@
+import itertools
+import queue
+import socket
+import threading
+import time
+
+from .deadline import DEADLINE_FIELD, DeadlineExceeded, time_budget
+from .framing import set_nodelay
+from .idempotency import KEYED_COMMANDS, new_idempotency_key
+from .session import client_hello
+
+
+class _PendingRequest:
+    """A request that has been sent and is waiting for the response with its request ID."""
+
+    def __init__(self, streamed=False):
+        self.event = threading.Event()
+        self.response = None
+        self.error = None
+        # Chunks of a streamed response, followed by None once the final frame (or an error) has arrived
+        self.chunks = queue.Queue() if streamed else None
+
+    def finish(self):
+        """Wake up whoever is waiting on the request, once its response or error has been set."""
+        self.event.set()
+        if self.chunks is not None:
+            self.chunks.put(None)
+
+
+class PipelinedConnection:
+    """
+    A single persistent connection to a socket server, shared by every thread in the process.
+
+    Each request is tagged with a request ID, so many requests can be in flight on the one connection at once
+    and the server may answer them in any order. A background thread reads the responses and hands each one to
+    the thread waiting on its request ID. If the connection drops, every waiting request fails with a
+    ConnectionError and the next request opens a new connection. Each new connection negotiates its encoding
+    and compression with a HELLO before any request is sent; compressed responses are decompressed before they
+    are returned.
+
+    With retries, a request that times out or loses its connection is sent again. Commands in KEYED_COMMANDS are
+    sent with one idempotency key shared by every attempt, so the server runs them at most once.
+
+    Each attempt is sent with a "deadline_ms" of the time it will be waited for: the timeout, or less if the
+    thread is handling a request with a deadline of its own (see deadline.deadline_scope). No attempt is made
+    once that deadline has passed.
+    """
+
+    def __init__(self, address, timeout=None, encodings=None, compression=None, retries=0, retry_backoff=0.05):
+        """
+        :param address: The (host, port) of the server.
+        :param timeout: Seconds to wait for a response (or to connect) before giving up, or None to wait forever.
+        :param encodings: Encoding names to offer the server, or None to offer every one this process supports.
+        :param compression: Compression names to offer the server, or None to offer every one this process
+            supports. Pass [] to turn compression off.
+        :param retries: How many more times to send a request that timed out or lost its connection.
+        :param retry_backoff: Seconds to wait before the first retry, doubled before each one after it.
+        """
+        self.address = address
+        self.timeout = timeout
+        self.encodings = encodings
+        self.compression = compression
+        self.retries = retries
+        self.retry_backoff = retry_backoff
+        self._sock = None
+        self._session = None
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._request_ids = itertools.count(1)
+
+    def request(self, command: str, payload, idempotency_key=None):
+        """
+        Send a command to the server and wait for its response, retrying up to self.retries times.
+
+        :param command: The command to send to the server.
+        :param payload: The payload to send with the command.
+        :param idempotency_key: The key the server uses to run the command at most once. Defaults to a new key
+            for commands in KEYED_COMMANDS when retries are turned on, and to no key otherwise.
+        :return: The decoded response payload.
+        :raises ConnectionError: If the connection fails or closes before the response arrives, on every attempt.
+        :raises TimeoutError: If no response arrives within the timeout, on every attempt.
+        """
+        if idempotency_key is None and self.retries and command in KEYED_COMMANDS:
+            idempotency_key = new_idempotency_key()
+
+        for attempt in range(self.retries + 1):
+            try:
+                return self._request_once(command, payload, idempotency_key)
+            except DeadlineExceeded:
+                raise
+            except (ConnectionError, TimeoutError):
+                if attempt == self.retries:
+                    raise
+                time.sleep(self.retry_backoff * 2 ** attempt)
+
+    def _request_once(self, command, payload, idempotency_key):
+        """Send a request once and wait for its response."""
+        budget = time_budget(self.timeout)
+        request_id, pending = self._send(command, payload, idempotency_key=idempotency_key, budget=budget)
+
+        if not pending.event.wait(budget):
+            with self._lock:
+                self._pending.pop(request_id, None)
+            raise TimeoutError(f"No response from {self.address} for {command} within {budget:.3f}s.")
+        if pending.error is not None:
+            raise pending.error
+        return pending.response
+
+    def stream(self, command: str, payload):
+        """
+        Send a command whose response is a list, and yield its records as the server streams them in chunks.
+
+        Only one chunk at a time has to be decoded, and records can be used before the last one has been sent.
+        If the server answers with a plain list instead of streaming, its records are yielded all the same.
+        Closing the generator early stops delivering the remaining chunks.
+
+        :param command: The command to send to the server.
+        :param payload: The payload to send with the command.
+        :raises ConnectionError: If the connection fails or closes before the stream ends.
+        :raises TimeoutError: If no chunk arrives within the timeout, or the current deadline passes.
+        :raises RuntimeError: If the server answers with an error.
+        """
+        request_id, pending = self._send(command, payload, stream=True, budget=time_budget(None))
+        try:
+            while True:
+                try:
+                    chunk = pending.chunks.get(timeout=time_budget(self.timeout))
+                except queue.Empty:
+                    raise TimeoutError(f"No response from {self.address} for {command} within {self.timeout}s.")
+                if chunk is None:
+                    break
+                yield from chunk
+
+            if pending.error is not None:
+                raise pending.error
+            response = pending.response
+            if isinstance(response, dict) and "error" in response:
+                raise RuntimeError(response["error"])
+            if isinstance(response, list):
+                yield from response
+        finally:
+            with self._lock:
+                self._pending.pop(request_id, None)
+
+    def _send(self, command, payload, stream=False, idempotency_key=None, budget=None):
+        """
+        Send a request, returning its request ID and the _PendingRequest its response will complete.
+
+        :param budget: Seconds the server has to answer, sent as the request's deadline, or None for no deadline.
+        """
+        request_id = next(self._request_ids)
+        pending = _PendingRequest(streamed=stream)
+        message = {"command": command, "payload": payload, "request_id": request_id}
+        if stream:
+            message["stream"] = True
+        if idempotency_key is not None:
+            message["idempotency_key"] = idempotency_key
+        if budget is not None:
+            message[DEADLINE_FIELD] = int(budget * 1000)
+
+        with self._lock:
+            sock = self._connect(self.timeout if budget is None else budget)
+            self._pending[request_id] = pending
+            try:
+                self._session.write(sock, message)
+            except OSError as e:
+                self._pending.pop(request_id, None)
+                self._drop(sock, e)
+                raise ConnectionError(f"Failed to send request to {self.address}: {e}") from e
+        return request_id, pending
+
+    def close(self):
+        """Close the connection, failing any requests still waiting on it."""
+        with self._lock:
+            if self._sock is not None:
+                self._drop(self._sock, ConnectionError("Connection closed."))
+
+    def _connect(self, timeout):
+        """
+        Return the open connection, connecting first if there isn't one. Must be called holding _lock.
+
+        :param timeout: Seconds to wait for the connection and its HELLO, or None to wait forever.
+        """
+        if self._sock is None:
+            try:
+                sock = socket.create_connection(self.address, timeout=timeout)
+            except (ConnectionError, TimeoutError):
+                # Already what callers expect, and e.g. ConnectionRefusedError tells them the server is down
+                raise
+            except OSError as e:
+                raise ConnectionError(f"Failed to connect to {self.address}: {e}") from e
+            set_nodelay(sock)
+            try:
+                session = client_hello(sock, self.encodings, self.compression)
+            except (OSError, ValueError) as e:
+                sock.close()
+                raise ConnectionError(f"Failed to open connection to {self.address}: {e}") from e
+            # The timeout only bounds connecting; the reader thread waits on the socket for as long as it is open
+            sock.settimeout(None)
+            self._sock = sock
+            self._session = session
+            reader = threading.Thread(target=self._read_responses, args=(sock, session), daemon=True)
+            reader.start()
+        return self._sock
+
+    def _read_responses(self, sock, session):
+        """Read responses until the connection closes, completing the matching pending requests."""
+        error = ConnectionError(f"Connection to {self.address} closed.")
+        try:
+            while True:
+                message = session.read(sock)
+                if message is None:
+                    break
+                if "chunk" in message:
+                    with self._lock:
+                        pending = self._pending.get(message.get("request_id"))
+                    if pending is not None and pending.chunks is not None:
+                        pending.chunks.put(message["chunk"])
+                    continue
+
+                with self._lock:
+                    pending = self._pending.pop(message.get("request_id"), None)
+                if pending is not None:
+                    pending.response = message.get("payload")
+                    pending.finish()
+        except (OSError, ValueError) as e:
+            error = ConnectionError(f"Connection to {self.address} failed: {e}")
+        with self._lock:
+            self._drop(sock, error)
+
+    def _drop(self, sock, error):
+        """Close a connection and fail every request waiting on it. Must be called holding _lock."""
+        if self._sock is sock:
+            self._sock = None
+            pending, self._pending = self._pending, {}
+            for request in pending.values():
+                request.error = error
+                request.finish()
+        try:
+            # shutdown wakes up the reader thread if it is blocked on this socket
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        sock.close()
@@ -0,0 +1,80 @@
+import contextvars
+import time
+from contextlib import contextmanager
+
+# Envelope field carrying the time a request has left, in milliseconds. A relative budget rather than a wall
+# clock time, so the Pis' clocks don't need to agree.
+DEADLINE_FIELD = "deadline_ms"
+
+# HTTP header carrying the same budget from the backend to the database API
+DEADLINE_HEADER = "X-Deadline-Ms"
+
+_current = contextvars.ContextVar("deadline", default=None)
+
+
+class DeadlineExceeded(TimeoutError):
+    """Raised instead of starting work that can't finish before its deadline."""
+
+
+class Deadline:
+    """A point in time by which a request must be answered, measured on this process's monotonic clock."""
+
+    def __init__(self, seconds):
+        """
+        :param seconds: The time the request has left, from now.
+        """
+        self.expires_at = time.monotonic() + seconds
+
+    @classmethod
+    def from_ms(cls, milliseconds):
+        """Build a deadline from a budget in milliseconds, e.g. from DEADLINE_FIELD or DEADLINE_HEADER."""
+        return cls(float(milliseconds) / 1000)
+
+    def remaining(self):
+        """Seconds left before the deadline, never less than 0."""
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def remaining_ms(self):
+        """Whole milliseconds left before the deadline, to send on to the next hop."""
+        return int(self.remaining() * 1000)
+
+    def expired(self):
+        return self.remaining() <= 0
+
+    def check(self, what="Request"):
+        """
+        :raises DeadlineExceeded: If the deadline has passed.
+        """
+        if self.expired():
+            raise DeadlineExceeded(f"{what} ran out of time before its deadline.")
+
+
+def current_deadline():
+    """The deadline of the request being handled on this thread, or None if it has none."""
+    return _current.get()
+
+
+@contextmanager
+def deadline_scope(deadline):
+    """Make a deadline the current one while the block runs, so calls made to other services inherit it."""
+    token = _current.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current.reset(token)
+
+
+def time_budget(timeout):
+    """
+    How long the next call may take: its own timeout, cut short by the current deadline if there is one.
+
+    :param timeout: The call's own timeout in seconds, or None for no limit.
+    :return: Seconds, or None for no limit.
+    :raises DeadlineExceeded: If the current deadline has already passed, so the call shouldn't be made.
+    """
+    deadline = current_deadline()
+    if deadline is None:
+        return timeout
+    deadline.check()
+    remaining = deadline.remaining()
+    return remaining if timeout is None else min(timeout, remaining)
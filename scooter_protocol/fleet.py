@@ -0,0 +1,194 @@
+import json
+import os
+import socket
+import struct
+import threading
+
+# Multicast group and port the Master Pi sends fleet status datagrams to, unless configured otherwise
+DEFAULT_GROUP = "239.255.65.1"
+DEFAULT_PORT = 65002
+
+# Largest datagram sent, kept under a typical Ethernet MTU so a datagram is never fragmented (a lost fragment
+# loses the whole datagram)
+MAX_DATAGRAM_SIZE = 1400
+
+
+def pack(epoch, seq, records) -> bytes:
+    """
+    Encode a fleet status datagram.
+
+    :param epoch: Identifies the publisher's run, so receivers can tell a restarted publisher from a replay.
+    :param seq: The datagram's sequence number.
+    :param records: [[scooter_id, status], ...], empty for an announcement.
+    """
+    return json.dumps({"epoch": epoch, "seq": seq, "records": records}, separators=(",", ":")).encode()
+
+
+def unpack(data: bytes):
+    """
+    Decode a fleet status datagram.
+
+    :return: (epoch, seq, records)
+    :raises ValueError: If the datagram isn't a fleet status datagram.
+    """
+    message = json.loads(data.decode())
+    if not isinstance(message, dict) or not isinstance(message.get("seq"), int):
+        raise ValueError("Not a fleet status datagram.")
+    return message.get("epoch"), message["seq"], message.get("records") or []
+
+
+class FleetPublisher:
+    """
+    Multicasts scooter status changes to every Agent Pi at once over UDP.
+
+    Each datagram carries a sequence number and a small record per scooter whose status changed, so a change to
+    the whole fleet costs one datagram (or a few, for a large fleet) instead of one connection per scooter. UDP
+    may drop or reorder datagrams, so receivers use the sequence numbers to notice what they missed and catch up
+    over TCP. announce() re-sends the latest sequence number with no records, so a receiver that missed the last
+    datagram before a quiet spell still finds out.
+    """
+
+    def __init__(self, group=DEFAULT_GROUP, port=DEFAULT_PORT, ttl=1, interface=None):
+        """
+        :param group: The multicast group (or any other address, e.g. for tests) to send to.
+        :param port: The port to send to.
+        :param ttl: How many routers a datagram may cross; 1 keeps it on the local network.
+        :param interface: IP address of the interface to send from, or None for the system's default.
+        """
+        self.address = (group, port)
+        self.epoch = os.urandom(4).hex()
+        self.seq = 0
+        self.datagrams = 0
+        self.records = 0
+        self._lock = threading.Lock()
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+        self._sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, ttl)
+        if interface is not None:
+            self._sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_IF, socket.inet_aton(interface))
+
+    def publish(self, statuses):
+        """
+        Send scooters' new statuses, in as few datagrams as fit them.
+
+        :param statuses: {scooter_id: status}
+        :return: The number of datagrams sent.
+        """
+        records = [[scooter_id, status] for scooter_id, status in statuses.items()]
+        sent = 0
+        with self._lock:
+            while records:
+                count = len(records)
+                while count > 1 and len(pack(self.epoch, self.seq + 1, records[:count])) > MAX_DATAGRAM_SIZE:
+                    count //= 2
+                self.seq += 1
+                self._send(pack(self.epoch, self.seq, records[:count]))
+                self.records += count
+                records = records[count:]
+                sent += 1
+        return sent
+
+    def announce(self):
+        """Send the latest sequence number with no records, so receivers can tell whether they missed anything."""
+        with self._lock:
+            self._send(pack(self.epoch, self.seq, []))
+
+    def _send(self, datagram):
+        """Send a datagram, logging rather than raising if the network is down. Must hold _lock."""
+        try:
+            self._sock.sendto(datagram, self.address)
+            self.datagrams += 1
+        except OSError as e:
+            print(f"Could not send fleet status datagram {self.seq} to {self.address}: {e}")
+
+    def snapshot(self):
+        """Return the latest sequence number and how many datagrams and records have been sent."""
+        with self._lock:
+            return {"group": self.address[0], "port": self.address[1], "seq": self.seq,
+                    "datagrams": self.datagrams, "records": self.records}
+
+    def close(self):
+        self._sock.close()
+
+
+class FleetSubscriber:
+    """
+    Receives a FleetPublisher's datagrams, passing on the records and noticing datagrams that never arrived.
+
+    A datagram is new if its sequence number is higher than any seen so far; older and repeated ones are
+    dropped, so a reordered datagram can't undo a newer status. If sequence numbers are skipped, the publisher
+    has restarted (so its epoch changed) or this is the first datagram received, on_gap is called, and should
+    recover the current state some other way, e.g. by asking the Master Pi over TCP.
+    """
+
+    def __init__(self, on_records, on_gap, group=DEFAULT_GROUP, port=DEFAULT_PORT, interface="0.0.0.0"):
+        """
+        :param on_records: Called with [[scooter_id, status], ...] for each new datagram.
+        :param on_gap: Called with the number of datagrams missed, or None if that isn't known (the first
+            datagram received, or the publisher restarted).
+        :param group: The multicast group to join.
+        :param port: The port to listen on.
+        :param interface: IP address of the interface to join the group on.
+        """
+        self.on_records = on_records
+        self.on_gap = on_gap
+        self.epoch = None
+        self.seq = None
+        self.received = 0
+        self.gaps = 0
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+        self._sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._sock.bind(("", port))
+        membership = struct.pack("4s4s", socket.inet_aton(group), socket.inet_aton(interface))
+        self._sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, membership)
+        self.address = self._sock.getsockname()
+
+    def handle(self, data):
+        """
+        Handle one datagram.
+
+        :return: True if it was new.
+        """
+        try:
+            epoch, seq, records = unpack(data)
+        except ValueError as e:
+            print(f"Ignoring a malformed fleet status datagram: {e}")
+            return False
+
+        if self.seq is None or epoch != self.epoch:
+            missed = None
+        else:
+            # An announcement repeats the latest sequence number, a datagram with records takes the next one
+            missed = seq - self.seq - (1 if records else 0)
+            if missed < 0 or (missed == 0 and not records):
+                return False
+
+        self.epoch, self.seq = epoch, seq
+        self.received += 1
+        if records:
+            self.on_records(records)
+        if missed != 0:
+            # After the records, so the state recovered is at least as new as theirs
+            self.gaps += 1
+            self.on_gap(missed)
+        return True
+
+    def serve_forever(self):
+        """Receive datagrams until the socket is closed."""
+        while True:
+            try:
+                data, _ = self._sock.recvfrom(MAX_DATAGRAM_SIZE)
+            except OSError:
+                return
+            try:
+                self.handle(data)
+            except Exception as e:
+                print(f"Error handling fleet status datagram: {e}")
+
+    def start(self):
+        """Receive datagrams on a daemon thread."""
+        thread = threading.Thread(target=self.serve_forever, name="fleet-subscriber", daemon=True)
+        thread.start()
+        return thread
+
+    def close(self):
+        self._sock.close()
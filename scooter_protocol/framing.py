@@ -0,0 +1,141 @@
+import socket
+import struct
+
+HEADER = struct.Struct(">I")
+
+# Frames larger than this are refused, so a corrupt or hostile length can't make a peer allocate unbounded memory
+MAX_FRAME_SIZE = 64 * 1024 * 1024
+
+
+def set_nodelay(sock):
+    """
+    Turn off Nagle's algorithm on a TCP socket.
+
+    Requests and responses are small and each one is written with a single send, so there is nothing to gain from
+    waiting to coalesce them and a delayed ACK would otherwise stall every round trip.
+
+    :param sock: The connected (or listening) socket.
+    """
+    try:
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    except OSError:
+        pass  # Not a TCP socket, e.g. a socketpair in the tests
+
+
+def send_frame(sock, data: bytes):
+    """
+    Send one length-prefixed frame: the length of the data as a 4-byte big-endian integer, then the data.
+
+    :param sock: The connected socket to send on.
+    :param data: The encoded message.
+    :raises ValueError: If the data is larger than MAX_FRAME_SIZE.
+    """
+    _check_size(len(data))
+    send_buffers(sock, [HEADER.pack(len(data)), data])
+
+
+def recv_frame(sock):
+    """
+    Receive one length-prefixed frame.
+
+    :param sock: The connected socket to receive from.
+    :return: The frame body as a bytearray, or None if the connection was closed.
+    :raises ValueError: If the frame is larger than MAX_FRAME_SIZE.
+    """
+    raw_length = recv_exactly(sock, HEADER.size)
+    if raw_length is None:
+        return None
+    length = HEADER.unpack(raw_length)[0]
+    _check_size(length)
+    return recv_exactly(sock, length)
+
+
+def recv_exactly(sock, length: int):
+    """
+    Receive exactly `length` bytes from a socket.
+
+    The data is read straight into one preallocated buffer, so large frames aren't copied again for every packet.
+
+    :param sock: The connected socket to receive from.
+    :param length: The number of bytes to receive.
+    :return: The received data as a bytearray, or None if the connection was closed first.
+    """
+    buffer = bytearray(length)
+    view = memoryview(buffer)
+    received = 0
+    while received < length:
+        count = sock.recv_into(view[received:], length - received)
+        if not count:
+            return None
+        received += count
+    return buffer
+
+
+def send_buffers(sock, buffers):
+    """
+    Send several buffers back to back as a single write where the platform supports it.
+
+    :param sock: The connected socket to send on.
+    :param buffers: The bytes-like objects to send, in order.
+    """
+    if not hasattr(sock, "sendmsg"):
+        sock.sendall(b"".join(buffers))
+        return
+
+    views = [memoryview(buffer).cast("B") for buffer in buffers]
+    while views:
+        sent = sock.sendmsg(views)
+        # Drop whatever was fully sent and carry on from the middle of a partly sent buffer
+        while views and sent >= len(views[0]):
+            sent -= len(views[0])
+            views.pop(0)
+        if views and sent:
+            views[0] = views[0][sent:]
+
+
+def _check_size(length: int):
+    if length > MAX_FRAME_SIZE:
+        raise ValueError(f"Frame of {length} bytes is larger than the maximum of {MAX_FRAME_SIZE}")
+
+
+# Frames on a connection that has negotiated an encoding carry a flags byte after the length
+FLAGGED_HEADER = struct.Struct(">IB")
+
+# The low two bits of the flags byte hold the id of the codec the frame was encoded with
+CODEC_MASK = 0x03
+
+# The next two bits hold the id of the compression applied to the encoded message, or 0 if it wasn't compressed
+COMPRESSION_SHIFT = 2
+COMPRESSION_MASK = 0x0C
+
+
+def send_flagged_frame(sock, flags: int, data: bytes):
+    """
+    Send one frame with a flags byte: the length of the data as a 4-byte big-endian integer, the flags, then the data.
+
+    :param sock: The connected socket to send on.
+    :param flags: The flags describing how the data is encoded.
+    :param data: The encoded message.
+    :raises ValueError: If the data is larger than MAX_FRAME_SIZE.
+    """
+    _check_size(len(data))
+    send_buffers(sock, [FLAGGED_HEADER.pack(len(data), flags), data])
+
+
+def recv_flagged_frame(sock):
+    """
+    Receive one frame with a flags byte.
+
+    :param sock: The connected socket to receive from.
+    :return: A (flags, data) tuple, or None if the connection was closed.
+    :raises ValueError: If the frame is larger than MAX_FRAME_SIZE.
+    """
+    header = recv_exactly(sock, FLAGGED_HEADER.size)
+    if header is None:
+        return None
+    length, flags = FLAGGED_HEADER.unpack(header)
+    _check_size(length)
+    data = recv_exactly(sock, length)
+    if data is None:
+        return None
+    return flags, data
@@ -0,0 +1,11 @@
+import uuid
+
+# Commands that aren't safe to run twice: running any of them again books, charges or reports something again.
+# Clients send these with an "idempotency_key" so a retry of a request that did reach the server gets the first
+# response back instead of running the command again.
+KEYED_COMMANDS = frozenset({"AB", "ANT", "UCF", "EB", "RSF"})
+
+
+def new_idempotency_key():
+    """Return a new random idempotency key, to be sent with every attempt of one request."""
+    return uuid.uuid4().hex
@@ -0,0 +1,260 @@
+import socket
+import threading
+
+from .compression import DEFAULT_THRESHOLD
+from .deadline import DEADLINE_FIELD, Deadline, DeadlineExceeded, deadline_scope
+from .framing import set_nodelay
+from .session import Session, HELLO, server_hello
+from .streaming import StreamingResponse
+
+
+class ServerBusy(Exception):
+    """
+    Raised by an executor's submit (or a ProtocolServer's admit_message) to turn a request away without running it.
+
+    The client is sent {"error": <message>, "busy": true} straight away, so it isn't left waiting on a backlog.
+    """
+
+
+class ClientConnection:
+    """
+    A connection accepted by a ProtocolServer.
+
+    Responses may be sent from several worker threads at once, so sending is serialised with a lock. The socket
+    is closed once the client has stopped sending and every request read from it has been answered.
+    """
+
+    def __init__(self, sock, addr):
+        self.sock = sock
+        self.addr = addr
+        self.session = Session()
+        self._send_lock = threading.Lock()
+        self._state_lock = threading.Lock()
+        self._in_flight = 0
+        self._reading = True
+
+    def send(self, message):
+        """Encode a message with the connection's negotiated encoding and send it to the client."""
+        with self._send_lock:
+            self.session.write(self.sock, message)
+
+    def begin_request(self):
+        """Record that a request has been read and is waiting for its response."""
+        with self._state_lock:
+            self._in_flight += 1
+
+    def end_request(self):
+        """Record that a response has been sent, closing the connection if it was the last one owed."""
+        with self._state_lock:
+            self._in_flight -= 1
+            close = not self._reading and self._in_flight == 0
+        if close:
+            self.sock.close()
+
+    def end_reading(self):
+        """Record that the client has closed its side, closing the connection if no responses are owed."""
+        with self._state_lock:
+            self._reading = False
+            close = self._in_flight == 0
+        if close:
+            self.sock.close()
+
+
+class ProtocolServer:
+    """
+    A length-prefixed socket server that keeps each connection open for as many requests as the client sends.
+
+    A message carrying a "request_id" gets its response wrapped as {"request_id": ..., "payload": ...}, so a
+    client can pipeline many requests on one connection and match up responses arriving in any order. A message
+    without one is answered with the bare response, which keeps one-shot clients working unchanged. A HELLO
+    message sent first on a connection negotiates its encoding and compression (see Session).
+
+    If handle_message returns a StreamingResponse and the message asked for a stream ("stream": true, along with
+    a request ID), the records are sent as {"request_id": ..., "chunk": [...]} frames while they are produced,
+    followed by {"request_id": ..., "payload": {"count": n}} (or {"error": ...} if producing them failed).
+
+    A message carrying "deadline_ms" must be answered within that many milliseconds of arriving. If it is still
+    queued when its time runs out it is answered with an error without running; otherwise handle_message runs
+    with the deadline as the current one (see deadline.deadline_scope), so calls it makes can use what is left.
+    """
+
+    def __init__(self, address, handle_message, executor, compress_threshold=DEFAULT_THRESHOLD, choose_executor=None,
+                 admit_message=None, connection_limiter=None):
+        """
+        :param address: The (host, port) to listen on.
+        :param handle_message: Called as handle_message(message, addr) on a worker thread; returns the response.
+        :param executor: The concurrent.futures executor that runs handle_message.
+        :param compress_threshold: The encoded size in bytes from which responses are compressed, on connections
+            that negotiated compression.
+        :param choose_executor: Optional choose_executor(message) returning the executor to run that message on,
+            e.g. to give some commands their own workers. Defaults to always using `executor`.
+        :param admit_message: Optional admit_message(message, addr), called on the reading thread before a message
+            is queued. Raising ServerBusy turns the message away, e.g. because the client is over its rate limit.
+        :param connection_limiter: Optional object with acquire(host) and release(host) methods. A connection is
+            closed as soon as it is accepted if acquire returns False, and release is called once it has closed.
+        """
+        self.address = address
+        self.handle_message = handle_message
+        self.executor = executor
+        self.compress_threshold = compress_threshold
+        self.choose_executor = choose_executor
+        self.admit_message = admit_message
+        self.connection_limiter = connection_limiter
+        self._listener = None
+
+    def bind(self):
+        """Bind and start listening, updating self.address with the bound port."""
+        self._listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._listener.bind(self.address)
+        self._listener.listen()
+        self.address = self._listener.getsockname()
+
+    def serve_forever(self):
+        """Accept connections until the server is closed, reading each one on its own thread."""
+        if self._listener is None:
+            self.bind()
+        with self._listener:
+            while True:
+                try:
+                    conn, addr = self._listener.accept()
+                except OSError:
+                    break
+                if self.connection_limiter is not None and not self.connection_limiter.acquire(addr[0]):
+                    print(f"Refused connection from {addr}: too many connections.")
+                    conn.close()
+                    continue
+                set_nodelay(conn)
+                reader = threading.Thread(target=self._serve_connection, args=(conn, addr), daemon=True)
+                reader.start()
+
+    def close(self):
+        """Stop accepting new connections."""
+        if self._listener is not None:
+            try:
+                self._listener.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            self._listener.close()
+
+    def _serve_connection(self, conn, addr):
+        """Handle an admitted connection, releasing its slot in the connection limiter once it is closed."""
+        try:
+            self.handle_connection(conn, addr)
+        finally:
+            if self.connection_limiter is not None:
+                self.connection_limiter.release(addr[0])
+
+    def handle_connection(self, conn, addr):
+        """
+        Read frames from a client until it disconnects, handing each decoded message to the executor.
+
+        :param conn: The accepted client socket.
+        :param addr: The address of the client.
+        """
+        client = ClientConnection(conn, addr)
+        first = True
+        try:
+            while True:
+                try:
+                    message = client.session.read(conn)
+                except ValueError:
+                    print(f"Failed to decode message from {addr}.")
+                    break
+                if message is None:
+                    break
+
+                if first and isinstance(message, dict) and message.get("command") == HELLO:
+                    # Answer in the current encoding, then switch; nothing else is in flight yet
+                    reply, session = server_hello(message, self.compress_threshold)
+                    client.send({"request_id": message.get("request_id"), "payload": reply})
+                    client.session = session
+                else:
+                    self._dispatch(client, message)
+                first = False
+        except OSError as e:
+            print(f"Connection to {addr} failed: {e}")
+        finally:
+            client.end_reading()
+
+    def _dispatch(self, client, message):
+        """Hand a message to its executor, answering straight away if it is turned away."""
+        executor = self.executor
+        if self.choose_executor is not None and isinstance(message, dict):
+            executor = self.choose_executor(message)
+        deadline = self._deadline(message)
+
+        client.begin_request()
+        submitted = False
+        try:
+            if self.admit_message is not None:
+                self.admit_message(message, client.addr)
+            executor.submit(self._process, client, message, deadline)
+            submitted = True
+        except ServerBusy as e:
+            client.send(self._wrap(message, {"error": str(e), "busy": True}))
+        finally:
+            # Once submitted, _process answers the request and ends it; otherwise it must be ended here, whatever
+            # went wrong, or the connection would never be closed
+            if not submitted:
+                client.end_request()
+
+    def _deadline(self, message):
+        """The Deadline for a message, counted from now, or None if it didn't send a valid one."""
+        if not isinstance(message, dict) or message.get(DEADLINE_FIELD) is None:
+            return None
+        try:
+            return Deadline.from_ms(message[DEADLINE_FIELD])
+        except (TypeError, ValueError):
+            return None
+
+    def _wrap(self, message, response):
+        """Wrap a response with the request ID of the message it answers, if the message had one."""
+        if isinstance(message, dict) and "request_id" in message:
+            return {"request_id": message["request_id"], "payload": response}
+        return response
+
+    def _process(self, client, message, deadline=None):
+        """Run one message through handle_message and send back its response."""
+        try:
+            try:
+                if deadline is not None:
+                    deadline.check("Request waiting to run")
+                with deadline_scope(deadline):
+                    response = self.handle_message(message, client.addr)
+                    if isinstance(response, StreamingResponse) and not self._wants_stream(message):
+                        response = response.collect()
+            except DeadlineExceeded as e:
+                print(f"Deadline exceeded for message from {client.addr}: {e}")
+                response = {"error": str(e), "deadline_exceeded": True}
+            except Exception as e:
+                print(f"Error handling message from {client.addr}: {e}")
+                response = {"error": str(e)}
+
+            if isinstance(response, StreamingResponse):
+                self._send_stream(client, message["request_id"], response)
+            else:
+                client.send(self._wrap(message, response))
+        except OSError as e:
+            print(f"Failed to send response to {client.addr}: {e}")
+        finally:
+            client.end_request()
+
+    def _wants_stream(self, message):
+        """Whether a message asked for its response to be streamed in chunks."""
+        return isinstance(message, dict) and bool(message.get("stream")) and "request_id" in message
+
+    def _send_stream(self, client, request_id, response):
+        """Send a StreamingResponse as chunk frames followed by a final frame with the record count."""
+        count = 0
+        try:
+            for chunk in response.chunks():
+                client.send({"request_id": request_id, "chunk": chunk})
+                count += len(chunk)
+            final = {"count": count}
+        except OSError:
+            raise
+        except Exception as e:
+            print(f"Error streaming response to {client.addr}: {e}")
+            final = {"error": str(e)}
+        client.send({"request_id": request_id, "payload": final})
@@ -0,0 +1,115 @@
+from . import codec, compression
+from .framing import (send_frame, recv_frame, send_flagged_frame, recv_flagged_frame,
+                      CODEC_MASK, COMPRESSION_SHIFT, COMPRESSION_MASK)
+
+HELLO = "HELLO"
+
+
+class Session:
+    """
+    The framing and encoding used on one connection.
+
+    Every connection starts out with plain JSON frames. A client may open it with a HELLO message offering the
+    encodings and compression methods it supports; once the server has answered with the ones it chose, both
+    sides switch to flagged frames in that encoding. Frames at least `threshold` bytes long are then compressed,
+    with a flag telling the reader to decompress them. Clients that never send HELLO keep using JSON frames
+    throughout.
+    """
+
+    def __init__(self, frame_codec=None, compressor=None, threshold=compression.DEFAULT_THRESHOLD):
+        """
+        :param frame_codec: The negotiated codec, or None for plain JSON frames.
+        :param compressor: The negotiated compression method, or None to send every frame uncompressed.
+        :param threshold: The encoded size in bytes from which frames are compressed.
+        """
+        self.codec = frame_codec
+        self.compressor = compressor
+        self.threshold = threshold
+
+    def write(self, sock, message):
+        """Encode a message and send it as one frame. Callers sharing a socket must serialise their writes."""
+        if self.codec is None:
+            send_frame(sock, codec.encode(message))
+            return
+
+        flags = self.codec.id
+        data = self.codec.encode(message)
+        if self.compressor is not None and len(data) >= self.threshold:
+            compressed = self.compressor.compress(data)
+            if len(compressed) < len(data):
+                flags |= self.compressor.id << COMPRESSION_SHIFT
+                data = compressed
+        send_flagged_frame(sock, flags, data)
+
+    def read(self, sock):
+        """
+        Receive one frame and decode it.
+
+        :return: The decoded message, or None if the connection was closed.
+        :raises ValueError: If the frame can't be decoded.
+        """
+        if self.codec is None:
+            data = recv_frame(sock)
+            return None if data is None else codec.decode(data)
+
+        frame = recv_flagged_frame(sock)
+        if frame is None:
+            return None
+        flags, data = frame
+        compression_id = (flags & COMPRESSION_MASK) >> COMPRESSION_SHIFT
+        if compression_id:
+            compressor = compression.COMPRESSORS_BY_ID.get(compression_id)
+            if compressor is None:
+                raise ValueError(f"Frame compressed with unsupported method {compression_id}")
+            data = compressor.decompress(data)
+
+        frame_codec = codec.CODECS_BY_ID.get(flags & CODEC_MASK)
+        if frame_codec is None:
+            raise ValueError(f"Frame encoded with unsupported codec {flags & CODEC_MASK}")
+        try:
+            return frame_codec.decode(data)
+        except (IndexError, KeyError, TypeError) as e:
+            raise ValueError(f"Malformed {frame_codec.name} frame: {e}") from e
+
+
+def client_hello(sock, encodings=None, compress=None):
+    """
+    Negotiate the encoding and compression for a new client connection.
+
+    :param sock: The newly connected socket.
+    :param encodings: Encoding names to offer, most preferred first. Defaults to everything this process supports.
+    :param compress: Compression names to offer, most preferred first. Defaults to everything this process supports.
+    :return: The Session to use for the rest of the connection.
+    :raises ConnectionError: If the server closes the connection instead of answering.
+    """
+    session = Session()
+    offered = {
+        "encodings": encodings if encodings is not None else codec.available_encodings(),
+        "compression": compress if compress is not None else compression.available_compression(),
+    }
+    session.write(sock, {"command": HELLO, "payload": offered, "request_id": 0})
+
+    reply = session.read(sock)
+    if reply is None:
+        raise ConnectionError("Connection closed during HELLO.")
+    payload = reply.get("payload") if isinstance(reply, dict) else None
+    chosen = payload.get("encoding") if isinstance(payload, dict) else None
+    if chosen in codec.CODECS_BY_NAME:
+        return Session(codec.CODECS_BY_NAME[chosen], compression.COMPRESSORS_BY_NAME.get(payload.get("compression")))
+    # The server doesn't negotiate, so carry on with JSON frames
+    return session
+
+
+def server_hello(message, threshold=compression.DEFAULT_THRESHOLD):
+    """
+    Answer a client's HELLO message.
+
+    :param message: The decoded HELLO message.
+    :param threshold: The encoded size in bytes from which responses are compressed.
+    :return: A (reply payload, Session) tuple. The reply must be sent before switching to the new Session.
+    """
+    payload = message.get("payload") or {}
+    chosen = codec.choose_codec(payload.get("encodings"))
+    compressor = compression.choose_compressor(payload.get("compression"))
+    reply = {"encoding": chosen.name, "compression": compressor.name if compressor is not None else None}
+    return reply, Session(chosen, compressor, threshold)
@@ -0,0 +1,38 @@
+from itertools import islice
+
+# Records sent per chunk frame when a response is streamed
+DEFAULT_CHUNK_SIZE = 100
+
+
+class StreamingResponse:
+    """
+    A list response that can be sent as a stream of chunk frames instead of one frame.
+
+    A handler returns one of these instead of a list. If the request asked for a stream (see
+    PipelinedConnection.stream), the records are sent in chunks as the iterable produces them, so neither side
+    ever holds the whole list. Otherwise the records are collected and passed through `collect` to build the
+    response that command has always returned, so existing clients see no difference.
+    """
+
+    def __init__(self, records, collect=list, chunk_size=DEFAULT_CHUNK_SIZE):
+        """
+        :param records: An iterable producing the records, ideally lazily (e.g. a generator reading from the DB).
+        :param collect: Called with the list of every record to build the response for clients that don't stream.
+        :param chunk_size: The number of records sent in each chunk frame.
+        """
+        self.records = records
+        self.collect_records = collect
+        self.chunk_size = chunk_size
+
+    def chunks(self):
+        """Yield the records as lists of up to chunk_size records."""
+        records = iter(self.records)
+        while True:
+            chunk = list(islice(records, self.chunk_size))
+            if not chunk:
+                return
+            yield chunk
+
+    def collect(self):
+        """Build the full, non-streamed response."""
+        return self.collect_records(list(self.records))
@@ -0,0 +1,69 @@
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from scooter_protocol import codec
+from scooter_protocol.connection import PipelinedConnection
+from scooter_protocol.server import ProtocolServer
+
+SCOOTER = {
+    "scooterID": 3, "make": "Xiaomi", "colour": "Black", "longitude": 144.96, "latitude": -37.81,
+    "costMin": 0.5, "batteryPercentage": 80, "status": "Needs Repair", "ipAddress": "10.0.0.5",
+}
+BOOKING = {
+    "bookingID": 12, "email": "alice.smith@example.com", "scooterID": 3, "status": "Active",
+    "startDateTime": "Sun, 01 Sep 2024 10:00:00 GMT", "endDateTime": "Sun, 01 Sep 2024 10:30:00 GMT",
+    "actualStartDateTime": None, "googleID": None, "unknownField": "Open",
+}
+
+
+@unittest.skipIf(codec.msgpack is None, "msgpack is not installed")
+class TestCompactCodec(unittest.TestCase):
+
+    def setUp(self):
+        self.codec = codec.CODECS_BY_NAME["msgpack/1"]
+
+    def test_round_trip_matches_json(self):
+        message = {"request_id": 4, "payload": {"all_booked_scooters": [BOOKING, BOOKING], "scooter": SCOOTER}}
+
+        self.assertEqual(self.codec.decode(self.codec.encode(message)), message)
+
+    def test_smaller_than_json(self):
+        message = {"request_id": 4, "payload": [SCOOTER] * 20}
+
+        self.assertLess(len(self.codec.encode(message)), len(codec.encode(message)) / 2)
+
+    def test_unknown_status_and_non_standard_date_pass_through(self):
+        message = {"status": "Exploded", "startDateTime": "2024-09-01T10:00:00+10:00"}
+
+        self.assertEqual(self.codec.decode(self.codec.encode(message)), message)
+
+
+class TestNegotiation(unittest.TestCase):
+
+    def setUp(self):
+        self.executor = ThreadPoolExecutor(max_workers=2)
+        self.server = ProtocolServer(("127.0.0.1", 0), lambda message, addr: message["payload"], self.executor)
+        self.server.bind()
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def tearDown(self):
+        self.server.close()
+        self.executor.shutdown()
+
+    def test_negotiates_preferred_encoding(self):
+        connection = PipelinedConnection(self.server.address, timeout=5)
+
+        self.assertEqual(connection.request("GSD", SCOOTER), SCOOTER)
+        self.assertEqual(connection._session.codec.name, codec.available_encodings()[0])
+        connection.close()
+
+    def test_falls_back_to_json(self):
+        connection = PipelinedConnection(self.server.address, timeout=5, encodings=["zip/9"])
+
+        self.assertEqual(connection.request("GSD", BOOKING), BOOKING)
+        self.assertEqual(connection._session.codec.name, "json")
+        connection.close()
+
+if __name__ == '__main__':
+    unittest.main()
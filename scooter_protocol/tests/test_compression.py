@@ -0,0 +1,83 @@
+import socket
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from scooter_protocol import codec, compression
+from scooter_protocol.connection import PipelinedConnection
+from scooter_protocol.framing import COMPRESSION_MASK
+from scooter_protocol.server import ProtocolServer
+from scooter_protocol.session import Session
+
+BOOKINGS = [
+    {"bookingID": i, "email": "alice.smith@example.com", "scooterID": i % 4, "status": "Complete",
+     "startDateTime": "Sun, 01 Sep 2024 10:00:00 GMT", "endDateTime": "Sun, 01 Sep 2024 10:30:00 GMT"}
+    for i in range(200)
+]
+
+
+class TestSessionCompression(unittest.TestCase):
+
+    def setUp(self):
+        self.writer, self.reader = socket.socketpair()
+        self.compressor = compression.ZlibCompressor()
+
+    def tearDown(self):
+        self.writer.close()
+        self.reader.close()
+
+    def sent_flags(self, session, message):
+        """Write a message with the session and return the flags byte the reader sees."""
+        session.write(self.writer, message)
+        header = self.reader.recv(5, socket.MSG_PEEK)
+        return header[4]
+
+    def test_large_frames_are_compressed(self):
+        session = Session(codec.JSON_CODEC, self.compressor, threshold=1024)
+
+        flags = self.sent_flags(session, BOOKINGS)
+
+        self.assertEqual(flags & COMPRESSION_MASK, self.compressor.id << 2)
+        self.assertEqual(session.read(self.reader), BOOKINGS)
+
+    def test_small_frames_are_not_compressed(self):
+        session = Session(codec.JSON_CODEC, self.compressor, threshold=1024)
+
+        flags = self.sent_flags(session, {"message": "success"})
+
+        self.assertEqual(flags & COMPRESSION_MASK, 0)
+        self.assertEqual(session.read(self.reader), {"message": "success"})
+
+    def test_corrupt_frame_raises_value_error(self):
+        with self.assertRaises(ValueError):
+            self.compressor.decompress(b"not zlib")
+
+
+class TestNegotiatedCompression(unittest.TestCase):
+
+    def setUp(self):
+        self.executor = ThreadPoolExecutor(max_workers=2)
+        self.server = ProtocolServer(("127.0.0.1", 0), lambda message, addr: BOOKINGS, self.executor)
+        self.server.bind()
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def tearDown(self):
+        self.server.close()
+        self.executor.shutdown()
+
+    def test_client_decompresses_transparently(self):
+        connection = PipelinedConnection(self.server.address, timeout=5)
+
+        self.assertEqual(connection.request("GAB", {}), BOOKINGS)
+        self.assertEqual(connection._session.compressor.name, compression.available_compression()[0])
+        connection.close()
+
+    def test_compression_can_be_turned_off(self):
+        connection = PipelinedConnection(self.server.address, timeout=5, compression=[])
+
+        self.assertEqual(connection.request("GAB", {}), BOOKINGS)
+        self.assertIsNone(connection._session.compressor)
+        connection.close()
+
+if __name__ == '__main__':
+    unittest.main()
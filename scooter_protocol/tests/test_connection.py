@@ -0,0 +1,210 @@
+import json
+import queue
+import socket
+import struct
+import threading
+import time
+import unittest
+import unittest.mock
+from concurrent.futures import ThreadPoolExecutor
+
+from scooter_protocol.connection import PipelinedConnection
+from scooter_protocol.server import ProtocolServer, ServerBusy
+
+
+def handle_message(message, addr):
+    """Echo the payload back, sleeping first for the SLOW command."""
+    if message.get("command") == "SLOW":
+        time.sleep(0.2)
+    return {"command": message.get("command"), "echo": message.get("payload")}
+
+
+class TestPipelinedConnection(unittest.TestCase):
+
+    def setUp(self):
+        self.executor = ThreadPoolExecutor(max_workers=4)
+        self.server = ProtocolServer(("127.0.0.1", 0), handle_message, self.executor)
+        self.server.bind()
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.connection = PipelinedConnection(self.server.address, timeout=5)
+
+    def tearDown(self):
+        self.connection.close()
+        self.server.close()
+        self.executor.shutdown()
+
+    def test_request_response(self):
+        response = self.connection.request("GSD", {"scooter_id": 1})
+
+        self.assertEqual(response, {"command": "GSD", "echo": {"scooter_id": 1}})
+
+    def test_responses_interleave_on_one_connection(self):
+        """A fast request isn't held up behind a slow one sent first on the same connection."""
+        finished = []
+
+        def slow():
+            self.connection.request("SLOW", {})
+            finished.append("SLOW")
+
+        t = threading.Thread(target=slow)
+        t.start()
+        time.sleep(0.05)
+        self.connection.request("GSD", {"scooter_id": 1})
+        finished.append("GSD")
+        t.join()
+
+        self.assertEqual(finished, ["GSD", "SLOW"])
+
+    def test_reconnects_after_server_drops_connection(self):
+        self.connection.request("GSD", {"scooter_id": 1})
+        self.connection._sock.shutdown(socket.SHUT_RDWR)
+        time.sleep(0.05)
+
+        response = self.connection.request("GSD", {"scooter_id": 2})
+
+        self.assertEqual(response["echo"], {"scooter_id": 2})
+
+    def test_one_shot_client_gets_bare_response(self):
+        """Clients using the original one-request-per-connection framing still work."""
+        with socket.create_connection(self.server.address) as s:
+            body = json.dumps({"command": "GAS", "payload": {}}).encode()
+            s.sendall(struct.pack(">I", len(body)) + body)
+            length = struct.unpack(">I", s.recv(4))[0]
+            data = b""
+            while len(data) < length:
+                data += s.recv(length - len(data))
+
+        self.assertEqual(json.loads(data), {"command": "GAS", "echo": {}})
+
+
+class BusyExecutor:
+    def submit(self, fn, *args):
+        raise ServerBusy("Server is busy")
+
+
+class TestChooseExecutor(unittest.TestCase):
+
+    def test_turned_away_request_gets_error(self):
+        executor = ThreadPoolExecutor(max_workers=1)
+        server = ProtocolServer(("127.0.0.1", 0), handle_message, executor,
+                                choose_executor=lambda message: BusyExecutor() if message["command"] == "GAC" else executor)
+        server.bind()
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        connection = PipelinedConnection(server.address, timeout=5)
+        try:
+            self.assertEqual(connection.request("GAC", {}), {"error": "Server is busy", "busy": True})
+            self.assertEqual(connection.request("GSD", {})["command"], "GSD")
+        finally:
+            connection.close()
+            server.close()
+            executor.shutdown()
+
+
+class TestRetries(unittest.TestCase):
+
+    def test_timed_out_request_is_retried_with_same_key(self):
+        """The first attempt is never answered; the retry carries the same idempotency key and succeeds."""
+        received = []
+
+        def answer_second(message, addr):
+            received.append(message)
+            if len(received) == 1:
+                time.sleep(0.5)
+            return {"key": message.get("idempotency_key")}
+
+        executor = ThreadPoolExecutor(max_workers=2)
+        server = ProtocolServer(("127.0.0.1", 0), answer_second, executor)
+        server.bind()
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        connection = PipelinedConnection(server.address, timeout=0.2, retries=1, retry_backoff=0)
+        try:
+            response = connection.request("AB", {"scooter_id": 1})
+
+            self.assertEqual(len(received), 2)
+            self.assertIsNotNone(response["key"])
+            self.assertEqual(received[0]["idempotency_key"], received[1]["idempotency_key"])
+        finally:
+            connection.close()
+            server.close()
+            executor.shutdown()
+
+    def test_reads_are_sent_without_key(self):
+        connection = PipelinedConnection(("127.0.0.1", 1), retries=1)
+        with unittest.mock.patch.object(connection, "_request_once", return_value={}) as request_once:
+            connection.request("GSD", {"scooter_id": 1})
+        request_once.assert_called_once_with("GSD", {"scooter_id": 1}, None)
+
+    def test_refused_connection_raises_connection_refused(self):
+        # A port nothing listens on, so connecting to it is refused
+        with socket.socket() as unused:
+            unused.bind(("127.0.0.1", 0))
+            address = unused.getsockname()
+        connection = PipelinedConnection(address, timeout=1)
+
+        with self.assertRaises(ConnectionRefusedError):
+            connection.request("GAS", {})
+
+
+class RefuseAll:
+    """A connection limiter that refuses every connection."""
+
+    def __init__(self):
+        self.released = []
+
+    def acquire(self, host):
+        return False
+
+    def release(self, host):
+        self.released.append(host)
+
+
+class TestAdmission(unittest.TestCase):
+
+    def setUp(self):
+        self.executor = ThreadPoolExecutor(max_workers=1)
+
+    def tearDown(self):
+        self.server.close()
+        self.executor.shutdown()
+
+    def start(self, **kwargs):
+        self.server = ProtocolServer(("127.0.0.1", 0), handle_message, self.executor, **kwargs)
+        self.server.bind()
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def test_admit_message_turns_request_away(self):
+        def admit(message, addr):
+            if message["command"] == "GAC":
+                raise ServerBusy("Rate limit exceeded")
+
+        self.start(admit_message=admit)
+        connection = PipelinedConnection(self.server.address, timeout=5)
+        try:
+            self.assertEqual(connection.request("GAC", {}), {"error": "Rate limit exceeded", "busy": True})
+            self.assertEqual(connection.request("GSD", {})["command"], "GSD")
+        finally:
+            connection.close()
+
+    def test_admission_error_still_closes_connection(self):
+        def admit(message, addr):
+            raise RuntimeError("Admission failed")
+
+        self.start(admit_message=admit)
+        connection = PipelinedConnection(self.server.address, timeout=5)
+        errors = queue.Queue()
+        with unittest.mock.patch("threading.excepthook", errors.put):
+            # The request is never answered, but it must not keep the connection open
+            with self.assertRaises(ConnectionError):
+                connection.request("GSD", {})
+            self.assertEqual(str(errors.get(timeout=5).exc_value), "Admission failed")
+        connection.close()
+
+    def test_refused_connection_is_closed(self):
+        limiter = RefuseAll()
+        self.start(connection_limiter=limiter)
+        with socket.create_connection(self.server.address, timeout=5) as sock:
+            self.assertEqual(sock.recv(1), b"")
+        self.assertEqual(limiter.released, [])
+
+if __name__ == '__main__':
+    unittest.main()
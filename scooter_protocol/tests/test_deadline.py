@@ -0,0 +1,75 @@
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from scooter_protocol.connection import PipelinedConnection
+from scooter_protocol.deadline import Deadline, DeadlineExceeded, current_deadline, deadline_scope, time_budget
+from scooter_protocol.server import ProtocolServer
+
+
+class TestDeadline(unittest.TestCase):
+
+    def test_time_budget_without_deadline_is_timeout(self):
+        self.assertEqual(time_budget(5), 5)
+        self.assertIsNone(time_budget(None))
+
+    def test_time_budget_cut_short_by_deadline(self):
+        with deadline_scope(Deadline(0.5)):
+            self.assertLessEqual(time_budget(5), 0.5)
+            self.assertEqual(time_budget(0.1), 0.1)
+        self.assertIsNone(current_deadline())
+
+    def test_expired_deadline_raises(self):
+        with deadline_scope(Deadline(0)):
+            with self.assertRaises(DeadlineExceeded):
+                time_budget(5)
+
+
+class TestServerDeadline(unittest.TestCase):
+
+    def setUp(self):
+        self.seen = []
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.server = ProtocolServer(("127.0.0.1", 0), self.handle_message, self.executor)
+        self.server.bind()
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def tearDown(self):
+        self.server.close()
+        self.executor.shutdown()
+
+    def handle_message(self, message, addr):
+        if message["command"] == "SLOW":
+            time.sleep(0.3)
+        deadline = current_deadline()
+        self.seen.append(message["command"])
+        return {"remaining": deadline.remaining() if deadline is not None else None}
+
+    def test_handler_sees_deadline_sent_by_client(self):
+        connection = PipelinedConnection(self.server.address, timeout=2)
+        try:
+            remaining = connection.request("GSD", {})["remaining"]
+        finally:
+            connection.close()
+
+        self.assertTrue(0 < remaining <= 2)
+
+    def test_request_queued_past_its_deadline_is_not_run(self):
+        """With one worker busy, a request with a short deadline expires in the queue and is answered straight away."""
+        slow = PipelinedConnection(self.server.address, timeout=2)
+        fast = PipelinedConnection(self.server.address, timeout=0.1)
+        try:
+            threading.Thread(target=slow.request, args=("SLOW", {}), daemon=True).start()
+            time.sleep(0.05)
+            with self.assertRaises(TimeoutError):
+                fast.request("GSD", {})
+            time.sleep(0.4)
+        finally:
+            slow.close()
+            fast.close()
+
+        self.assertEqual(self.seen, ["SLOW"])
+
+if __name__ == '__main__':
+    unittest.main()
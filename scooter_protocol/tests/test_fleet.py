@@ -0,0 +1,126 @@
+import socket
+import threading
+import unittest
+
+from scooter_protocol.fleet import FleetPublisher, FleetSubscriber, MAX_DATAGRAM_SIZE, pack, unpack
+
+
+class TestFleetSubscriber(unittest.TestCase):
+
+    def setUp(self):
+        self.records = []
+        self.gaps = []
+        self.subscriber = FleetSubscriber(self.records.extend, self.gaps.append, port=0)
+        self.addCleanup(self.subscriber.close)
+        self.subscriber.handle(pack("a", 1, [[1, "Booked"]]))
+        self.first_gaps, self.gaps[:] = list(self.gaps), []
+
+    def test_first_datagram_is_a_gap(self):
+        self.assertEqual(self.first_gaps, [None])
+        self.assertEqual(self.records, [[1, "Booked"]])
+        self.assertEqual(self.subscriber.seq, 1)
+
+    def test_datagrams_in_order_have_no_gap(self):
+        self.subscriber.handle(pack("a", 2, [[2, "Available"]]))
+        self.subscriber.handle(pack("a", 2, []))
+
+        self.assertEqual(self.records, [[1, "Booked"], [2, "Available"]])
+        self.assertEqual(self.gaps, [])
+
+    def test_skipped_sequence_numbers_are_a_gap(self):
+        self.subscriber.handle(pack("a", 4, [[2, "Available"]]))
+
+        self.assertEqual(self.gaps, [2])
+        self.assertEqual(self.records[-1], [2, "Available"])
+
+    def test_announcement_reveals_a_lost_datagram(self):
+        self.subscriber.handle(pack("a", 2, []))
+
+        self.assertEqual(self.gaps, [1])
+        self.assertEqual(self.records, [[1, "Booked"]])
+
+    def test_old_and_repeated_datagrams_are_dropped(self):
+        self.subscriber.handle(pack("a", 3, [[1, "Available"]]))
+        self.gaps.clear()
+
+        self.assertFalse(self.subscriber.handle(pack("a", 2, [[1, "In Use"]])))
+        self.assertFalse(self.subscriber.handle(pack("a", 3, [[1, "Available"]])))
+        self.assertEqual(self.records[-1], [1, "Available"])
+        self.assertEqual(self.gaps, [])
+
+    def test_restarted_publisher_is_a_gap(self):
+        self.subscriber.handle(pack("b", 1, [[3, "Booked"]]))
+
+        self.assertEqual(self.gaps, [None])
+        self.assertEqual(self.records[-1], [3, "Booked"])
+
+    def test_malformed_datagram_is_ignored(self):
+        self.assertFalse(self.subscriber.handle(b"not json"))
+        with self.assertRaises(ValueError):
+            unpack(b"[]")
+
+
+class TestFleetPublisher(unittest.TestCase):
+
+    def setUp(self):
+        self.receiver = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.receiver.bind(("127.0.0.1", 0))
+        self.receiver.settimeout(5)
+        self.addCleanup(self.receiver.close)
+        self.publisher = FleetPublisher(*self.receiver.getsockname())
+        self.addCleanup(self.publisher.close)
+
+    def test_fleet_change_is_one_datagram(self):
+        sent = self.publisher.publish({scooter_id: "Under Repair" for scooter_id in range(1, 21)})
+
+        epoch, seq, records = unpack(self.receiver.recv(MAX_DATAGRAM_SIZE))
+        self.assertEqual(sent, 1)
+        self.assertEqual((epoch, seq), (self.publisher.epoch, 1))
+        self.assertEqual(records, [[scooter_id, "Under Repair"] for scooter_id in range(1, 21)])
+
+    def test_large_fleet_is_split_into_datagrams_that_fit(self):
+        sent = self.publisher.publish({scooter_id: "Needs Repair" for scooter_id in range(1000)})
+
+        received = []
+        for expected_seq in range(1, sent + 1):
+            data = self.receiver.recv(65536)
+            self.assertLessEqual(len(data), MAX_DATAGRAM_SIZE)
+            _, seq, records = unpack(data)
+            self.assertEqual(seq, expected_seq)
+            received.extend(records)
+        self.assertGreater(sent, 1)
+        self.assertEqual([scooter_id for scooter_id, _ in received], list(range(1000)))
+
+    def test_announce_repeats_the_latest_sequence_number(self):
+        self.publisher.publish({1: "Booked"})
+        self.publisher.announce()
+
+        self.receiver.recv(MAX_DATAGRAM_SIZE)
+        self.assertEqual(unpack(self.receiver.recv(MAX_DATAGRAM_SIZE))[1:], (1, []))
+        self.assertEqual(self.publisher.snapshot()["datagrams"], 2)
+
+
+class TestFleetMulticast(unittest.TestCase):
+
+    def test_subscriber_receives_published_statuses_over_loopback(self):
+        received = threading.Event()
+        records = []
+        try:
+            subscriber = FleetSubscriber(lambda new: (records.extend(new), received.set()), lambda missed: None,
+                                         port=0, interface="127.0.0.1")
+        except OSError as e:
+            self.skipTest(f"Multicast isn't available here: {e}")
+        self.addCleanup(subscriber.close)
+        subscriber.start()
+        publisher = FleetPublisher(port=subscriber.address[1], interface="127.0.0.1")
+        self.addCleanup(publisher.close)
+
+        publisher.publish({7: "Booked"})
+
+        if not received.wait(2):
+            self.skipTest("Multicast datagrams aren't looped back here.")
+        self.assertEqual(records, [[7, "Booked"]])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+import socket
+import struct
+import threading
+import unittest
+
+from scooter_protocol import framing
+
+
+class PartialSocket:
+    """A socket stand-in that accepts at most a few bytes per send, like a full kernel buffer would."""
+
+    def __init__(self, chunk):
+        self.chunk = chunk
+        self.sent = bytearray()
+
+    def sendmsg(self, buffers):
+        data = b"".join(bytes(buffer) for buffer in buffers)[:self.chunk]
+        self.sent += data
+        return len(data)
+
+
+class TestFraming(unittest.TestCase):
+
+    def setUp(self):
+        self.writer, self.reader = socket.socketpair()
+
+    def tearDown(self):
+        self.writer.close()
+        self.reader.close()
+
+    def test_round_trip_large_frame(self):
+        data = bytes(range(256)) * 8192
+        sender = threading.Thread(target=framing.send_frame, args=(self.writer, data))
+        sender.start()
+
+        received = framing.recv_frame(self.reader)
+        sender.join()
+
+        self.assertEqual(received, data)
+
+    def test_partial_sends_are_resumed(self):
+        sock = PartialSocket(chunk=3)
+
+        framing.send_buffers(sock, [b"head", b"", b"body!"])
+
+        self.assertEqual(sock.sent, b"headbody!")
+
+    def test_oversized_frame_is_refused(self):
+        self.writer.sendall(struct.pack(">I", framing.MAX_FRAME_SIZE + 1))
+
+        with self.assertRaises(ValueError):
+            framing.recv_frame(self.reader)
+
+    def test_closed_connection_returns_none(self):
+        self.writer.sendall(struct.pack(">I", 10) + b"short")
+        self.writer.close()
+
+        self.assertIsNone(framing.recv_frame(self.reader))
+
+if __name__ == '__main__':
+    unittest.main()
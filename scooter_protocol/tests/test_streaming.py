@@ -0,0 +1,65 @@
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from scooter_protocol.connection import PipelinedConnection
+from scooter_protocol.server import ProtocolServer
+from scooter_protocol.streaming import StreamingResponse
+
+produced = []
+
+
+def records(count, fail_after=None):
+    for i in range(count):
+        if i == fail_after:
+            raise RuntimeError("database went away")
+        produced.append(i)
+        yield {"bookingID": i}
+
+
+def handle_message(message, addr):
+    payload = message.get("payload") or {}
+    return StreamingResponse(records(payload.get("count", 5), payload.get("fail_after")),
+                             collect=lambda bookings: {"bookings": bookings}, chunk_size=2)
+
+
+class TestStreaming(unittest.TestCase):
+
+    def setUp(self):
+        produced.clear()
+        self.executor = ThreadPoolExecutor(max_workers=2)
+        self.server = ProtocolServer(("127.0.0.1", 0), handle_message, self.executor)
+        self.server.bind()
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.connection = PipelinedConnection(self.server.address, timeout=5)
+
+    def tearDown(self):
+        self.connection.close()
+        self.server.close()
+        self.executor.shutdown()
+
+    def test_stream_yields_every_record(self):
+        received = list(self.connection.stream("GABFS", {"count": 5}))
+
+        self.assertEqual(received, [{"bookingID": i} for i in range(5)])
+
+    def test_non_streaming_request_gets_collected_response(self):
+        response = self.connection.request("GABFS", {"count": 3})
+
+        self.assertEqual(response, {"bookings": [{"bookingID": 0}, {"bookingID": 1}, {"bookingID": 2}]})
+
+    def test_error_part_way_through_raises_after_earlier_records(self):
+        received = []
+        with self.assertRaises(RuntimeError):
+            for record in self.connection.stream("GABFS", {"count": 5, "fail_after": 3}):
+                received.append(record)
+
+        self.assertEqual(received, [{"bookingID": 0}, {"bookingID": 1}])
+
+    def test_connection_is_usable_after_stream(self):
+        list(self.connection.stream("GABFS", {"count": 4}))
+
+        self.assertEqual(self.connection.request("GABFS", {"count": 1}), {"bookings": [{"bookingID": 0}]})
+
+if __name__ == '__main__':
+    unittest.main()